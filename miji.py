@@ -3,68 +3,280 @@
 # Licensed under the MIT License: https://opensource.org/licenses/MIT
 
 
-import pygame
+import time
+
+_IMPORT_STARTED = time.perf_counter()
+
 import sys
 import random
 import math
 import os
-import urllib.request
-import zipfile
-import shutil
+import io
+import mmap
+import struct
+import zlib
+import heapq
+import itertools
+import weakref
+from array import array
+from collections import OrderedDict, deque, namedtuple
+from operator import attrgetter
+
+
+class _LazyModule:
+    """模块占位：第一次访问属性时才真正导入，并把模块全局变量替换为真实模块"""
+
+    def __init__(self, module_name, alias=None):
+        self._module_name = module_name
+        self._alias = alias or module_name
+
+    def __repr__(self):
+        return f"<lazy module {self._module_name!r}>"
+
+    def __getattr__(self, attr):
+        import importlib
+        t = time.perf_counter()
+        module = importlib.import_module(self._module_name)
+        startup_timings.setdefault(f"import {self._module_name}",
+                                   (time.perf_counter() - t) * 1000)
+        globals()[self._alias] = module
+        return getattr(module, attr)
+
+
+startup_timings = {}  # 启动阶段 -> 耗时（毫秒）
+
+# 较重的模块延迟到第一次使用时导入，import miji 只需几毫秒
+pygame = _LazyModule("pygame")
+np = _LazyModule("numpy", "np")  # 可选依赖，仅数组实体存储使用，先用 numpy_available() 判断
+argparse = _LazyModule("argparse")
+cProfile = _LazyModule("cProfile")
+hashlib = _LazyModule("hashlib")
+gzip = _LazyModule("gzip")
+json = _LazyModule("json")
+multiprocessing = _LazyModule("multiprocessing")
+socket = _LazyModule("socket")
+subprocess = _LazyModule("subprocess")
+threading = _LazyModule("threading")
+zipfile = _LazyModule("zipfile")
+
+
+def numpy_available():
+    """numpy 是否可用（只查找不导入）"""
+    import importlib.util
+    return importlib.util.find_spec("numpy") is not None
+
 
 RESOURCE_URL = "https://github.com/TalkandStudy/miji-game/raw/refs/heads/main/mj.data.zip" 
-RESOURCE_ZIP_NAME = "mj_data_temp.zip"
-TARGET_DIR = "mj_data"
-
-def download_and_extract_resources():
-    """检测资源文件夹，不存在则下载压缩包并解压"""
-    # 检查目标文件夹是否存在
-    if os.path.exists(TARGET_DIR):
-        print(f"资源文件夹 {TARGET_DIR} 已存在，跳过下载")
-        return True
-    
+RESOURCE_ZIP_NAME = "mj.data.zip"
+RESOURCE_SHA256 = "2ce463578c13e3ef6db1326b4a9fdeeea13d6ea629b5a1168247af9f42aeca98"
+TARGET_DIR = "mj_data"  # 旧版解压目录，仍然兼容
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+# 本地缓存目录（资源缓存、下载的资源包），游戏目录只读时也能使用
+CACHE_DIR = os.environ.get("MIJI_CACHE_DIR") or os.path.join(
+    os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"), "miji")
+
+
+class ZipAssetProvider:
+    """直接从资源压缩包读取用到的成员到内存，不解压到磁盘；读取时校验CRC和大小"""
+
+    def __init__(self, path):
+        self.path = path
+        self._zip = zipfile.ZipFile(path)
+
+    def __repr__(self):
+        return f"ZipAssetProvider({self.path!r})"
+
+    def fingerprint(self, name):
+        """成员的内容指纹（取自中央目录的CRC和大小，无需解压）"""
+        info = self._zip.getinfo(name)
+        return f"{name}:{info.CRC:08x}:{info.file_size}".encode()
+
+    def read(self, name):
+        try:
+            info = self._zip.getinfo(name)
+        except KeyError:
+            raise FileNotFoundError(f"{self.path} 中缺少 {name}") from None
+        try:
+            data = self._zip.read(info)  # 完整读取时 zipfile 会校验CRC，不符抛出 BadZipFile
+        except zlib.error as e:
+            raise zipfile.BadZipFile(f"{name} 数据损坏：{e}") from None
+        if len(data) != info.file_size:
+            raise zipfile.BadZipFile(f"{name} 大小不符：{len(data)} != {info.file_size}")
+        return data
+
+    def open(self, name):
+        return io.BytesIO(self.read(name))
+
+
+class DirectoryAssetProvider:
+    """从已解压的资源目录读取（兼容旧版 mj_data/）"""
+
+    def __init__(self, path):
+        self.path = path
+
+    def __repr__(self):
+        return f"DirectoryAssetProvider({self.path!r})"
+
+    def fingerprint(self, name):
+        with open(os.path.join(self.path, name), "rb") as f:
+            return name.encode() + hashlib.sha256(f.read()).digest()
+
+    def read(self, name):
+        with open(os.path.join(self.path, name), "rb") as f:
+            return f.read()
+
+    def open(self, name):
+        return io.BytesIO(self.read(name))
+
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def print_download_progress(done, total, rate):
+    """默认进度输出：已下载/总大小、百分比和速度"""
+    percent = f"{done * 100 // total:3d}%" if total else "   ?"
+    sys.stdout.write(f"\r  {percent}  {done / 1e6:6.2f}/{(total or 0) / 1e6:.2f} MB"
+                     f"  {rate / 1e6:6.2f} MB/s")
+    if total and done >= total:
+        sys.stdout.write("\n")
+    sys.stdout.flush()
+
+
+def _fetch(url, part_path, timeout, chunk_size, progress):
+    """把url流式写入part_path；已有部分内容时用Range请求续传"""
+    import urllib.error
+    import urllib.request
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    headers = {"Range": f"bytes={offset}-"} if offset else {}
+    request = urllib.request.Request(url, headers=headers)
     try:
-        print(f"正在下载资源包：{RESOURCE_URL}")
-        # 下载压缩包
-        urllib.request.urlretrieve(RESOURCE_URL, RESOURCE_ZIP_NAME)
-        print("下载完成，开始解压...")
-        
-        # 创建目标文件夹
-        os.makedirs(TARGET_DIR, exist_ok=True)
-        
-        # 解压压缩包
-        with zipfile.ZipFile(RESOURCE_ZIP_NAME, 'r') as zip_ref:
-            zip_ref.extractall(TARGET_DIR)
-        
-        print("解压完成")
-        
-        # 删除临时压缩包
-        if os.path.exists(RESOURCE_ZIP_NAME):
-            os.remove(RESOURCE_ZIP_NAME)
-            print(f"已删除临时压缩包：{RESOURCE_ZIP_NAME}")
-        
+        response = urllib.request.urlopen(request, timeout=timeout)
+    except urllib.error.HTTPError as e:
+        if e.code == 416 and offset:
+            return  # 服务器认为已下载完整，交给校验判断
+        raise
+    with response:
+        if offset and response.status == 206:
+            mode = "ab"
+        else:
+            mode, offset = "wb", 0  # 服务器不支持Range，从头下载
+        length = response.headers.get("Content-Length")
+        total = offset + int(length) if length else None
+        done = offset
+        started = time.perf_counter()
+        with open(part_path, mode) as f:
+            while True:
+                chunk = response.read(chunk_size)
+                if not chunk:
+                    break
+                f.write(chunk)
+                done += len(chunk)
+                if progress is not None:
+                    elapsed = time.perf_counter() - started
+                    progress(done, total, (done - offset) / elapsed if elapsed > 0 else 0.0)
+    if total is not None and done < total:
+        raise ConnectionError(f"连接中断：{done}/{total} 字节")
+
+
+def download_resources(dest, urls=None, sha256=RESOURCE_SHA256, timeout=15,
+                       chunk_size=64 * 1024, retries=3, progress=print_download_progress):
+    """流式分块下载资源包到dest：断线后按HTTP Range续传，完成后校验SHA-256，
+    依次尝试各镜像；校验通过才改名为正式文件"""
+    import urllib.error
+    urls = urls or resource_urls()
+    part_path = dest + ".part"
+    os.makedirs(os.path.dirname(os.path.abspath(dest)), exist_ok=True)
+    for url in urls:
+        print(f"正在下载资源包：{url}")
+        fetched = False
+        for attempt in range(retries):
+            try:
+                _fetch(url, part_path, timeout, chunk_size, progress)
+                fetched = True
+                break
+            except urllib.error.HTTPError as e:
+                print(f"\n下载中断（第{attempt + 1}次）：{e}")
+                if 400 <= e.code < 500 and e.code not in (408, 429):
+                    break  # 该地址没有资源（如404），重试无用，换下一个
+            except (OSError, urllib.error.URLError) as e:
+                print(f"\n下载中断（第{attempt + 1}次）：{e}")
+        if not fetched:
+            continue
+        if sha256 and file_sha256(part_path) != sha256:
+            print("资源包校验失败，丢弃并尝试下一个地址")
+            os.remove(part_path)
+            continue
+        os.replace(part_path, dest)
+        print("下载完成，校验通过")
         return True
-    
-    except Exception as e:
-        print(f"资源下载/解压失败：{e}")
-        # 清理临时文件
-        if os.path.exists(RESOURCE_ZIP_NAME):
-            os.remove(RESOURCE_ZIP_NAME)
+    return False
+
+
+def resource_urls():
+    """下载地址：MIJI_RESOURCE_MIRRORS（逗号分隔）中的镜像优先，最后是官方地址"""
+    mirrors = os.environ.get("MIJI_RESOURCE_MIRRORS", "")
+    return [url.strip() for url in mirrors.split(",") if url.strip()] + [RESOURCE_URL]
+
+
+def fetch_shared_resources(dest, sha256=RESOURCE_SHA256):
+    """从共享缓存目录（MIJI_SHARED_CACHE，如机房NFS）复制已校验的资源包，避免重复下载"""
+    shared_dir = os.environ.get("MIJI_SHARED_CACHE")
+    if not shared_dir:
+        return False
+    shared = os.path.join(shared_dir, RESOURCE_ZIP_NAME)
+    if not os.path.isfile(shared) or (sha256 and file_sha256(shared) != sha256):
         return False
+    os.makedirs(os.path.dirname(os.path.abspath(dest)), exist_ok=True)
+    tmp_path = dest + ".part"
+    with open(shared, "rb") as src, open(tmp_path, "wb") as dst:
+        for chunk in iter(lambda: src.read(1 << 20), b""):
+            dst.write(chunk)
+    os.replace(tmp_path, dest)
+    print(f"已从共享缓存获取资源包：{shared}")
+    return True
+
+
+def publish_shared_resources(path):
+    """下载成功后放一份到共享缓存目录（失败不影响游戏）"""
+    shared_dir = os.environ.get("MIJI_SHARED_CACHE")
+    if not shared_dir:
+        return
+    shared = os.path.join(shared_dir, RESOURCE_ZIP_NAME)
+    try:
+        tmp_path = f"{shared}.{os.getpid()}.part"
+        with open(path, "rb") as src, open(tmp_path, "wb") as dst:
+            dst.write(src.read())
+        os.replace(tmp_path, shared)
+    except OSError as e:
+        print(f"警告：写入共享缓存失败 - {e}")
+
 
-# 先下载解压资源
-if not download_and_extract_resources():
-    print("资源加载失败，游戏无法运行！")
-    sys.exit(1)
+def open_asset_provider():
+    """依次查找：当前目录/脚本目录的资源压缩包、旧版解压目录、缓存目录；都没有则下载"""
+    for directory in (os.getcwd(), BASE_DIR, CACHE_DIR):
+        path = os.path.join(directory, RESOURCE_ZIP_NAME)
+        if os.path.isfile(path):
+            return ZipAssetProvider(path)
+    if os.path.isdir(TARGET_DIR):
+        return DirectoryAssetProvider(TARGET_DIR)
+    path = os.path.join(CACHE_DIR, RESOURCE_ZIP_NAME)
+    if fetch_shared_resources(path):
+        return ZipAssetProvider(path)
+    if download_resources(path):
+        publish_shared_resources(path)
+        return ZipAssetProvider(path)
+    return None
 
-pygame.init()
-pygame.font.init()
-pygame.mixer.init()  # 音频初始化
 
-# 游戏窗口设置 - 1920x1220大窗口
+# 游戏窗口尺寸 - 1920x1220大窗口
 WIDTH, HEIGHT = 1920, 1220
-screen = pygame.display.set_mode((WIDTH, HEIGHT))
-pygame.display.set_caption("MIJI-GAME")
+# 速度、寿命、冷却等数值都以60Hz的一帧为单位
+SIM_REFERENCE_HZ = 60
 
 # 颜色定义
 BLUE = (98, 202, 255)    # 浅蓝色海洋背景
@@ -79,88 +291,1416 @@ BROWN = (139, 69, 19)       # 陆地颜色
 GREEN_CAMP = (34, 139, 34)  # 军营颜色
 ORANGE = (255, 165, 0)      # 主炮炮弹颜色
 
-try:
-    # 近防炮图片
-    cannon_img = pygame.image.load(f"{TARGET_DIR}/jfp.png").convert_alpha()
-    cannon_img = pygame.transform.rotate(cannon_img, -90)
-    cannon_img = pygame.transform.scale(cannon_img, (80, 80))
-    # 导弹图片
-    missile_img = pygame.image.load(f"{TARGET_DIR}/dd.png").convert_alpha()
-    missile_img = pygame.transform.scale(missile_img, (40, 20))
-    # 发射箱图片 - 旋转90度
-    launcher_img = pygame.image.load(f"{TARGET_DIR}/fsx.png").convert_alpha()
-    launcher_img = pygame.transform.rotate(launcher_img, 90)  # 旋转90度
-    launcher_img = pygame.transform.scale(launcher_img, (60, 60))
-    # 防空导弹图片 - 放大至100x40
-    anti_missile_img = pygame.image.load(f"{TARGET_DIR}/fkdd.png").convert_alpha()
-    anti_missile_img = pygame.transform.scale(anti_missile_img, (100, 40))
-    # 加载船底图片
-    ship_img = pygame.image.load(f"{TARGET_DIR}/c.png").convert_alpha()
-    ship_img = pygame.transform.scale(ship_img, (800, 150))
-    # 加载主炮图片
-    main_cannon_img = pygame.image.load(f"{TARGET_DIR}/zp.png").convert_alpha()
-    main_cannon_img = pygame.transform.rotate(main_cannon_img, -90)
-    main_cannon_img = pygame.transform.scale(main_cannon_img, (120, 100))
-    # 加载近防炮音效
-    cannon_sound = pygame.mixer.Sound(f"{TARGET_DIR}/sounds/jfp.mp3")
-    cannon_sound.set_volume(0.5)
-    # 加载主炮音效
-    main_cannon_sound = pygame.mixer.Sound(f"{TARGET_DIR}/sounds/zp.mp3")
-    main_cannon_sound.set_volume(0.7)
-except FileNotFoundError as e:
-    print(f"警告：未找到文件 - {e}，使用默认替代")
-    # 近防炮默认图形
-    cannon_img = pygame.Surface((80, 80), pygame.SRCALPHA)
-    pygame.draw.circle(cannon_img, (100, 100, 100), (40, 40), 40)
-    # 来袭导弹默认图形
-    missile_img = pygame.Surface((40, 20), pygame.SRCALPHA)
-    pygame.draw.rect(missile_img, RED, (0, 0, 40, 20))
-    # 发射箱默认图形（旋转90度）
-    launcher_img = pygame.Surface((60, 60), pygame.SRCALPHA)
-    pygame.draw.rect(launcher_img, (50, 50, 50), (0, 0, 60, 60))
-    launcher_img = pygame.transform.rotate(launcher_img, 90)
-    # 防空导弹默认图形
-    anti_missile_img = pygame.Surface((100, 40), pygame.SRCALPHA)
-    pygame.draw.rect(anti_missile_img, YELLOW, (0, 0, 100, 40))
-    # 船底默认图形
-    ship_img = pygame.Surface((800, 150), pygame.SRCALPHA)
-    pygame.draw.rect(ship_img, WHITE, (0, 0, 800, 150), border_radius=20)
-    pygame.draw.circle(ship_img, WHITE, (0, 75), 75)
-    pygame.draw.circle(ship_img, WHITE, (800, 75), 75)
-    # 主炮默认图形
-    main_cannon_img = pygame.Surface((120, 100), pygame.SRCALPHA)
-    pygame.draw.rect(main_cannon_img, (80, 80, 80), (0, 0, 120, 100))
-    # 音效默认空
-    cannon_sound = None
-    main_cannon_sound = None
+SHIP_SIZE = (800, 150)  # 船底图片尺寸
+
+# 图片资源：名称 -> (文件, 旋转角度, 缩放尺寸)
+IMAGE_SPECS = {
+    "cannon": ("jfp.png", -90, (80, 80)),          # 近防炮
+    "missile": ("dd.png", 0, (40, 20)),            # 导弹
+    "launcher": ("fsx.png", 90, (60, 60)),         # 发射箱 - 旋转90度
+    "anti_missile": ("fkdd.png", 0, (100, 40)),    # 防空导弹 - 放大至100x40
+    "ship": ("c.png", 0, SHIP_SIZE),               # 船底
+    "main_cannon": ("zp.png", -90, (120, 100)),    # 主炮
+}
+# 音效资源：名称 -> (文件, 音量, 截取时长ms)；近防炮音效每次只播放100ms
+SOUND_SPECS = {
+    "cannon": ("sounds/jfp.mp3", 0.5, 100),
+    "main_cannon": ("sounds/zp.mp3", 0.7, None),
+}
+
+ASSET_CACHE_VERSION = 2
+ASSET_CACHE_MAGIC = b"MJAC"
+ASSET_CACHE_DIR = os.path.join(CACHE_DIR, "assets")
+
+asset_timings = {}  # 资源名 -> 加载耗时（毫秒）
+
+
+def _trim_pcm(raw, milliseconds):
+    """按混音器格式把PCM数据截到指定时长（按采样帧对齐）"""
+    freq, size, channels = pygame.mixer.get_init()
+    frame_bytes = abs(size) // 8 * channels
+    frames = freq * milliseconds // 1000
+    return raw[:frames * frame_bytes]
+
+
+def _decode_images(provider):
+    """解码图片源文件并做旋转/缩放，返回 名称 -> (RGBA字节, 宽, 高)。
+    不依赖显示窗口：先转成RGBA再变换，与 convert_alpha() 后变换结果一致"""
+    decoded = {}
+    for name, (filename, angle, size) in IMAGE_SPECS.items():
+        t = time.perf_counter()
+        source = pygame.image.load(provider.open(filename), filename)
+        image = pygame.image.frombytes(pygame.image.tobytes(source, "RGBA"),
+                                       source.get_size(), "RGBA")
+        if angle:
+            image = pygame.transform.rotate(image, angle)
+        image = pygame.transform.scale(image, size)
+        decoded[name] = (pygame.image.tobytes(image, "RGBA"), size[0], size[1])
+        asset_timings[f"decode:{name}"] = (time.perf_counter() - t) * 1000
+    return decoded
+
+
+def _decode_sounds(provider):
+    """解码音效源文件并截取，返回 名称 -> (PCM字节,)；需要混音器已初始化"""
+    decoded = {}
+    for name, (filename, volume, milliseconds) in SOUND_SPECS.items():
+        t = time.perf_counter()
+        raw = pygame.mixer.Sound(file=provider.open(filename)).get_raw()
+        if milliseconds:
+            raw = _trim_pcm(raw, milliseconds)
+        decoded[name] = (raw,)
+        asset_timings[f"decode:{name}"] = (time.perf_counter() - t) * 1000
+    return decoded
+
+
+def _write_asset_cache(path, key, decoded):
+    """缓存文件格式：魔数 + 版本 + 头长度 + JSON头 + 原始RGBA像素/PCM数据"""
+    header = {"key": key, "entries": {}}
+    offset = 0
+    for name, (data, *meta) in decoded.items():
+        header["entries"][name] = [offset, len(data), *meta]
+        offset += len(data)
+    header_bytes = json.dumps(header).encode()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(ASSET_CACHE_MAGIC + struct.pack("<II", ASSET_CACHE_VERSION, len(header_bytes)))
+        f.write(header_bytes)
+        for data, *meta in decoded.values():
+            f.write(data)
+    os.replace(tmp_path, path)
+
+
+def _read_asset_cache(path, key):
+    """内存映射缓存文件，返回(条目字典, 数据区memoryview)；缓存无效时抛出ValueError"""
+    with open(path, "rb") as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    prefix = 4 + struct.calcsize("<II")
+    if mapped[:4] != ASSET_CACHE_MAGIC:
+        raise ValueError("缓存文件格式不符")
+    version, header_len = struct.unpack("<II", mapped[4:prefix])
+    header = json.loads(mapped[prefix:prefix + header_len])
+    if version != ASSET_CACHE_VERSION or header["key"] != key:
+        raise ValueError("缓存已过期")
+    # 图片/音效直接引用映射中的数据，memoryview 保持映射存活
+    return header["entries"], memoryview(mapped)[prefix + header_len:]
+
+
+def default_image(name):
+    """资源文件缺失时的默认图形"""
+    width, height = IMAGE_SPECS[name][2]
+    image = pygame.Surface((width, height), pygame.SRCALPHA)
+    if name == "cannon":          # 近防炮
+        pygame.draw.circle(image, (100, 100, 100), (40, 40), 40)
+    elif name == "missile":       # 来袭导弹
+        pygame.draw.rect(image, RED, (0, 0, 40, 20))
+    elif name == "launcher":      # 发射箱（旋转90度）
+        pygame.draw.rect(image, (50, 50, 50), (0, 0, 60, 60))
+        image = pygame.transform.rotate(image, 90)
+    elif name == "anti_missile":  # 防空导弹
+        pygame.draw.rect(image, YELLOW, (0, 0, 100, 40))
+    elif name == "ship":          # 船底
+        pygame.draw.rect(image, WHITE, (0, 0, 800, 150), border_radius=20)
+        pygame.draw.circle(image, WHITE, (0, 75), 75)
+        pygame.draw.circle(image, WHITE, (800, 75), 75)
+    elif name == "main_cannon":   # 主炮
+        pygame.draw.rect(image, (80, 80, 80), (0, 0, 120, 100))
+    return image
+
+
+class AssetLibrary:
+    """按需加载的图片/音效：第一次使用时才定位资源包、读取预处理缓存。
+    图片和音效各自一个缓存文件，缓存缺失或过期时解码该类全部源文件并重建"""
+
+    def __init__(self):
+        self._provider = None
+        self._images = {}
+        self._sounds = {}
+        self._caches = {}  # 类型 -> (条目字典, 数据)
+
+    @property
+    def provider(self):
+        """资源包（首次访问时查找或下载）；找不到时抛出 FileNotFoundError"""
+        if self._provider is None:
+            t = time.perf_counter()
+            self._provider = open_asset_provider()
+            asset_timings["provider"] = (time.perf_counter() - t) * 1000
+            if self._provider is None:
+                raise FileNotFoundError("资源包不可用")
+        return self._provider
+
+    def image(self, name):
+        """图片（有显示窗口时转换为显示格式）；加载失败时用默认图形"""
+        image = self._images.get(name)
+        if image is None:
+            t = time.perf_counter()
+            try:
+                entries, data = self._cache("images")
+                offset, length, w, h = entries[name]
+                image = pygame.image.frombuffer(data[offset:offset + length], (w, h), "RGBA")
+                if pygame.display.get_surface() is not None:
+                    image = image.convert_alpha()
+            except FileNotFoundError as e:
+                print(f"警告：未找到文件 - {e}，使用默认替代")
+                image = default_image(name)
+            except zipfile.BadZipFile as e:
+                print(f"警告：资源包损坏 - {e}，使用默认替代")
+                image = default_image(name)
+            self._images[name] = image
+            asset_timings[f"image:{name}"] = (time.perf_counter() - t) * 1000
+        return image
+
+    def sound(self, name):
+        """音效；混音器未初始化（未启用声音）或加载失败时为None"""
+        if name in self._sounds:
+            return self._sounds[name]
+        if not pygame.mixer.get_init():
+            return None
+        t = time.perf_counter()
+        sound = None
+        try:
+            entries, data = self._cache("sounds")
+            offset, length = entries[name]
+            sound = pygame.mixer.Sound(buffer=data[offset:offset + length])
+            sound.set_volume(SOUND_SPECS[name][1])
+        except FileNotFoundError as e:
+            print(f"警告：未找到文件 - {e}，不播放音效")
+        except zipfile.BadZipFile as e:
+            print(f"警告：资源包损坏 - {e}，不播放音效")
+        self._sounds[name] = sound
+        asset_timings[f"sound:{name}"] = (time.perf_counter() - t) * 1000
+        return sound
+
+    def preload(self, sounds=True):
+        """一次加载全部资源（避免首帧卡顿）"""
+        for name in IMAGE_SPECS:
+            self.image(name)
+        if sounds:
+            for name in SOUND_SPECS:
+                self.sound(name)
+
+    def rebuild(self):
+        """忽略现有缓存，重新解码并写入"""
+        self._images.clear()
+        self._sounds.clear()
+        self._caches.clear()
+        self._cache("images", rebuild=True)
+        if pygame.mixer.get_init():
+            self._cache("sounds", rebuild=True)
+
+    def _cache_key(self, kind):
+        """源文件内容指纹 + 变换参数 + 混音器格式 + 缓存版本 的哈希"""
+        specs = IMAGE_SPECS if kind == "images" else SOUND_SPECS
+        h = hashlib.sha256()
+        h.update(repr((ASSET_CACHE_VERSION, kind, specs,
+                       pygame.mixer.get_init() if kind == "sounds" else None)).encode())
+        for filename in sorted({spec[0] for spec in specs.values()}):
+            try:
+                h.update(self.provider.fingerprint(filename))
+            except KeyError:
+                raise FileNotFoundError(f"{self.provider} 中缺少 {filename}") from None
+        return h.hexdigest()
+
+    def _cache(self, kind, rebuild=False):
+        cached = self._caches.get(kind)
+        if cached is not None:
+            return cached
+        t = time.perf_counter()
+        key = self._cache_key(kind)
+        path = os.path.join(ASSET_CACHE_DIR, f"{kind}-v{ASSET_CACHE_VERSION}.bin")
+        asset_timings[f"{kind}:source"] = "cache"
+        if not rebuild:
+            try:
+                cached = _read_asset_cache(path, key)
+            except (OSError, ValueError, KeyError, struct.error):
+                cached = None
+        if cached is None:
+            asset_timings[f"{kind}:source"] = "decode"
+            decode = _decode_images if kind == "images" else _decode_sounds
+            decoded = decode(self.provider)
+            try:
+                _write_asset_cache(path, key, decoded)
+            except OSError as e:
+                print(f"警告：资源缓存写入失败 - {e}")
+            entries, data, offset = {}, bytearray(), 0
+            for name, (blob, *meta) in decoded.items():
+                entries[name] = [offset, len(blob), *meta]
+                data += blob
+                offset += len(blob)
+            cached = (entries, memoryview(bytes(data)))
+        self._caches[kind] = cached
+        asset_timings[f"{kind}:cache"] = (time.perf_counter() - t) * 1000
+        return cached
+
+
+assets = AssetLibrary()
+
+
+def print_startup_report():
+    """打印模块导入、子系统初始化和各资源加载耗时"""
+    print(f"资源：{assets._provider or '-'}，"
+          f"图片来源：{asset_timings.get('images:source', '-')}，"
+          f"音效来源：{asset_timings.get('sounds:source', '-')}")
+    print("启动：")
+    for name, ms in sorted(startup_timings.items(), key=lambda kv: -kv[1]):
+        print(f"    {name:<24}{ms:8.2f} ms")
+    print("资源：")
+    timings = {k: v for k, v in asset_timings.items() if not k.endswith(":source")}
+    for name, ms in sorted(timings.items(), key=lambda kv: -kv[1]):
+        print(f"    {name:<24}{ms:8.2f} ms")
+
+
+def _burst_pcm(raw, period_ms, length_ms=480):
+    """把单发音效拼成连发音轨：每period_ms一发（单发截断/补静音到一个周期），
+    总长约length_ms，用于循环播放"""
+    freq, size, channels = pygame.mixer.get_init()
+    frame_bytes = abs(size) // 8 * channels
+    period = max(1, freq * period_ms // 1000) * frame_bytes
+    shot = bytes(raw[:period])
+    shot += bytes(period - len(shot))  # 有符号PCM静音为0
+    return shot * max(1, length_ms // period_ms)
+
+
+class _VoiceGroup:
+    """一类音效的声部配置和状态"""
+
+    def __init__(self, name, sound, channels, priority, min_interval, burst_after, steal):
+        self.name = name
+        self.sound = sound
+        self.channels = channels        # 预留的通道编号
+        self.priority = priority
+        self.min_interval = min_interval
+        self.burst_after = burst_after
+        self.steal = steal
+        self.last_played = None
+        self.burst_channel = None       # 正在循环连发音轨的通道
+        self.burst_period = None
+        self._bursts = {}               # 周期ms -> 连发音轨
+
+    def burst(self, period_ms):
+        sound = self._bursts.get(period_ms)
+        if sound is None:
+            sound = pygame.mixer.Sound(buffer=_burst_pcm(self.sound.get_raw(), period_ms))
+            sound.set_volume(self.sound.get_volume())
+            self._bursts[period_ms] = sound
+        return sound
+
+
+class SoundCue:
+    """绑定到某类音效的播放句柄，武器持有它代替 pygame Sound"""
+
+    __slots__ = ("manager", "name")
+
+    def __init__(self, manager, name):
+        self.manager = manager
+        self.name = name
+
+    def play(self):
+        return self.manager.play(self.name)
+
+
+class SoundManager:
+    """音效声部管理：每类武器预留自己的混音通道，其他类别不会占用；同类音效按最小间隔
+    限流，快速连发合并为一条循环播放的连发音轨。自己的通道不够时，steal=True 的类别
+    （主炮）重用自己最早的声部，保证不被丢弃；其他类别使用共用的溢出通道，
+    溢出通道满了抢占其中低优先级的声部"""
+
+    BURST_TAIL = 0.12    # 连发停止多久后结束循环（秒）
+    BURST_QUANTUM = 10   # 连发周期取整（毫秒），避免生成过多音轨
+    SHARED_CHANNELS = 2  # 共用溢出通道数
+
+    def __init__(self, clock=time.perf_counter, shared_channels=SHARED_CHANNELS):
+        self.clock = clock
+        self.groups = {}
+        self._channels = []  # 通道编号 -> Channel
+        self._started = []   # 通道编号 -> 最近开始播放的时间
+        self._shared = self._reserve(shared_channels)
+        self._owners = {}    # 溢出通道编号 -> 最近使用它的类别
+        self.counters = {"played": 0, "coalesced": 0, "rate_limited": 0,
+                         "stolen": 0, "dropped": 0}
+
+    def _reserve(self, count):
+        """追加count个由本管理器分配的预留通道，返回其编号"""
+        first = len(self._channels)
+        total = first + count
+        if pygame.mixer.get_num_channels() < total + 4:
+            pygame.mixer.set_num_channels(total + 4)  # 留几个通道给未管理的音效
+        pygame.mixer.set_reserved(total)
+        self._channels.extend(pygame.mixer.Channel(i) for i in range(first, total))
+        self._started.extend([0.0] * count)
+        return list(range(first, total))
+
+    def add_group(self, name, sound, channels=1, priority=0, min_interval=0.0,
+                  burst_after=None, steal=False):
+        """注册音效类别并预留channels个通道；min_interval秒内的重复触发被限流，
+        间隔小于burst_after秒的连续触发改为循环连发音轨"""
+        self.groups[name] = _VoiceGroup(name, sound, self._reserve(channels), priority,
+                                        min_interval, burst_after, steal)
+
+    def cue(self, name):
+        """播放句柄；该类别未注册（音效缺失）时为None"""
+        return SoundCue(self, name) if name in self.groups else None
+
+    def play(self, name):
+        """触发一次音效，返回播放所用的Channel（被限流/合并/丢弃时为None）"""
+        group = self.groups[name]
+        now = self.clock()
+        last = group.last_played
+        if last is not None and now - last < group.min_interval:
+            self.counters["rate_limited"] += 1
+            return None
+        group.last_played = now
+        if group.burst_after is not None and last is not None and now - last < group.burst_after:
+            quantum = self.BURST_QUANTUM
+            period = max(quantum, int(round((now - last) * 1000 / quantum)) * quantum)
+            channel = group.burst_channel
+            if channel is not None and channel.get_busy():
+                if group.burst_period == period:
+                    self.counters["coalesced"] += 1
+                    return None
+                # 射速变化：同一通道换成新周期的音轨
+            else:
+                index = self._voice(group)
+                if index is None:
+                    return None
+                channel = self._channels[index]
+            channel.play(group.burst(period), loops=-1)
+            group.burst_channel, group.burst_period = channel, period
+            self.counters["played"] += 1
+            return channel
+        index = self._voice(group)
+        if index is None:
+            return None
+        channel = self._channels[index]
+        channel.play(group.sound)
+        self.counters["played"] += 1
+        return channel
+
+    def update(self):
+        """每帧调用：连发停止后结束循环音轨"""
+        now = self.clock()
+        for group in self.groups.values():
+            if group.burst_channel is not None and now - group.last_played > self.BURST_TAIL:
+                group.burst_channel.fadeout(30)
+                group.burst_channel = group.burst_period = None
+
+    def _voice(self, group):
+        """分配通道编号：本类空闲通道 -> (steal)本类最早的声部 -> 空闲溢出通道
+        -> 抢占溢出通道里低优先级的声部；预留给其他类别的通道从不占用"""
+        channels, started = self._channels, self._started
+        for i in group.channels:
+            if not channels[i].get_busy():
+                started[i] = self.clock()
+                return i
+        if group.steal:
+            i = min(group.channels, key=started.__getitem__)
+            return self._steal(i, group, group)
+        victim = None
+        for i in self._shared:
+            if not channels[i].get_busy():
+                self._owners[i] = group
+                started[i] = self.clock()
+                return i
+            owner = self._owners.get(i)  # 不是本管理器放的声音时不抢占
+            if (owner is not None and owner.priority < group.priority
+                    and (victim is None or (owner.priority, started[i]) < victim[:2])):
+                victim = (owner.priority, started[i], i)
+        if victim is None:
+            self.counters["dropped"] += 1
+            return None
+        i = victim[2]
+        owner, self._owners[i] = self._owners[i], group
+        return self._steal(i, owner, group)
+
+    def _steal(self, i, owner, group):
+        """停掉owner在通道i上的声部，交给group"""
+        channel = self._channels[i]
+        if owner.burst_channel is channel:
+            owner.burst_channel = owner.burst_period = None
+        channel.stop()
+        self._started[i] = self.clock()
+        self.counters["stolen"] += 1
+        return i
+
+    def stats(self):
+        """计数器 + 各类别正在发声的声部数"""
+        voices = {name: sum(1 for i in group.channels if self._channels[i].get_busy())
+                  for name, group in self.groups.items()}
+        for i in self._shared:
+            if self._channels[i].get_busy() and i in self._owners:
+                voices[self._owners[i].name] += 1
+        return dict(self.counters, voices=sum(voices.values()), voices_by_group=voices,
+                    channels=len(self._channels))
+
+
+def create_sound_manager():
+    """按武器配置声部；混音器未初始化时为None。
+    近防炮两门共用2个通道、同帧重复限流、连发合并；主炮优先级最高"""
+    if not pygame.mixer.get_init():
+        return None
+    manager = SoundManager()
+    cannon = assets.sound("cannon")
+    if cannon is not None:
+        manager.add_group("cannon", cannon, channels=2, priority=0, min_interval=0.012,
+                          burst_after=0.1)
+    main_cannon = assets.sound("main_cannon")
+    if main_cannon is not None:
+        manager.add_group("main_cannon", main_cannon, channels=3, priority=10, steal=True)
+    return manager
+
+
+class RotationAtlas:
+    """按角度分桶预渲染的旋转精灵图集，绘制时只需查表+blit"""
+
+    def __init__(self, default_step=2):
+        self.default_step = default_step  # 默认角度分辨率（度）
+        self._sprites = {}  # 名称 -> [原图或加载函数, 分桶数, 每桶度数, 帧列表]
+
+    def register(self, name, image, step=None, prebake=False):
+        """注册精灵，step为该精灵的角度分桶大小（度）；
+        image 可以是返回图片的函数，第一次渲染时才调用"""
+        step = step or self.default_step
+        buckets = max(1, int(round(360 / step)))
+        self._sprites[name] = [image, buckets, 360 / buckets, [None] * buckets]
+        if prebake:
+            self.prebake(name)
+
+    def _source(self, name):
+        sprite = self._sprites[name]
+        if callable(sprite[0]):
+            sprite[0] = sprite[0]()
+        return sprite[0]
+
+    def prebake(self, name=None):
+        """预先渲染全部角度（不传名称则渲染所有精灵）"""
+        names = [name] if name else list(self._sprites)
+        for n in names:
+            image = self._source(n)
+            _, buckets, step, frames = self._sprites[n]
+            for i in range(buckets):
+                if frames[i] is None:
+                    frames[i] = pygame.transform.rotate(image, i * step)
+
+    def get(self, name, angle):
+        """按弧度朝向取旋转后的图像（与 rotate(img, -degrees(angle)) 等价）"""
+        image, buckets, step, frames = self._sprites[name]
+        index = int(round(-math.degrees(angle) / step)) % buckets
+        frame = frames[index]
+        if frame is None:
+            # 首次使用时懒渲染
+            frame = frames[index] = pygame.transform.rotate(self._source(name), index * step)
+        return frame
+
+    def blit(self, surface, name, angle, center):
+        """以center为中心绘制旋转精灵"""
+        frame = self.get(name, angle)
+        rect = frame.get_rect(center=center)
+        return surface.blit(frame, rect)
+
+    def memory_bytes(self, name=None):
+        """已渲染帧占用的像素内存（字节）"""
+        names = [name] if name else list(self._sprites)
+        total = 0
+        for n in names:
+            for frame in self._sprites[n][3]:
+                if frame is not None:
+                    total += frame.get_pitch() * frame.get_height()
+        return total
+
+    def memory_report(self):
+        """各精灵的分桶数、已渲染帧数和内存占用"""
+        report = {}
+        for name, (image, buckets, step, frames) in self._sprites.items():
+            report[name] = {
+                "step_degrees": step,
+                "buckets": buckets,
+                "baked": sum(1 for f in frames if f is not None),
+                "bytes": self.memory_bytes(name),
+            }
+        return report
+
+
+# 旋转精灵图集（导弹类角度变化快，炮塔需要更平滑的转向）
+sprite_atlas = RotationAtlas(default_step=2)
+sprite_atlas.register("missile", lambda: assets.image("missile"), step=3)
+sprite_atlas.register("anti_missile", lambda: assets.image("anti_missile"), step=2)
+sprite_atlas.register("cannon", lambda: assets.image("cannon"), step=1)
+sprite_atlas.register("main_cannon", lambda: assets.image("main_cannon"), step=2)
+
+
+class TextRenderer:
+    """字体注册表 + 有界LRU文字渲染缓存（HUD文字大多帧内不变）"""
+
+    def __init__(self, max_entries=128):
+        self.max_entries = max_entries
+        self._fonts = {}  # (字体, 字号) -> Font
+        self._cache = OrderedDict()  # (文字, 字体, 字号, 颜色, 抗锯齿) -> Surface
+        self.hits = 0
+        self.misses = 0
+
+    def font(self, size, face=None):
+        """每个(字体, 字号)只加载一次"""
+        key = (face, size)
+        font = self._fonts.get(key)
+        if font is None:
+            if not pygame.font.get_init():
+                pygame.font.init()
+            font = self._fonts[key] = pygame.font.SysFont(face, size)
+        return font
+
+    def render(self, text, size, color, antialias=True, face=None):
+        """渲染文字，命中缓存时直接返回已有Surface"""
+        key = (text, face, size, color, antialias)
+        surface = self._cache.get(key)
+        if surface is not None:
+            self._cache.move_to_end(key)
+            self.hits += 1
+            return surface
+        self.misses += 1
+        surface = self.font(size, face).render(text, antialias, color)
+        self._cache[key] = surface
+        if len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)  # 淘汰最久未用
+        return surface
+
+    def stats(self):
+        """缓存命中统计"""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": len(self._cache),
+            "fonts": len(self._fonts),
+        }
+
+
+text_renderer = TextRenderer()
+
+
+_dot_sprites = {}  # (颜色, 半径) -> 圆点精灵
+
+
+def dot_sprite(color, radius):
+    """预渲染的实心圆点（子弹、炮弹），左上角放在(x-r, y-r)与 draw.circle 逐像素一致"""
+    key = (color, radius)
+    sprite = _dot_sprites.get(key)
+    if sprite is None:
+        sprite = pygame.Surface((radius * 2, radius * 2), pygame.SRCALPHA)
+        pygame.draw.circle(sprite, color, (radius, radius), radius)
+        _dot_sprites[key] = sprite
+    return sprite
+
+
+def explosion_sprite(radius):
+    """预渲染的爆炸圈（外圈橙色、内圈红色）"""
+    key = ("explosion", radius)
+    sprite = _dot_sprites.get(key)
+    if sprite is None:
+        sprite = pygame.Surface((radius * 2, radius * 2), pygame.SRCALPHA)
+        pygame.draw.circle(sprite, ORANGE, (radius, radius), radius, 2)
+        pygame.draw.circle(sprite, RED, (radius, radius), radius // 2, 1)
+        _dot_sprites[key] = sprite
+    return sprite
+
+
+_scaled_images = weakref.WeakKeyDictionary()  # 原图 -> {缩放比例: 缩放后的图}
+
+
+def scaled_image(image, scale):
+    """按渲染缩放比例缩放的精灵，每张图每个比例只缩放一次（原图释放后缓存随之清除）"""
+    if scale == 1:
+        return image
+    variants = _scaled_images.get(image)
+    if variants is None:
+        variants = _scaled_images[image] = {}
+    scaled = variants.get(scale)
+    if scaled is None:
+        width, height = image.get_size()
+        scaled = variants[scale] = pygame.transform.smoothscale(
+            image, (max(1, round(width * scale)), max(1, round(height * scale))))
+    return scaled
+
+
+def prescale_sprites(scale):
+    """预先缩放图片资源和粒子帧（旋转帧在第一次用到时随旋转一起缩放）"""
+    if scale == 1:
+        return
+    for name in IMAGE_SPECS:
+        scaled_image(assets.image(name), scale)
+    if numpy_available():
+        for frame in particle_frames():
+            scaled_image(frame, scale)
+
+
+class RenderQueue:
+    """一帧的精灵绘制队列，接口与 Surface.blit 相同，draw_at 可以直接画进队列。
+    完全在视口外的绘制直接剔除；同一层内相同纹理的绘制排在一起，
+    flush时每层只调用一次 Surface.blits。
+    坐标和图片都是世界单位，scale不为1时提交前换成缩放后的精灵和像素坐标"""
+
+    def __init__(self, viewport, scale=1):
+        self.viewport = pygame.Rect(viewport)
+        self.scale = scale
+        self._layers = [{}]  # 每层：id(纹理) -> [(纹理, 位置), ...]
+        self.submitted = 0   # 本帧提交的绘制数
+        self.culled = 0      # 本帧剔除的绘制数
+        self.frames = 0
+        self.total_submitted = 0
+        self.total_culled = 0
+        self.last_stats = {"submitted": 0, "culled": 0, "layers": 0}
+
+    def layer(self):
+        """开始新的一层，之后的绘制都盖在前面各层之上"""
+        if self._layers[-1]:
+            self._layers.append({})
+
+    def blit(self, image, dest):
+        """登记一次绘制，返回目标矩形（被剔除时为零大小矩形）"""
+        width, height = image.get_size()
+        rect = pygame.Rect(dest[0], dest[1], width, height)
+        if not self.viewport.colliderect(rect):
+            self.culled += 1
+            return pygame.Rect(rect.x, rect.y, 0, 0)
+        self.submitted += 1
+        if self.scale != 1:
+            image = scaled_image(image, self.scale)
+            dest = (round(dest[0] * self.scale), round(dest[1] * self.scale))
+        group = self._layers[-1].get(id(image))
+        if group is None:
+            group = self._layers[-1][id(image)] = []
+        group.append((image, dest))
+        return rect
+
+    def extend(self, draws, culled=0):
+        """登记一批调用方已剔除、已按纹理排好序的绘制 [(纹理, 位置), ...]（如粒子）"""
+        if draws:
+            layer = self._layers[-1]
+            layer[("batch", len(layer))] = draws
+        self.submitted += len(draws)
+        self.culled += culled
+
+    def flush(self, surface):
+        """按层提交到surface，返回实际绘制的矩形列表（脏矩形），并开始下一帧"""
+        rects = []
+        for layer in self._layers:
+            if layer:
+                rects.extend(surface.blits([draw for group in layer.values() for draw in group]))
+        self.frames += 1
+        self.total_submitted += self.submitted
+        self.total_culled += self.culled
+        self.last_stats = {"submitted": self.submitted, "culled": self.culled,
+                           "layers": sum(1 for layer in self._layers if layer)}
+        self._layers = [{}]
+        self.submitted = self.culled = 0
+        return rects
+
+    def stats(self):
+        """上一帧的提交/剔除数，以及累计的每帧平均值"""
+        frames = self.frames or 1
+        stats = dict(self.last_stats)
+        stats["mean_submitted"] = self.total_submitted / frames
+        stats["mean_culled"] = self.total_culled / frames
+        return stats
+
+
+def swept_hit_time(dx, dy, mx, my, reach):
+    """扫掠圆-圆检测：两圆起始相对位置(dx, dy)、本步相对位移(mx, my)、半径和reach，
+    返回本步内最早接触的时刻 t∈[0, 1]（起始已相交为0），不接触返回None。
+    解 |d + m·t| = reach，只取进入时刻"""
+    c = dx * dx + dy * dy - reach * reach
+    if c < 0:
+        return 0.0
+    a = mx * mx + my * my
+    b = dx * mx + dy * my
+    if a == 0 or b >= 0:
+        return None  # 相对静止或正在远离
+    disc = b * b - a * c
+    if disc < 0:
+        return None
+    t = (-b - math.sqrt(disc)) / a
+    return t if t <= 1 else None
+
+
+class SpatialGrid:
+    """均匀网格空间索引，每帧重建一次，用于圆形碰撞和范围查询"""
+
+    def __init__(self, cell_size=64):
+        self.cell_size = cell_size
+        self.entities = []
+        self._cells = {}  # (格x, 格y) -> 实体下标列表
+        self._max_radius = 0
+        self._max_motion = 0  # 实体本步最大位移，扫掠查询需要扩大搜索范围
+
+    def rebuild(self, entities):
+        """按实体中心点重新分格（entities需有x、y、radius属性，有px、py时记录本步位移）"""
+        size = self.cell_size
+        cells = {}
+        max_radius = 0
+        max_motion = 0
+        for i, entity in enumerate(entities):
+            key = (int(entity.x // size), int(entity.y // size))
+            bucket = cells.get(key)
+            if bucket is None:
+                cells[key] = [i]
+            else:
+                bucket.append(i)
+            if entity.radius > max_radius:
+                max_radius = entity.radius
+            # 曼哈顿距离作为位移上界
+            motion = (abs(entity.x - getattr(entity, "px", entity.x)) +
+                      abs(entity.y - getattr(entity, "py", entity.y)))
+            if motion > max_motion:
+                max_motion = motion
+        self.entities = entities
+        self._cells = cells
+        self._max_radius = max_radius
+        self._max_motion = max_motion
+
+    def _candidates(self, x, y, reach):
+        """覆盖(x±reach, y±reach)的所有格子中的实体下标（按插入顺序）"""
+        size = self.cell_size
+        x0, x1 = int((x - reach) // size), int((x + reach) // size)
+        y0, y1 = int((y - reach) // size), int((y + reach) // size)
+        cells = self._cells
+        indices = []
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                bucket = cells.get((cx, cy))
+                if bucket:
+                    indices.extend(bucket)
+        indices.sort()
+        return indices
+
+    def first_swept(self, x0, y0, x1, y1, radius, active_only=False, moving=True):
+        """圆从(x0, y0)移动到(x1, y1)的过程中最早接触的实体，返回(t, 实体)或None。
+        moving为True时实体本步也从(px, py)移动到了(x, y)，按相对运动计算；
+        否则视实体静止在(x, y)。接触时刻相同取插入顺序靠前者"""
+        entities = self.entities
+        motion = self._max_motion if moving else 0
+        reach = (max(abs(x1 - x0), abs(y1 - y0)) / 2 + radius + self._max_radius + motion)
+        best = None
+        for i in self._candidates((x0 + x1) / 2, (y0 + y1) / 2, reach):
+            entity = entities[i]
+            if active_only and not entity.active:
+                continue
+            ex, ey = entity.x, entity.y
+            if moving:
+                px, py = entity.px, entity.py
+                t = swept_hit_time(x0 - px, y0 - py, (x1 - x0) - (ex - px), (y1 - y0) - (ey - py),
+                                   radius + entity.radius)
+            else:
+                t = swept_hit_time(x0 - ex, y0 - ey, x1 - x0, y1 - y0, radius + entity.radius)
+            if t is not None and (best is None or t < best[0]):
+                best = (t, entity)
+                if t == 0:
+                    break
+        return best
+
+    def within(self, x, y, radius, active_only=False):
+        """中心点距离 < radius 的所有实体"""
+        result = []
+        entities = self.entities
+        for i in self._candidates(x, y, radius):
+            entity = entities[i]
+            if active_only and not entity.active:
+                continue
+            if math.hypot(entity.x - x, entity.y - y) < radius:
+                result.append(entity)
+        return result
+
+
+class StoreEntity:
+    """ProjectileStore 中一行的对象视图，属性读写直接落在数组上，可以像 Bullet/EnemyMissile
+    一样交给威胁跟踪、空间网格、防空导弹和自动驾驶。同一行始终返回同一个视图对象；
+    行被 compact 移除后视图保留最后的值，仍被防空导弹等持有时照常可读"""
+
+    __slots__ = ("_store", "_slot", "_values")
+
+    def __init__(self, store, slot):
+        self._store = store
+        self._slot = slot
+        self._values = None  # 脱离存储后的字段值
+
+    def _field(name):
+        def getter(self):
+            store = self._store
+            if store is None:
+                return self._values[name]
+            return getattr(store, name).item(self._slot)  # 转成Python float/bool/int
+
+        def setter(self, value):
+            if self._store is None:
+                self._values[name] = value
+            else:
+                getattr(self._store, name)[self._slot] = value
+        return property(getter, setter)
+
+    x, y, px, py = _field("x"), _field("y"), _field("px"), _field("py")
+    vx, vy, speed, angle = _field("vx"), _field("vy"), _field("speed"), _field("angle")
+    lifetime, radius = _field("lifetime"), _field("radius")
+    active, uid = _field("active"), _field("uid")
+    del _field
+
+    @property
+    def color(self):
+        if self._store is None:
+            return self._values["color"]
+        return self._store.palette[self._store.color.item(self._slot)]
+
+    @color.setter
+    def color(self, value):
+        if self._store is None:
+            self._values["color"] = value
+        else:
+            self._store.color[self._slot] = self._store.palette_index(value)
+
+    def _detach(self):
+        """所在行被移除：把当前值存进视图，之后不再读写数组"""
+        self._values = {name: getattr(self, name) for name in ProjectileStore.FIELDS}
+        self._store = None
+
+
+class ProjectileStore:
+    """NumPy结构化数组(SoA)弹体存储：位置、速度、寿命、激活标记放在连续数组中，
+    按帧整体向量化更新，适合上万发同屏弹体。子类定义失效规则。
+    也提供列表接口（len、下标、迭代得到 StoreEntity 视图，append 导入实体），
+    GameWorld.use_projectile_stores 开启后直接代替子弹和来袭导弹列表"""
+
+    sprite = None  # 绘制用的图集名称，None则画圆点
+    _GRID_ROW = 1 << 24  # 碰撞网格键 = 列 * _GRID_ROW + 行
+    # 每个字段一个数组：名称 -> dtype（color为颜色表下标）
+    FIELDS = {
+        "x": "f8", "y": "f8", "px": "f8", "py": "f8", "vx": "f8", "vy": "f8", "speed": "f8",
+        "angle": "f8", "lifetime": "f8", "radius": "f8", "active": "?", "color": "u1",
+        "uid": "i8",
+    }
+
+    def __init__(self, capacity=1024):
+        if not numpy_available():
+            raise RuntimeError("ProjectileStore 需要安装 numpy")
+        self.count = 0  # 前count个槽位为在用数据（紧凑排列）
+        self.palette = []  # 颜色表，color数组存下标
+        self._views = {}  # 槽位 -> 已发出的 StoreEntity
+        self._allocate(capacity)
+
+    def _allocate(self, capacity):
+        old_count = self.count
+        for name, dtype in self.FIELDS.items():
+            array = np.zeros(capacity, dtype=dtype)
+            if old_count:
+                array[:old_count] = getattr(self, name)[:old_count]
+            setattr(self, name, array)
+        self.capacity = capacity
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self.count
+        if not 0 <= i < self.count:
+            raise IndexError(i)
+        view = self._views.get(i)
+        if view is None:
+            view = self._views[i] = StoreEntity(self, i)
+        return view
+
+    def __iter__(self):
+        for i in range(self.count):
+            yield self[i]
+
+    def palette_index(self, color):
+        if color not in self.palette:
+            self.palette.append(color)
+        return self.palette.index(color)
+
+    def add(self, x, y, angle, speed, radius, lifetime=math.inf, color=WHITE, uid=None):
+        """新增一个弹体，返回槽位下标"""
+        if self.count == self.capacity:
+            self._allocate(self.capacity * 2)
+        i = self.count
+        self.x[i] = self.px[i] = x
+        self.y[i] = self.py[i] = y
+        self.vx[i] = math.cos(angle) * speed
+        self.vy[i] = math.sin(angle) * speed
+        self.speed[i] = speed
+        self.angle[i] = angle
+        self.lifetime[i] = lifetime
+        self.radius[i] = radius
+        self.active[i] = True
+        self.color[i] = self.palette_index(color)
+        self.uid[i] = next(_entity_uids) if uid is None else uid
+        self.count += 1
+        return i
+
+    def add_entity(self, entity):
+        """从现有的 Bullet / EnemyMissile 对象导入（沿用其随机生成逻辑、速度和uid）"""
+        i = self.add(entity.x, entity.y, entity.angle, entity.speed, entity.radius,
+                     getattr(entity, "lifetime", math.inf), getattr(entity, "color", WHITE),
+                     entity.uid)
+        self.px[i], self.py[i] = entity.px, entity.py
+        self.vx[i], self.vy[i] = entity.vx, entity.vy
+        self.active[i] = entity.active
+        return i
+
+    def append(self, entity):
+        """列表接口：同 add_entity"""
+        self.add_entity(entity)
+
+    def _expired(self, x, y, lifetime):
+        """返回应当失效的掩码：寿命耗尽即失效，子类追加各自的越界规则"""
+        return lifetime <= 0
+
+    def update(self, dt=1):
+        """向量化移动、寿命递减和越界剔除（与逐个 update 相同，已失效的行也照样移动）"""
+        n = self.count
+        x, y, lifetime = self.x[:n], self.y[:n], self.lifetime[:n]
+        self.px[:n] = x
+        self.py[:n] = y
+        x += self.vx[:n] * dt
+        y += self.vy[:n] * dt
+        lifetime -= dt
+        self.active[:n] &= ~self._expired(x, y, lifetime)
+
+    def compact(self):
+        """移除失效槽位，保持在用数据紧凑且顺序不变；被移除行的视图脱离存储"""
+        n = self.count
+        active = self.active[:n]
+        keep = np.flatnonzero(active)
+        if len(keep) == n:
+            return
+        if self._views:
+            slots = np.cumsum(active) - 1
+            views = {}
+            for i, view in self._views.items():
+                if active[i]:
+                    view._slot = int(slots[i])
+                    views[view._slot] = view
+                else:
+                    view._detach()
+            self._views = views
+        for name in self.FIELDS:
+            array = getattr(self, name)
+            array[:len(keep)] = array[keep]
+        self.count = len(keep)
+
+    def first_hits(self, projectiles):
+        """向量化扫掠碰撞：按两边最近一步的相对运动（px,py 到 x,y），对本存储中每个激活实体
+        返回最早接触的激活弹体下标（无则-1，时刻相同取下标小者）。
+        逐对公式与 SpatialGrid.first_swept 相同；先按终点分进均匀网格，只计算相邻格子里的候选对"""
+        n, m = self.count, projectiles.count
+        result = np.full(n, -1, dtype=np.int64)
+        rows = np.flatnonzero(self.active[:n])
+        live = np.flatnonzero(projectiles.active[:m])
+        if not len(rows) or not len(live):
+            return result
+        # 本步位移
+        spx, spy, ppx, ppy = self.px[:n], self.py[:n], projectiles.px[:m], projectiles.py[:m]
+        smx, smy = self.x[:n] - spx, self.y[:n] - spy
+        pmx, pmy = projectiles.x[:m] - ppx, projectiles.y[:m] - ppy
+        # 本步内接触过的一对，终点相距不超过半径和加两边位移；格子取这么大，只需查3x3邻格
+        cell = max(1.0, self.radius[rows].max() + projectiles.radius[live].max()
+                   + np.hypot(smx[rows], smy[rows]).max() + np.hypot(pmx[live], pmy[live]).max())
+        keys = (np.floor(projectiles.x[live] / cell).astype(np.int64) * self._GRID_ROW
+                + np.floor(projectiles.y[live] / cell).astype(np.int64))
+        order = np.argsort(keys, kind="stable")
+        keys, live = keys[order], live[order]
+        cx = np.floor(self.x[rows] / cell).astype(np.int64)
+        cy = np.floor(self.y[rows] / cell).astype(np.int64)
+        pair_rows, pair_cols = [], []
+        for ox in (-1, 0, 1):
+            for oy in (-1, 0, 1):
+                cell_keys = (cx + ox) * self._GRID_ROW + cy + oy
+                lo = np.searchsorted(keys, cell_keys, "left")
+                counts = np.searchsorted(keys, cell_keys, "right") - lo
+                total = int(counts.sum())
+                if not total:
+                    continue
+                # 把每个格子的区间[lo, lo+count)展开成一维下标
+                offsets = np.repeat(lo - (np.cumsum(counts) - counts), counts)
+                pair_rows.append(np.repeat(rows, counts))
+                pair_cols.append(live[np.arange(total) + offsets])
+        if not pair_rows:
+            return result
+        s, p = np.concatenate(pair_rows), np.concatenate(pair_cols)
+        dx = spx[s] - ppx[p]
+        dy = spy[s] - ppy[p]
+        mx, my = smx[s] - pmx[p], smy[s] - pmy[p]
+        reach = self.radius[s] + projectiles.radius[p]
+        c = dx * dx + dy * dy - reach * reach
+        a = mx * mx + my * my
+        b = dx * mx + dy * my
+        disc = b * b - a * c
+        with np.errstate(divide="ignore", invalid="ignore"):
+            t = (-b - np.sqrt(disc)) / a
+        entering = (a != 0) & (b < 0) & (disc >= 0) & (t <= 1)
+        t = np.where(c < 0, 0.0, np.where(entering, t, np.inf))
+        hit = np.isfinite(t)
+        s, p, t = s[hit], p[hit], t[hit]
+        if not len(s):
+            return result
+        # 按(实体, 时刻, 弹体下标)排序，每个实体取第一个
+        order = np.lexsort((p, t, s))
+        s, p = s[order], p[order]
+        first = np.flatnonzero(np.r_[True, s[1:] != s[:-1]])
+        result[s[first]] = p[first]
+        return result
+
+    def collide(self, projectiles):
+        """本存储实体被弹体命中即失效，命中的弹体同样失效；返回被命中的行下标（升序）。
+        与 GameWorld 逐个检测时一样，同一发弹体可以同时打掉叠在一起的几个实体"""
+        hits = self.first_hits(projectiles)
+        hit_rows = np.flatnonzero(hits >= 0)
+        self.active[hit_rows] = False
+        projectiles.active[hits[hit_rows]] = False
+        return hit_rows
+
+    def draw(self, surface, alpha=1.0):
+        """alpha为两次模拟步之间的插值系数，与 lerp_position 相同"""
+        n = self.count
+        active = self.active[:n]
+        beta = 1.0 - alpha
+        xs, ys = self.x[:n][active], self.y[:n][active]
+        xs = xs - (xs - self.px[:n][active]) * beta
+        ys = ys - (ys - self.py[:n][active]) * beta
+        if self.sprite is not None:
+            for x, y, angle in zip(xs.tolist(), ys.tolist(), self.angle[:n][active].tolist()):
+                sprite_atlas.blit(surface, self.sprite, angle, (x, y))
+            return
+        palette = self.palette
+        radii = self.radius[:n][active].astype(int)
+        colors = self.color[:n][active]
+        if isinstance(surface, RenderQueue):
+            self._submit_dots(surface, xs, ys, radii, colors)
+            return
+        for x, y, r, c in zip(xs.astype(int).tolist(), ys.astype(int).tolist(), radii.tolist(),
+                              colors.tolist()):
+            surface.blit(dot_sprite(palette[c], r), (x - r, y - r))
+
+    def _submit_dots(self, queue, xs, ys, radii, colors):
+        """圆点按(颜色, 半径)排好序后整批交给RenderQueue，视口剔除向量化完成"""
+        left = xs.astype(int) - radii
+        top = ys.astype(int) - radii
+        view = queue.viewport
+        visible = ((left < view.right) & (left + 2 * radii > view.left) &
+                   (top < view.bottom) & (top + 2 * radii > view.top))
+        keys = colors.astype(np.int64) << 16 | radii
+        order = np.flatnonzero(visible)
+        order = order[np.argsort(keys[order], kind="stable")]
+        scale = queue.scale
+        if scale != 1:
+            left = np.round(left * scale).astype(int)
+            top = np.round(top * scale).astype(int)
+        sprites = {}
+        for key in np.unique(keys[order]).tolist():
+            sprite = dot_sprite(self.palette[key >> 16], key & 0xFFFF)
+            sprites[key] = scaled_image(sprite, scale) if scale != 1 else sprite
+        queue.extend([(sprites[k], (x, y)) for k, x, y in
+                      zip(keys[order].tolist(), left[order].tolist(), top[order].tolist())],
+                     culled=len(keys) - len(order))
+
+
+class BulletStore(ProjectileStore):
+    """与 Bullet.update 相同的规则：出屏或寿命耗尽失效"""
+
+    def _expired(self, x, y, lifetime):
+        return super()._expired(x, y, lifetime) | (x < 0) | (x > WIDTH) | (y < 0) | (y > HEIGHT)
+
+
+class MissileStore(ProjectileStore):
+    """与 EnemyMissile.update 相同的规则：到达船底或远离屏幕失效"""
+
+    sprite = "missile"
+
+    @staticmethod
+    def _reached(x, y):
+        return (np.abs(x - WIDTH / 2) < 30) & (np.abs(y - (HEIGHT // 2)) < 30)
+
+    def reached_ship(self):
+        """各行是否已到达船体（掩码，同 EnemyMissile.reached_ship）"""
+        n = self.count
+        return self._reached(self.x[:n], self.y[:n])
+
+    def _expired(self, x, y, lifetime):
+        return (self._reached(x, y) | (x < -100) | (x > WIDTH + 100) |
+                (y < -100) | (y > HEIGHT + 100))
+
+
+class ObjectPool:
+    """空闲链表对象池：acquire复用已归还的对象（调用其reset），release归还对象"""
+
+    def __init__(self, cls):
+        self.cls = cls
+        self._free = []
+        self.created = 0  # 新建对象数
+        self.reused = 0   # 复用次数
+        self.in_use = 0
+        self.peak = 0     # 同时在用峰值
+
+    def acquire(self, *args):
+        if self._free:
+            obj = self._free.pop()
+            obj.reset(*args)
+            self.reused += 1
+        else:
+            obj = self.cls(*args)
+            self.created += 1
+        self.in_use += 1
+        if self.in_use > self.peak:
+            self.peak = self.in_use
+        return obj
+
+    def release(self, obj):
+        self.in_use -= 1
+        self._free.append(obj)
+
+    def stats(self):
+        acquired = self.created + self.reused
+        return {
+            "size": self.created,
+            "free": len(self._free),
+            "in_use": self.in_use,
+            "peak": self.peak,
+            "reuse_rate": self.reused / acquired if acquired else 0.0,
+        }
+
+
+def compact_active(items, pool=None):
+    """原地移除失效对象（保持原有顺序，不分配新列表），失效对象归还对象池"""
+    keep = 0
+    for obj in items:
+        if obj.active:
+            items[keep] = obj
+            keep += 1
+        elif pool is not None:
+            pool.release(obj)
+    del items[keep:]
+
+
+# 粒子精灵表：名称 -> (帧数, 帧边长, 每帧绘制函数 f(surface, 中心, t))，t从0到1为生命进度
+PARTICLE_SHEETS = {
+    "fire": (10, 40, lambda s, c, t: pygame.draw.circle(
+        s, (255, int(230 - 190 * t), int(120 * (1 - t)), int(255 * (1 - t) ** 0.7)), c,
+        int(5 + 13 * t))),
+    "smoke": (10, 56, lambda s, c, t: pygame.draw.circle(
+        s, (90, 90, 90, int(150 * (1 - t))), c, int(8 + 18 * t))),
+    "debris": (8, 6, lambda s, c, t: pygame.draw.circle(
+        s, (255, int(200 - 140 * t), int(80 - 60 * t), int(255 * (1 - t))), c, 2)),
+    "shockwave": (10, 150, lambda s, c, t: pygame.draw.circle(
+        s, (255, 220, 150, int(220 * (1 - t))), c, int(36 + 36 * t), 3)),
+}
+# 各精灵的运动：每帧速度衰减、竖直加速度（负值为向上飘）
+PARTICLE_MOTION = {"fire": (0.92, -0.02), "smoke": (0.96, -0.04),
+                   "debris": (0.9, 0.0), "shockwave": (1.0, 0.0)}
+# 特效 -> [(精灵, 数量, 速度范围, 寿命范围(帧), 位置抖动)]
+PARTICLE_EFFECTS = {
+    "shell": [("shockwave", 1, (0, 0), (18, 18), 0), ("fire", 24, (0.5, 3.5), (18, 30), 10),
+              ("smoke", 12, (0.2, 1.2), (40, 70), 20), ("debris", 20, (3, 8), (20, 40), 5)],
+    "missile": [("fire", 8, (0.3, 2.0), (14, 22), 5), ("smoke", 5, (0.1, 0.8), (30, 50), 8),
+                ("debris", 8, (2, 6), (15, 30), 3)],
+    "camp": [("fire", 30, (0.5, 3.0), (30, 50), 30), ("smoke", 24, (0.2, 1.0), (60, 100), 35),
+             ("debris", 24, (2, 7), (25, 45), 20)],
+}
+PARTICLE_BUDGET = 1500  # 同屏粒子上限
+
+_particle_frames = []  # 全部精灵表的帧（按 PARTICLE_SHEETS 顺序连续编号）
+_particle_geometry = []  # 每帧相对粒子中心的左上角偏移和宽高，数组 (n, 4)
+
+
+def particle_frames():
+    """预渲染全部粒子精灵表，返回帧列表；每张表是一整张Surface，
+    帧为其子Surface，裁掉透明边，blit时不处理空白像素"""
+    if not _particle_frames:
+        geometry = []
+        for frames, size, paint in PARTICLE_SHEETS.values():
+            sheet = pygame.Surface((frames * size, size), pygame.SRCALPHA)
+            for i in range(frames):
+                paint(sheet.subsurface((i * size, 0, size, size)), (size // 2, size // 2),
+                      i / (frames - 1))
+            if pygame.display.get_surface() is not None:
+                sheet = sheet.convert_alpha()  # 与屏幕像素格式一致
+            for i in range(frames):
+                rect = sheet.subsurface((i * size, 0, size, size)).get_bounding_rect()
+                rect.w, rect.h = max(rect.w, 1), max(rect.h, 1)
+                _particle_frames.append(sheet.subsurface(rect.move(i * size, 0)))
+                geometry.append((rect.x - size // 2, rect.y - size // 2, rect.w, rect.h))
+        _particle_geometry.append(np.array(geometry))
+    return _particle_frames
+
+
+def submit_particles(queue, xs, ys, frame_ids):
+    """粒子按帧号排好序后整批交给RenderQueue，视口剔除在这里向量化完成"""
+    frames = particle_frames()
+    geometry = _particle_geometry[0][frame_ids]
+    left = (xs + geometry[:, 0]).astype(int)
+    top = (ys + geometry[:, 1]).astype(int)
+    view = queue.viewport
+    visible = ((left < view.right) & (left + geometry[:, 2] > view.left) &
+               (top < view.bottom) & (top + geometry[:, 3] > view.top))
+    order = np.flatnonzero(visible)
+    order = order[np.argsort(frame_ids[order], kind="stable")]
+    scale = queue.scale
+    if scale != 1:
+        frames = [scaled_image(frame, scale) for frame in frames]
+        left = np.round((xs + geometry[:, 0]) * scale).astype(int)
+        top = np.round((ys + geometry[:, 1]) * scale).astype(int)
+    queue.extend([(frames[f], (x, y)) for f, x, y in
+                  zip(frame_ids[order].tolist(), left[order].tolist(), top[order].tolist())],
+                 culled=len(frame_ids) - len(order))
+
+
+class ParticleSystem:
+    """数组存储的粒子（爆炸火球、烟雾、碎片、冲击波），固定容量环形分配：
+    超出预算时覆盖最早生成的粒子。有自己的随机数，不影响游戏状态和录像校验"""
+
+    def __init__(self, budget=PARTICLE_BUDGET, seed=None):
+        if not numpy_available():
+            raise RuntimeError("ParticleSystem 需要安装 numpy")
+        self.budget = budget
+        self.rng = np.random.default_rng(seed)
+        self.x = np.zeros(budget)
+        self.y = np.zeros(budget)
+        self.vx = np.zeros(budget)
+        self.vy = np.zeros(budget)
+        self.age = np.zeros(budget)
+        self.life = np.zeros(budget)  # age >= life 即为空槽
+        self.sheet = np.zeros(budget, dtype=np.int16)
+        self.drag = np.ones(budget)
+        self.accel = np.zeros(budget)
+        self.dt = 1
+        self._next = 0  # 环形分配的下一个槽位
+        self.live = 0
+        self.emitted = 0
+        self.evicted = 0  # 被提前覆盖的粒子数
+        names = list(PARTICLE_SHEETS)
+        self._sheet_index = {name: i for i, name in enumerate(names)}
+        counts = [PARTICLE_SHEETS[name][0] for name in names]
+        self._sheet_base = np.cumsum([0] + counts[:-1])
+        self._sheet_frames = np.array(counts)
+
+    def emit(self, effect, x, y):
+        """在(x, y)生成一组特效粒子"""
+        for sheet, count, (v0, v1), (l0, l1), jitter in PARTICLE_EFFECTS[effect]:
+            self._spawn(self._sheet_index[sheet], min(count, self.budget), x, y,
+                        v0, v1, l0, l1, jitter, *PARTICLE_MOTION[sheet])
+
+    def _spawn(self, sheet, n, x, y, v0, v1, l0, l1, jitter, drag, accel):
+        rng = self.rng
+        slots = (self._next + np.arange(n)) % self.budget
+        self._next = (self._next + n) % self.budget
+        alive = int(np.count_nonzero(self.age[slots] < self.life[slots]))
+        self.evicted += alive
+        self.live += n - alive
+        self.emitted += n
+        angle = rng.uniform(0, 2 * math.pi, n)
+        speed = rng.uniform(v0, v1, n)
+        self.x[slots] = x + rng.uniform(-jitter, jitter, n)
+        self.y[slots] = y + rng.uniform(-jitter, jitter, n)
+        self.vx[slots] = np.cos(angle) * speed
+        self.vy[slots] = np.sin(angle) * speed
+        self.age[slots] = 0
+        self.life[slots] = rng.uniform(l0, l1, n)
+        self.sheet[slots] = sheet
+        self.drag[slots] = drag
+        self.accel[slots] = accel
+
+    def update(self, dt=1):
+        self.dt = dt
+        if not self.live:
+            return
+        self.x += self.vx * dt
+        self.y += self.vy * dt
+        self.vx *= self.drag ** dt
+        self.vy = self.vy * self.drag ** dt + self.accel * dt
+        self.age += dt
+        self.live = int(np.count_nonzero(self.age < self.life))
+
+    def _frame_ids(self, rows):
+        sheet = self.sheet[rows]
+        frames = self._sheet_frames[sheet]
+        index = np.minimum((self.age[rows] / self.life[rows] * frames).astype(int), frames - 1)
+        return self._sheet_base[sheet] + index
+
+    def rows(self):
+        """存活粒子的 (x, y, 本步位移x, 本步位移y, 帧号) 数组，供快照使用"""
+        rows = np.flatnonzero(self.age < self.life) if self.live else np.zeros(0, dtype=int)
+        return np.column_stack((self.x[rows], self.y[rows], self.vx[rows] * self.dt,
+                                self.vy[rows] * self.dt, self._frame_ids(rows)))
+
+    def draw(self, queue, alpha=1.0):
+        if not self.live:
+            return
+        rows = np.flatnonzero(self.age < self.life)
+        beta = (1.0 - alpha) * self.dt
+        submit_particles(queue, self.x[rows] - self.vx[rows] * beta,
+                         self.y[rows] - self.vy[rows] * beta, self._frame_ids(rows))
+
+    def stats(self):
+        return {"live": self.live, "budget": self.budget,
+                "emitted": self.emitted, "evicted": self.evicted}
+
+
+# 实体编号：每次生成（含对象池复用）取新号，联机快照据此对应前后帧中的同一实体
+_entity_uids = itertools.count(1)
+
+
+def lerp_position(entity, alpha):
+    """上一模拟步位置(px, py)与当前位置之间按alpha插值（alpha=1即当前位置）"""
+    beta = 1.0 - alpha
+    return (entity.x - (entity.x - entity.px) * beta,
+            entity.y - (entity.y - entity.py) * beta)
+
 
 class Bullet:
+    __slots__ = ("x", "y", "speed", "angle", "radius", "lifetime", "active", "color", "vx", "vy",
+                 "px", "py", "uid")
+
     def __init__(self, x, y, angle, color=LIGHT_BLUE):
-        self.x = x
-        self.y = y
+        self.reset(x, y, angle, color)
+
+    def reset(self, x, y, angle, color=LIGHT_BLUE):
+        self.x = self.px = x
+        self.y = self.py = y
         self.speed = 15
         self.angle = angle
         self.radius = 3
         self.lifetime = 80  
         self.active = True
         self.color = color
+        self.uid = next(_entity_uids)
+        # 航向不变，速度分量只算一次
+        self.vx = math.cos(angle) * self.speed
+        self.vy = math.sin(angle) * self.speed
 
-    def update(self):
-        self.x += math.cos(self.angle) * self.speed
-        self.y += math.sin(self.angle) * self.speed
-        self.lifetime -= 1
+    def update(self, dt=1):
+        """dt为本步时长（以60Hz的一帧为单位）"""
+        self.px, self.py = self.x, self.y
+        self.x += self.vx * dt
+        self.y += self.vy * dt
+        self.lifetime -= dt
         if (self.x < 0 or self.x > WIDTH or self.y < 0 or self.y > HEIGHT or 
             self.lifetime <= 0):
             self.active = False
 
-    def draw(self):
-        pygame.draw.circle(screen, self.color, (int(self.x), int(self.y)), self.radius)
+    def draw(self, surface, alpha=1.0):
+        return self.draw_at(surface, *lerp_position(self, alpha), self.color, self.radius)
+
+    @staticmethod
+    def draw_at(surface, x, y, color, radius=3):
+        return surface.blit(dot_sprite(color, radius), (int(x) - radius, int(y) - radius))
 
 
 class MainCannonShell:
+    __slots__ = ("x", "y", "speed", "angle", "active", "radius", "explode_radius",
+                 "lifetime", "has_exploded", "px", "py", "uid")
+
     def __init__(self, x, y, angle):
-        self.x = x
-        self.y = y
+        self.reset(x, y, angle)
+
+    def reset(self, x, y, angle):
+        self.x = self.px = x
+        self.y = self.py = y
         self.speed = 8
         self.angle = angle
         self.active = True
@@ -168,141 +1708,240 @@ class MainCannonShell:
         self.explode_radius = 60  # 爆炸范围
         self.lifetime = 150  # 飞行寿命
         self.has_exploded = False
+        self.uid = next(_entity_uids)
 
-    def update(self, targets):
+    def update(self, target_grid, dt=1):
+        """target_grid为本帧的导弹+军营空间索引（SpatialGrid）"""
+        self.px, self.py = self.x, self.y
         if self.has_exploded:
             self.active = False
             return
         
         # 飞行逻辑
-        self.x += math.cos(self.angle) * self.speed
-        self.y += math.sin(self.angle) * self.speed
-        self.lifetime -= 1
+        self.x += math.cos(self.angle) * self.speed * dt
+        self.y += math.sin(self.angle) * self.speed * dt
+        self.lifetime -= dt
 
         # 触边/超时爆炸
         if (self.x < 0 or self.x > WIDTH or self.y < 0 or self.y > HEIGHT or 
             self.lifetime <= 0):
-            self.explode(targets)
+            self.explode(target_grid)
             return
 
-        # 碰撞检测（爆炸）
-        for target in targets:
-            if target.active:
-                distance = math.hypot(target.x - self.x, target.y - self.y)
-                if distance < self.radius + target.radius:
-                    self.explode(targets)
-                    break
+        # 碰撞检测（扫掠：本步飞行路径上接触即在接触点爆炸，低模拟频率也不会穿过目标）
+        hit = target_grid.first_swept(self.px, self.py, self.x, self.y, self.radius,
+                                      active_only=True, moving=False)
+        if hit is not None:
+            t = hit[0]
+            self.x = self.px + (self.x - self.px) * t
+            self.y = self.py + (self.y - self.py) * t
+            self.explode(target_grid)
 
-    def explode(self, targets):
+    def explode(self, target_grid):
         """范围爆炸，摧毁范围内所有目标"""
         self.has_exploded = True
         # 攻击范围内目标
-        for target in targets:
-            if target.active:
-                distance = math.hypot(target.x - self.x, target.y - self.y)
-                if distance < self.explode_radius:
-                    target.active = False
+        for target in target_grid.within(self.x, self.y, self.explode_radius, active_only=True):
+            target.active = False
 
-    def draw(self):
-        if self.has_exploded:
+    def draw(self, surface, alpha=1.0):
+        x, y = (self.x, self.y) if self.has_exploded else lerp_position(self, alpha)
+        return self.draw_at(surface, x, y, self.has_exploded, self.radius, self.explode_radius)
+
+    @staticmethod
+    def draw_at(surface, x, y, exploded, radius=8, explode_radius=60):
+        if exploded:
             # 绘制爆炸效果
-            pygame.draw.circle(screen, ORANGE, (int(self.x), int(self.y)), self.explode_radius, 2)
-            pygame.draw.circle(screen, RED, (int(self.x), int(self.y)), self.explode_radius//2, 1)
-        else:
-            # 绘制炮弹
-            pygame.draw.circle(screen, ORANGE, (int(self.x), int(self.y)), self.radius)
+            return surface.blit(explosion_sprite(explode_radius),
+                                (int(x) - explode_radius, int(y) - explode_radius))
+        # 绘制炮弹
+        return surface.blit(dot_sprite(ORANGE, radius), (int(x) - radius, int(y) - radius))
 
 
 class EnemyMissile:
-    def __init__(self):
+    __slots__ = ("x", "y", "angle", "speed", "active", "radius", "vx", "vy", "px", "py", "uid")
+
+    def __init__(self, rng=random):
         # 随机生成初始位置
-        side = random.choice(["top", "bottom", "left", "right"])
+        side = rng.choice(["top", "bottom", "left", "right"])
         if side == "top":
-            self.x = random.randint(0, WIDTH)
+            self.x = rng.randint(0, WIDTH)
             self.y = -50
         elif side == "bottom":
-            self.x = random.randint(0, WIDTH)
+            self.x = rng.randint(0, WIDTH)
             self.y = HEIGHT + 50
         elif side == "left":
             self.x = -50
-            self.y = random.randint(0, HEIGHT)
+            self.y = rng.randint(0, HEIGHT)
         else:
             self.x = WIDTH + 50
-            self.y = random.randint(0, HEIGHT)
+            self.y = rng.randint(0, HEIGHT)
         
         # 目标点（船底区域随机偏移）
-        target_x = WIDTH/2 + random.randint(-150, 150)
-        target_y = HEIGHT // 2 + random.randint(-50, 50)
+        target_x = WIDTH/2 + rng.randint(-150, 150)
+        target_y = HEIGHT // 2 + rng.randint(-50, 50)
         self.angle = math.atan2(target_y - self.y, target_x - self.x)
-        self.speed = random.uniform(1, 4)  # 适配大窗口，提速
+        self.speed = rng.uniform(1, 4)  # 适配大窗口，提速
         self.active = True
         self.radius = 10  # 碰撞半径
+        self.vx = math.cos(self.angle) * self.speed
+        self.vy = math.sin(self.angle) * self.speed
+        self.px, self.py = self.x, self.y
+        self.uid = next(_entity_uids)
 
-    def update(self):
-        self.x += math.cos(self.angle) * self.speed
-        self.y += math.sin(self.angle) * self.speed
+    def update(self, dt=1):
+        self.px, self.py = self.x, self.y
+        self.x += self.vx * dt
+        self.y += self.vy * dt
         # 到达船底或超出屏幕失效
-        if (abs(self.x - WIDTH/2) < 30 and abs(self.y - (HEIGHT // 2)) < 30 or
+        if (self.reached_ship() or
             self.x < -100 or self.x > WIDTH + 100 or
             self.y < -100 or self.y > HEIGHT + 100):
             self.active = False
 
-    def draw(self):
-        rotated_missile = pygame.transform.rotate(missile_img, -math.degrees(self.angle))
-        rect = rotated_missile.get_rect(center=(self.x, self.y))
-        screen.blit(rotated_missile, rect)
+    def reached_ship(self):
+        return abs(self.x - WIDTH/2) < 30 and abs(self.y - (HEIGHT // 2)) < 30
+
+    def draw(self, surface, alpha=1.0):
+        return self.draw_at(surface, *lerp_position(self, alpha), self.angle)
+
+    @staticmethod
+    def draw_at(surface, x, y, angle):
+        return sprite_atlas.blit(surface, "missile", angle, (x, y))
 
 
 class Camp:
-    def __init__(self):
+    __slots__ = ("x", "y", "width", "height", "active", "radius", "uid")
+
+    def __init__(self, rng=random):
         # 军营位置（陆地区域随机）
-        self.x = random.randint(100, WIDTH - 100)
-        self.y = random.randint(50, 150)  # 顶部陆地区域
+        self.x = rng.randint(100, WIDTH - 100)
+        self.y = rng.randint(50, 150)  # 顶部陆地区域
         self.width = 80
         self.height = 50
         self.active = True
         self.radius = 40  # 碰撞半径
+        self.uid = next(_entity_uids)
 
     def update(self):
         # 被攻击后失效
         pass
 
-    def draw(self):
+    def draw(self, surface):
         if self.active:
-            # 绘制绿色长方体军营
-            pygame.draw.rect(screen, GREEN_CAMP, 
-                            (self.x - self.width//2, self.y - self.height//2, 
-                             self.width, self.height), border_radius=5)
-            # 军营细节
-            pygame.draw.rect(screen, BLACK, 
-                            (self.x - self.width//2, self.y - self.height//2, 
-                             self.width, self.height), 2)
+            self.draw_at(surface, self.x, self.y, self.width, self.height)
 
+    @staticmethod
+    def draw_at(surface, x, y, width=80, height=50):
+        # 绘制绿色长方体军营
+        pygame.draw.rect(surface, GREEN_CAMP, 
+                        (x - width//2, y - height//2, 
+                         width, height), border_radius=5)
+        # 军营细节
+        pygame.draw.rect(surface, BLACK, 
+                        (x - width//2, y - height//2, 
+                         width, height), 2)
 
-class AntiMissile:
-    def __init__(self, x, y, target_list):
-        self.x = x
-        self.y = y
-        self.speed = 10  # 适配大窗口，提速
+
+class ThreatTracker:
+    """防空导弹共享目标分配：每帧用活跃来袭导弹建一次KD树并统计已被锁定的目标，
+    分配时优先给出锁定范围内最近且未被锁定的导弹（O(log n)），避免各枚防空导弹
+    反复全量扫描并扎堆追同一目标"""
+
+    def __init__(self):
+        self._root = None
+        self._engaged = {}  # id(导弹) -> 锁定它的防空导弹数
+        self.assigned = 0   # 分配次数
+        self.shared = 0     # 无空闲目标时分配了已被锁定目标的次数
+
+    def update(self, missiles, anti_missiles):
+        """每帧调用一次：重建索引并根据在飞防空导弹统计锁定情况"""
+        points = [(m.x, m.y, i, m) for i, m in enumerate(missiles) if m.active]
+        self._root = self._build(points, 0)
+        engaged = {}
+        for am in anti_missiles:
+            target = am.target
+            if am.active and target is not None and target.active:
+                engaged[id(target)] = engaged.get(id(target), 0) + 1
+        self._engaged = engaged
+
+    def _build(self, points, axis):
+        if not points:
+            return None
+        points.sort(key=lambda p: p[axis])
+        mid = len(points) // 2
+        return (points[mid], axis,
+                self._build(points[:mid], axis ^ 1),
+                self._build(points[mid + 1:], axis ^ 1))
+
+    def is_engaged(self, missile):
+        return self._engaged.get(id(missile), 0) > 0
+
+    def nearest(self, x, y, max_range, skip_engaged=False):
+        """max_range内最近的活跃导弹（距离相同取生成较早者），没有则返回None"""
+        best = [max_range, -1, None]  # 距离、生成顺序、导弹
+        engaged = self._engaged if skip_engaged else None
+        stack = [self._root] if self._root is not None else []
+        while stack:
+            node = stack.pop()
+            point, axis, left, right = node
+            px, py, order, missile = point
+            if missile.active and not (engaged and id(missile) in engaged):
+                d = math.hypot(px - x, py - y)
+                if d < best[0] or (d == best[0] and best[2] is not None and order < best[1]):
+                    best[0], best[1], best[2] = d, order, missile
+            diff = (x if axis == 0 else y) - point[axis]
+            near, far = (left, right) if diff < 0 else (right, left)
+            # 先压远侧，后压近侧，保证近侧先搜索
+            if far is not None and abs(diff) <= best[0]:
+                stack.append(far)
+            if near is not None:
+                stack.append(near)
+        return best[2]
+
+    def acquire(self, x, y, max_range):
+        """分配目标：优先未被锁定的最近导弹，全都被锁定时退回最近导弹"""
+        target = self.nearest(x, y, max_range, skip_engaged=True)
+        if target is None:
+            target = self.nearest(x, y, max_range)
+            if target is not None:
+                self.shared += 1
+        if target is not None:
+            self.assigned += 1
+            self._engaged[id(target)] = self._engaged.get(id(target), 0) + 1
+        return target
+
+    def stats(self):
+        return {
+            "engaged_targets": len(self._engaged),
+            "assigned": self.assigned,
+            "shared": self.shared,
+        }
+
+
+class AntiMissile:
+    __slots__ = ("x", "y", "speed", "active", "radius", "lock_range", "target", "angle",
+                 "px", "py", "uid")
+
+    def __init__(self, x, y, threats):
+        self.reset(x, y, threats)
+
+    def reset(self, x, y, threats):
+        self.x = self.px = x
+        self.y = self.py = y
+        self.speed = 10  # 适配大窗口，提速
         self.active = True
         self.radius = 20  # 爆炸半径
         self.lock_range = 400  # 适配大窗口，扩大锁定范围
-        self.target = self.lock_target(target_list)  # 自动锁定最近目标
+        self.target = self.lock_target(threats)  # 自动锁定最近目标
         self.angle = 0
+        self.uid = next(_entity_uids)
         if self.target:
             self.update_angle()
 
-    def lock_target(self, target_list):
-        """锁定范围内最近的来袭导弹"""
-        closest_target = None
-        min_distance = float('inf')
-        for target in target_list:
-            if target.active:
-                distance = math.hypot(target.x - self.x, target.y - self.y)
-                if distance < self.lock_range and distance < min_distance:
-                    min_distance = distance
-                    closest_target = target
-        return closest_target
+    def lock_target(self, threats):
+        """从ThreatTracker领取锁定范围内最近的未被锁定导弹"""
+        return threats.acquire(self.x, self.y, self.lock_range)
 
     def update_angle(self):
         """更新朝向目标的角度"""
@@ -310,45 +1949,51 @@ class AntiMissile:
         dy = self.target.y - self.y
         self.angle = math.atan2(dy, dx)
 
-    def update(self, target_list):
+    def update(self, threats, dt=1):
         if not self.active:
             return
+        self.px, self.py = self.x, self.y
         
         # 目标失效则重新锁定
         if not (self.target and self.target.active):
-            self.target = self.lock_target(target_list)
+            self.target = self.lock_target(threats)
             if not self.target:
                 # 无目标则飞行一段时间后自毁
-                self.x += math.cos(self.angle) * self.speed
-                self.y += math.sin(self.angle) * self.speed
+                self.x += math.cos(self.angle) * self.speed * dt
+                self.y += math.sin(self.angle) * self.speed * dt
                 if self.x < 0 or self.x > WIDTH or self.y < 0 or self.y > HEIGHT:
                     self.active = False
                 return
         
         # 跟踪目标
         self.update_angle()
-        self.x += math.cos(self.angle) * self.speed
-        self.y += math.sin(self.angle) * self.speed
+        self.x += math.cos(self.angle) * self.speed * dt
+        self.y += math.sin(self.angle) * self.speed * dt
 
-        # 碰撞检测（爆炸半径）
-        distance = math.hypot(self.target.x - self.x, self.target.y - self.y)
-        if distance < self.radius:
-            self.target.active = False
+        # 近炸引信：本步飞行路径上进入爆炸半径即起爆（扫掠检测，步长大于距离也不会飞过头）
+        target = self.target
+        if swept_hit_time(self.px - target.x, self.py - target.y,
+                          self.x - self.px, self.y - self.py, self.radius) is not None:
+            target.active = False
             self.active = False
 
-    def draw(self):
+    def draw(self, surface, alpha=1.0):
         if not self.active:
-            return
-        rotated_am = pygame.transform.rotate(anti_missile_img, -math.degrees(self.angle))
-        rect = rotated_am.get_rect(center=(self.x, self.y))
-        screen.blit(rotated_am, rect)
+            return None
+        return self.draw_at(surface, *lerp_position(self, alpha), self.angle)
+
+    @staticmethod
+    def draw_at(surface, x, y, angle):
+        return sprite_atlas.blit(surface, "anti_missile", angle, (x, y))
 
 
 class Cannon:
-    def __init__(self, x, y):
-        self.x = x
-        self.y = y
+    def __init__(self, x, y, sound=None, pool=None):
+        self.x = self.px = x
+        self.y = self.py = y
         self.angle = 0
+        self.sound = sound  # 开枪音效（None则静音）
+        self.pool = pool    # 子弹对象池（None则每次新建）
         # 射速设置
         self.base_fire_rate = 5
         self.fast_fire_rate = 2
@@ -361,14 +2006,14 @@ class Cannon:
         self.reload_timer = 0   # 装填计时器
         self.is_reloading = False
 
-    def update(self, mouse_pos):
+    def update(self, mouse_pos, dt=1):
         # 装填逻辑
         if self.is_reloading:
-            self.reload_timer += 1
+            self.reload_timer += dt
             if self.reload_timer >= self.reload_time:
                 self.current_ammo = self.total_ammo
                 self.is_reloading = False
-                self.reload_timer = 0
+                self.reload_timer -= self.reload_time  # 保留余量，同射击计时器
         
         # 朝向鼠标
         dx = mouse_pos[0] - self.x
@@ -376,54 +2021,61 @@ class Cannon:
         self.angle = math.atan2(dy, dx)
         
         if self.fire_timer > 0:
-            self.fire_timer -= 1
+            self.fire_timer -= dt
 
     def set_fire_rate(self, is_fast):
         self.current_fire_rate = self.fast_fire_rate if is_fast else self.base_fire_rate
 
     def can_fire(self):
-        return (not self.is_reloading) and self.current_ammo > 0 and self.fire_timer == 0
+        return (not self.is_reloading) and self.current_ammo > 0 and self.fire_timer <= 0
 
     def fire(self, is_fast=False):
         if self.can_fire():
             self.set_fire_rate(is_fast)
-            self.fire_timer = self.current_fire_rate
+            # 保留上一步超出的余量，连发射速与模拟频率无关
+            self.fire_timer += self.current_fire_rate
             self.current_ammo -= 1  # 消耗子弹
             # 子弹打完开始装填
             if self.current_ammo <= 0:
                 self.is_reloading = True
             
-            # 播放开枪音效
-            if cannon_sound is not None:
-                cannon_sound.play(maxtime=100)
+            # 播放开枪音效（音效已截为100ms，连发由声部管理合并）
+            if self.sound is not None:
+                self.sound.play()
             
             # 生成子弹
             bullet_x = self.x + math.cos(self.angle) * 40
             bullet_y = self.y + math.sin(self.angle) * 40
             bullet_color = GREEN if is_fast else LIGHT_BLUE
+            if self.pool is not None:
+                return self.pool.acquire(bullet_x, bullet_y, self.angle, bullet_color)
             return Bullet(bullet_x, bullet_y, self.angle, bullet_color)
         return None
 
-    def draw(self):
+    def draw(self, surface, alpha=1.0):
+        return self.draw_at(surface, *lerp_position(self, alpha), self.angle,
+                            self.current_ammo, self.total_ammo, self.is_reloading)
+
+    @staticmethod
+    def draw_at(surface, x, y, angle, ammo, total_ammo, is_reloading):
         # 绘制近防炮
-        rotated_cannon = pygame.transform.rotate(cannon_img, -math.degrees(self.angle))
-        rect = rotated_cannon.get_rect(center=(self.x, self.y))
-        screen.blit(rotated_cannon, rect)
+        rect = sprite_atlas.blit(surface, "cannon", angle, (x, y))
         
         # 绘制弹药状态
-        font = pygame.font.SysFont(None, 20)
-        ammo_text = f"Ammo: {self.current_ammo}/{self.total_ammo}"
-        if self.is_reloading:
+        ammo_text = f"Ammo: {ammo}/{total_ammo}"
+        if is_reloading:
             ammo_text += " (Reloading...)"
-        text_surface = font.render(ammo_text, True, WHITE)
-        screen.blit(text_surface, (self.x - 50, self.y + 50))
+        text_surface = text_renderer.render(ammo_text, 20, WHITE)
+        return rect.union(surface.blit(text_surface, (x - 50, y + 50)))
 
 
 class MainCannon:
-    def __init__(self, x, y):
-        self.x = x
-        self.y = y
+    def __init__(self, x, y, sound=None, pool=None):
+        self.x = self.px = x
+        self.y = self.py = y
         self.angle = 0
+        self.sound = sound  # 主炮音效（None则静音）
+        self.pool = pool    # 炮弹对象池（None则每次新建）
         self.fire_cooldown = 60  # 冷却时间（1秒）
         self.cooldown_timer = 0
         self.total_ammo = 50
@@ -432,18 +2084,18 @@ class MainCannon:
         self.is_reloading = False
         self.reload_timer = 0
 
-    def update(self, mouse_pos):
+    def update(self, mouse_pos, dt=1):
         # 装填逻辑
         if self.is_reloading:
-            self.reload_timer += 1
+            self.reload_timer += dt
             if self.reload_timer >= self.reload_time:
                 self.current_ammo = self.total_ammo
                 self.is_reloading = False
-                self.reload_timer = 0
+                self.reload_timer -= self.reload_time  # 保留余量，同射击计时器
         
         # 冷却逻辑
         if self.cooldown_timer > 0:
-            self.cooldown_timer -= 1
+            self.cooldown_timer -= dt
         
         # 朝向鼠标
         dx = mouse_pos[0] - self.x
@@ -451,310 +2103,2983 @@ class MainCannon:
         self.angle = math.atan2(dy, dx)
 
     def can_fire(self):
-        return (not self.is_reloading) and self.current_ammo > 0 and self.cooldown_timer == 0
+        return (not self.is_reloading) and self.current_ammo > 0 and self.cooldown_timer <= 0
 
     def fire(self):
         if self.can_fire():
-            self.cooldown_timer = self.fire_cooldown
+            self.cooldown_timer += self.fire_cooldown  # 保留余量，同近防炮
             self.current_ammo -= 1
             if self.current_ammo <= 0:
                 self.is_reloading = True
             
             # 播放主炮音效
-            if main_cannon_sound is not None:
-                main_cannon_sound.play()
+            if self.sound is not None:
+                self.sound.play()
             
             # 生成主炮炮弹
             shell_x = self.x + math.cos(self.angle) * 60
             shell_y = self.y + math.sin(self.angle) * 60
+            if self.pool is not None:
+                return self.pool.acquire(shell_x, shell_y, self.angle)
             return MainCannonShell(shell_x, shell_y, self.angle)
         return None
 
-    def draw(self):
+    def draw(self, surface, alpha=1.0):
+        return self.draw_at(surface, *lerp_position(self, alpha), self.angle,
+                            self.current_ammo, self.total_ammo, self.is_reloading)
+
+    @staticmethod
+    def draw_at(surface, x, y, angle, ammo, total_ammo, is_reloading):
         # 绘制主炮
-        rotated_cannon = pygame.transform.rotate(main_cannon_img, -math.degrees(self.angle))
-        rect = rotated_cannon.get_rect(center=(self.x, self.y))
-        screen.blit(rotated_cannon, rect)
+        rect = sprite_atlas.blit(surface, "main_cannon", angle, (x, y))
         
         # 绘制主炮弹药状态
-        font = pygame.font.SysFont(None, 24)
-        ammo_text = f"Main Cannon: {self.current_ammo}/{self.total_ammo}"
-        if self.is_reloading:
+        ammo_text = f"Main Cannon: {ammo}/{total_ammo}"
+        if is_reloading:
             ammo_text += " (Reloading...)"
-        text_surface = font.render(ammo_text, True, WHITE)
-        screen.blit(text_surface, (self.x - 70, self.y + 60))
+        text_surface = text_renderer.render(ammo_text, 24, WHITE)
+        return rect.union(surface.blit(text_surface, (x - 70, y + 60)))
 
 
 class Launcher:
-    def __init__(self, x, y):
-        self.x = x
-        self.y = y
+    def __init__(self, x, y, pool=None):
+        self.x = self.px = x
+        self.y = self.py = y
+        self.pool = pool  # 防空导弹对象池（None则每次新建）
         self.max_ammo = 12       # 最大备弹
         self.current_ammo = 12   # 当前可用
         self.reload_time = 450  # 装填时间（3秒）
         self.reload_timer = 0   # 装填计时器
         self.is_reloading = False
 
-    def update(self):
+    def update(self, dt=1):
         # 装填逻辑
         if self.is_reloading:
-            self.reload_timer += 1
+            self.reload_timer += dt
             if self.reload_timer >= self.reload_time:
                 self.current_ammo = self.max_ammo
                 self.is_reloading = False
-                self.reload_timer = 0
+                self.reload_timer -= self.reload_time  # 保留余量，同射击计时器
 
-    def fire_anti_missile(self, target_list):
+    def fire_anti_missile(self, threats):
         """发射防空导弹"""
         if not self.is_reloading and self.current_ammo > 0:
             self.current_ammo -= 1
             # 打完开始装填
             if self.current_ammo <= 0:
                 self.is_reloading = True
-            return AntiMissile(self.x, self.y, target_list)
+            if self.pool is not None:
+                return self.pool.acquire(self.x, self.y, threats)
+            return AntiMissile(self.x, self.y, threats)
         return None
 
-    def draw(self):
-        # 绘制发射箱（已旋转90度）
-        screen.blit(launcher_img, (self.x - 30, self.y - 30))
+    def draw(self, surface, alpha=1.0):
+        return self.draw_at(surface, *lerp_position(self, alpha), 0,
+                            self.current_ammo, self.max_ammo, self.is_reloading)
+
+    @staticmethod
+    def draw_at(surface, x, y, angle, ammo, max_ammo, is_reloading):
+        # 绘制发射箱（已旋转90度，不随瞄准转动）
+        rect = surface.blit(assets.image("launcher"), (x - 30, y - 30))
         # 绘制弹药状态
-        font = pygame.font.SysFont(None, 20)
-        ammo_text = f"Anti-Missile: {self.current_ammo}/{self.max_ammo}"
-        if self.is_reloading:
+        ammo_text = f"Anti-Missile: {ammo}/{max_ammo}"
+        if is_reloading:
             ammo_text += " (Reloading...)"
-        text_surface = font.render(ammo_text, True, WHITE)
-        screen.blit(text_surface, (self.x - 60, self.y + 40))
+        text_surface = text_renderer.render(ammo_text, 20, WHITE)
+        return rect.union(surface.blit(text_surface, (x - 60, y + 40)))
 
 
-def draw_land_and_camps(camps):
-    """绘制顶部棕色陆地和绿色军营"""
+def draw_land_and_camps(surface, camps):
+    """绘制顶部棕色陆地和绿色军营；camps为军营坐标(x, y)序列"""
     # 绘制棕色陆地（顶部长条）
     land_rect = pygame.Rect(0, 0, WIDTH, 200)
-    pygame.draw.rect(screen, BROWN, land_rect)
+    pygame.draw.rect(surface, BROWN, land_rect)
     # 绘制陆地细节
-    pygame.draw.rect(screen, (101, 67, 33), land_rect, 3)
+    pygame.draw.rect(surface, (101, 67, 33), land_rect, 3)
     
     # 绘制所有军营
-    for camp in camps:
-        camp.draw()
+    for x, y in camps:
+        Camp.draw_at(surface, x, y)
 
 
-def draw_ship(ship_x_base, ship_y_base, shake_offset):
+def draw_ship(surface, ship_x_base, ship_y_base, shake_offset):
     """绘制船底图片（带轻微晃动）"""
     # 应用晃动偏移
     ship_x = ship_x_base + shake_offset[0]
     ship_y = ship_y_base + shake_offset[1]
-    screen.blit(ship_img, (ship_x, ship_y))
-    return ship_x, ship_y
+    return surface.blit(assets.image("ship"), (ship_x, ship_y))
+
+
+class PhaseTimer:
+    """分阶段计时：start(阶段)切换当前阶段，end_frame()归档本帧各阶段耗时（秒）"""
+
+    def __init__(self):
+        self.frame = {}  # 本帧 阶段 -> 耗时
+        self.history = {}  # 阶段 -> 每帧耗时列表
+        self.frames = 0
+        self._phase = None
+        self._started = 0.0
+
+    def start(self, phase):
+        now = time.perf_counter()
+        if self._phase is not None:
+            self.frame[self._phase] = self.frame.get(self._phase, 0.0) + now - self._started
+        self._phase = phase
+        self._started = now
+
+    def stop(self):
+        self.start(None)
+
+    def end_frame(self):
+        """归档本帧，返回本帧各阶段耗时"""
+        self.stop()
+        frame = self.frame
+        for phase in set(self.history) | set(frame):
+            self.history.setdefault(phase, [0.0] * self.frames).append(frame.get(phase, 0.0))
+        self.frames += 1
+        self.frame = {}
+        return frame
+
+
+class ProfilerOverlay:
+    """游戏内性能面板（F3开关）和cProfile采样（F9采集N帧并导出.pstats）。
+    关闭时不挂计时器，主循环只多几次空判断"""
+
+    GRAPH_FRAMES = 180  # 帧时间曲线长度
+    TEXT_REFRESH = 15   # 面板文字每隔多少帧刷新一次
+
+    def __init__(self, capture_frames=300, output_dir="."):
+        self.timer = None
+        self.frame_times = deque(maxlen=self.GRAPH_FRAMES)
+        self.capture_frames = capture_frames
+        self.output_dir = output_dir
+        self._profile = None
+        self._capture_left = 0
+        self._lines = []
+        self._frame_start = 0.0
+
+    @property
+    def enabled(self):
+        return self.timer is not None
+
+    def toggle(self, world):
+        """开关性能面板，同时挂上/摘下模拟分阶段计时（world为None时只计渲染端）"""
+        self.timer = None if self.enabled else PhaseTimer()
+        if world is not None:
+            world.phase_timer = self.timer
+        self.frame_times.clear()
+        self._lines = []
+
+    def begin_frame(self):
+        if self._profile is not None:
+            self._profile.enable()
+        if self.timer is not None:
+            self._frame_start = time.perf_counter()
+            self.timer.start("input")
+
+    def phase(self, name):
+        if self.timer is not None:
+            self.timer.start(name)
+
+    def end_frame(self, world, renderer=None):
+        if self._profile is not None:
+            self._profile.disable()
+            self._capture_left -= 1
+            if self._capture_left <= 0:
+                self._finish_capture()
+        if self.timer is None:
+            return
+        self.timer.end_frame()
+        self.frame_times.append(time.perf_counter() - self._frame_start)
+        if self.timer.frames % self.TEXT_REFRESH == 1:
+            self._lines = self._build_lines(world, renderer)
+
+    def capture(self, frames=None):
+        """开始采集接下来N帧的cProfile数据"""
+        if self._profile is not None:
+            return
+        self._profile = cProfile.Profile()
+        self._capture_left = frames or self.capture_frames
+        print(f"开始采集 {self._capture_left} 帧性能数据...")
+
+    def _finish_capture(self):
+        profile, self._profile = self._profile, None
+        path = os.path.join(self.output_dir, time.strftime("miji_profile_%Y%m%d_%H%M%S.pstats"))
+        profile.dump_stats(path)
+        print(f"性能数据已导出：{path}")
+
+    def _build_lines(self, world, renderer=None):
+        """最近TEXT_REFRESH帧各阶段平均耗时和实体数"""
+        lines = []
+        frame_ms = list(self.frame_times)[-self.TEXT_REFRESH:]
+        if frame_ms:
+            lines.append(f"frame {sum(frame_ms) / len(frame_ms) * 1000:6.2f} ms")
+        for phase, values in sorted(self.timer.history.items()):
+            recent = values[-self.TEXT_REFRESH:]
+            lines.append(f"{phase:<14}{sum(recent) / len(recent) * 1000:6.2f} ms")
+        for name, count in world.entity_counts().items():
+            lines.append(f"{name:<20}{count:5d}")
+        sounds = getattr(world, "sounds", None)  # 快照没有声部管理
+        if sounds is not None:
+            stats = sounds.stats()
+            lines.append(f"voices {stats['voices']}/{stats['channels']}  "
+                         f"dropped {stats['dropped']}")
+        particles = getattr(world, "particles", None)  # 快照上是粒子数
+        if isinstance(particles, ParticleSystem):
+            stats = particles.stats()
+            lines.append(f"particles {stats['live']}/{stats['budget']}  "
+                         f"evicted {stats['evicted']}")
+        if renderer is not None:
+            stats = renderer.queue.stats()
+            lines.append(f"draws {stats['submitted']}  culled {stats['culled']}")
+        # 历史只保留曲线需要的长度
+        for values in self.timer.history.values():
+            del values[:-self.GRAPH_FRAMES]
+        return lines
+
+    def draw(self, surface):
+        if self.timer is None:
+            return None
+        width, graph_height = self.GRAPH_FRAMES * 2, 80
+        panel = pygame.Rect(surface.get_width() - width - 20, 220, width,
+                            graph_height + 20 * len(self._lines) + 10)
+        pygame.draw.rect(surface, BLACK, panel)
+        # 帧时间曲线（满格 = 33ms，中线 = 16.7ms）
+        scale = graph_height / 0.033
+        base = panel.top + graph_height
+        pygame.draw.line(surface, GRAY, (panel.left, base - 1 / 60 * scale),
+                         (panel.right, base - 1 / 60 * scale))
+        for i, dt in enumerate(self.frame_times):
+            x = panel.left + i * 2
+            color = GREEN_CAMP if dt < 1 / 60 else RED
+            pygame.draw.line(surface, color, (x, base), (x, base - min(dt * scale, graph_height)))
+        for i, line in enumerate(self._lines):
+            surface.blit(text_renderer.render(line, 20, WHITE),
+                         (panel.left + 6, base + 8 + i * 20))
+        return panel
+
+
+# 单帧输入：炮口瞄准点、左键开火、1键速射、2键防空导弹、3键主炮，
+# 主炮瞄准点（联机时两人分开瞄准；None为与近防炮相同）
+TickInput = namedtuple("TickInput", ["aim", "fire", "fast_fire", "anti_missile", "main_cannon",
+                                     "main_aim"])
+TickInput.__new__.__defaults__ = ((WIDTH // 2, 0), False, False, False, False, None)
+IDLE_INPUT = TickInput()
+
+
+class GameWorld:
+    """游戏模拟状态（武器、实体列表、生成计时器、带种子的随机数），不依赖窗口。
+    相同种子+相同输入序列得到相同状态"""
+
+    # 武器相对船体中心的安装位置
+    CANNON1_OFFSET = (-300, 0)
+    CANNON2_OFFSET = (120, 0)
+    MAIN_CANNON_OFFSET = (-200, -50)
+    LAUNCHER_OFFSET = (0, -20)
+
+    def __init__(self, seed=None, sound=True, sim_hz=SIM_REFERENCE_HZ, particles=PARTICLE_BUDGET):
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.tick = 0
+        # 固定模拟步长，以60Hz的一帧为单位；60Hz时保持整数，与逐帧计数完全一致
+        self.sim_hz = sim_hz
+        self.dt = SIM_REFERENCE_HZ / sim_hz
+        if self.dt.is_integer():
+            self.dt = int(self.dt)
+
+        # 船底基础位置（中央）
+        self.ship_x_base = WIDTH // 2 - SHIP_SIZE[0] // 2
+        self.ship_y_base = HEIGHT // 2 - SHIP_SIZE[1] // 2
+        # 船体晃动参数
+        self.shake_amplitude = 3  # 晃动幅度
+        self.shake_speed = 0.05   # 晃动速度
+        self.shake_time = 0
+        self.shake_offset = (0, 0)
+        self.prev_shake_offset = (0, 0)
+
+        # 弹体对象池
+        self.bullet_pool = ObjectPool(Bullet)
+        self.shell_pool = ObjectPool(MainCannonShell)
+        self.anti_missile_pool = ObjectPool(AntiMissile)
+
+        # 创建武器（基于船底位置）
+        # 音效声部管理（静音时为None）
+        self.sounds = create_sound_manager() if sound else None
+        cannon_sound = self.sounds.cue("cannon") if self.sounds else None
+        main_cannon_sound = self.sounds.cue("main_cannon") if self.sounds else None
+        self.cannon1 = Cannon(0, 0, cannon_sound, self.bullet_pool)  # 左近防炮
+        self.cannon2 = Cannon(0, 0, cannon_sound, self.bullet_pool)  # 右近防炮
+        self.main_cannon = MainCannon(0, 0, main_cannon_sound, self.shell_pool)  # 船头主炮
+        self.launcher = Launcher(0, 0, self.anti_missile_pool)  # 发射箱
+        self._place_weapons(0, 0)
+
+        # 游戏对象列表（子弹和来袭导弹可换成数组存储，见 use_projectile_stores）
+        self.bullets = []
+        self.enemy_missiles = []
+        self.anti_missiles = []
+        self.main_cannon_shells = []
+        self.camps = [Camp(self.rng) for _ in range(5)]  # 生成5个军营
+
+        # 无限生成导弹
+        self.missile_spawn_timer = 0
+        self.missile_spawn_interval = 50
+        self.missile_spawn_range = (30, 70)  # 生成间隔随机范围（帧）
+
+        # 碰撞空间索引（每帧重建一次）
+        self.bullet_grid = SpatialGrid(cell_size=32)
+        self.target_grid = SpatialGrid(cell_size=64)
+        self._targets = []  # 导弹+军营，复用同一个列表
+        self.threats = ThreatTracker()  # 防空导弹目标分配
+
+        # 累计开火次数（渲染端据此播放音效）
+        self.cannon_shots = 0
+        self.main_cannon_shots = 0
+
+        # 爆炸粒子特效（预算为0或没有numpy时关闭）
+        self.particles = (ParticleSystem(particles, seed)
+                          if particles and numpy_available() else None)
+
+        # 分阶段计时器（PhaseTimer），None时不计时
+        self.phase_timer = None
+        # 游戏数据采集（Telemetry），None时不记录
+        self.telemetry = None
+        self._reloading = (False, False, False, False)
+
+    @property
+    def cannons(self):
+        return (self.cannon1, self.cannon2)
+
+    def use_projectile_stores(self, capacity=16384):
+        """子弹和来袭导弹改用数组存储（需要numpy），用于上万发同屏弹体。
+        之后 bullets/enemy_missiles 就是 BulletStore/MissileStore：近防炮开火和导弹生成直接
+        写入，移动和子弹碰撞整体向量化，其余逻辑经 StoreEntity 视图照常读写，
+        结果与列表完全相同。应在第一步之前调用，已有的子弹和导弹会被导入"""
+        bullets, missiles = BulletStore(capacity), MissileStore(capacity)
+        for bullet in self.bullets:
+            bullets.append(bullet)
+        for em in self.enemy_missiles:
+            missiles.append(em)
+        self.bullets, self.enemy_missiles = bullets, missiles
+        # 子弹导入存储后对象不再使用，不必走对象池
+        for cannon in self.cannons:
+            cannon.pool = None
+
+    def _place_weapons(self, shake_x, shake_y):
+        """武器位置跟随船体晃动"""
+        cx, cy = WIDTH // 2, HEIGHT // 2
+        for weapon, (ox, oy) in ((self.cannon1, self.CANNON1_OFFSET),
+                                 (self.cannon2, self.CANNON2_OFFSET),
+                                 (self.main_cannon, self.MAIN_CANNON_OFFSET),
+                                 (self.launcher, self.LAUNCHER_OFFSET)):
+            weapon.px, weapon.py = weapon.x, weapon.y
+            weapon.x = cx + ox + shake_x
+            weapon.y = cy + oy + shake_y
+
+    def step(self, inputs=IDLE_INPUT):
+        """推进一个固定模拟步（时长 1/sim_hz 秒）"""
+        timer = self.phase_timer
+        if timer is not None:
+            timer.start("weapons")
+        self.tick += 1
+        dt = self.dt
+
+        # 计算船体晃动偏移（正弦曲线模拟海浪）
+        self.shake_time += self.shake_speed * dt
+        shake_x = math.sin(self.shake_time) * self.shake_amplitude
+        shake_y = math.cos(self.shake_time) * self.shake_amplitude
+        self.prev_shake_offset = self.shake_offset
+        self.shake_offset = (shake_x, shake_y)
+        self._place_weapons(shake_x, shake_y)
+
+        # 武器更新
+        self.cannon1.update(inputs.aim, dt)
+        self.cannon2.update(inputs.aim, dt)
+        self.main_cannon.update(inputs.main_aim or inputs.aim, dt)
+        self.launcher.update(dt)
+
+        # 无限生成来袭导弹
+        if timer is not None:
+            timer.start("spawn")
+        self.missile_spawn_timer += dt
+        if self.missile_spawn_timer >= self.missile_spawn_interval:
+            self.enemy_missiles.append(EnemyMissile(self.rng))
+            self.missile_spawn_timer -= self.missile_spawn_interval  # 保留余量
+            self.missile_spawn_interval = self.rng.randint(*self.missile_spawn_range)
+
+        # 防空导弹更新
+        if timer is not None:
+            timer.start("anti_missiles")
+        self.threats.update(self.enemy_missiles, self.anti_missiles)
+        for am in self.anti_missiles:
+            am.update(self.threats, dt)
+        for em in self.enemy_missiles:
+            if not em.active:
+                self._killed("anti_missile", em)
+
+        # 主炮炮弹更新（可攻击导弹+军营）
+        if timer is not None:
+            timer.start("collision")
+        targets = self._targets
+        targets.clear()
+        targets.extend(self.enemy_missiles)
+        targets.extend(self.camps)
+        self.target_grid.rebuild(targets)
+        if self.main_cannon_shells:
+            was_active = [target.active for target in targets]
+            for shell in self.main_cannon_shells:
+                shell.update(self.target_grid, dt)
+                if shell.has_exploded and shell.active:
+                    self._exploded(shell)
+            for target, active in zip(targets, was_active):
+                if active and not target.active:
+                    self._killed("main_cannon", target)
+        compact_active(self.main_cannon_shells, self.shell_pool)
+
+        # 发射逻辑
+        if timer is not None:
+            timer.start("fire")
+        telemetry = self.telemetry
+        # 1. 近防炮发射（仅攻击导弹）
+        for pressed, is_fast in ((inputs.fire, False), (inputs.fast_fire, True)):
+            if not pressed:
+                continue
+            for mount, cannon in enumerate(self.cannons, 1):
+                bullet = cannon.fire(is_fast=is_fast)
+                if bullet:
+                    self.bullets.append(bullet)
+                    self.cannon_shots += 1
+                    if telemetry is not None:
+                        telemetry.emit("shot", self.tick, weapon="cannon", mount=mount,
+                                       fast=is_fast)
+
+        # 2. 防空导弹发射（2键）
+        if inputs.anti_missile:
+            am = self.launcher.fire_anti_missile(self.threats)
+            if am:
+                self.anti_missiles.append(am)
+                if telemetry is not None:
+                    telemetry.emit("shot", self.tick, weapon="anti_missile",
+                                   locked=am.target is not None)
+
+        # 3. 主炮发射（3键）
+        if inputs.main_cannon:
+            shell = self.main_cannon.fire()
+            if shell:
+                self.main_cannon_shells.append(shell)
+                self.main_cannon_shots += 1
+                if telemetry is not None:
+                    telemetry.emit("shot", self.tick, weapon="main_cannon")
+        if self.sounds is not None:
+            self.sounds.update()
+
+        # 更新子弹和来袭导弹位置
+        if timer is not None:
+            timer.start("movement")
+        missiles = self.enemy_missiles
+        stores = isinstance(missiles, ProjectileStore)
+        if stores:
+            self.bullets.update(dt)
+            self.bullets.compact()
+            missiles.update(dt)
+            if telemetry is not None:
+                reached = ~missiles.active[:missiles.count] & missiles.reached_ship()
+                for i in np.flatnonzero(reached).tolist():
+                    em = missiles[i]
+                    telemetry.emit("ship_hit", self.tick, x=round(em.x, 1), y=round(em.y, 1))
+        else:
+            for bullet in self.bullets:
+                bullet.update(dt)
+            compact_active(self.bullets, self.bullet_pool)
+            for em in missiles:
+                em.update(dt)
+                if telemetry is not None and not em.active and em.reached_ship():
+                    telemetry.emit("ship_hit", self.tick, x=round(em.x, 1), y=round(em.y, 1))
+
+        # 来袭导弹碰撞检测
+        if timer is not None:
+            timer.start("collision")
+        if stores:
+            # 与下面逐个检测相同的扫掠公式和命中规则，整体向量化
+            for i in missiles.collide(self.bullets).tolist():
+                self._killed("cannon", missiles[i])
+            missiles.compact()
+        else:
+            self.bullet_grid.rebuild(self.bullets)
+            for em in missiles:
+                if not em.active:
+                    continue  # 本步已被防空导弹击落、到达船体或飞出屏幕
+                # 检测近防炮子弹碰撞（仅导弹）：子弹和导弹本步的相对运动做扫掠检测
+                hit = self.bullet_grid.first_swept(em.px, em.py, em.x, em.y, em.radius)
+                if hit is not None:
+                    hit[1].active = False
+                    em.active = False
+                    self._killed("cannon", em)
+            compact_active(missiles)
+
+        # 保留军营（仅主炮可攻击）
+        compact_active(self.camps)
+        compact_active(self.anti_missiles, self.anti_missile_pool)
+
+        if self.particles is not None:
+            if timer is not None:
+                timer.start("particles")
+            self.particles.update(dt)
+        if telemetry is not None:
+            self._emit_reloads(telemetry)
+        if timer is not None:
+            timer.stop()
+
+    def _emit_reloads(self, telemetry):
+        """武器开始/完成装填时记录事件"""
+        weapons = (self.cannon1, self.cannon2, self.main_cannon, self.launcher)
+        reloading = tuple(weapon.is_reloading for weapon in weapons)
+        if reloading != self._reloading:
+            for name, was, now in zip(("cannon1", "cannon2", "main_cannon", "launcher"),
+                                      self._reloading, reloading):
+                if was != now:
+                    telemetry.emit("reload", self.tick, weapon=name,
+                                   state="start" if now else "done")
+            self._reloading = reloading
+
+    def _exploded(self, shell):
+        """主炮炮弹爆炸"""
+        if self.particles is not None:
+            self.particles.emit("shell", shell.x, shell.y)
+
+    def _killed(self, weapon, target):
+        """导弹或军营被weapon（cannon/anti_missile/main_cannon）摧毁"""
+        kind = "camp" if isinstance(target, Camp) else "missile"
+        if self.particles is not None:
+            self.particles.emit(kind, target.x, target.y)
+        telemetry = self.telemetry
+        if telemetry is not None:
+            telemetry.emit("kill", self.tick, weapon=weapon, target=kind,
+                           x=round(target.x, 1), y=round(target.y, 1))
+            if kind == "camp":
+                telemetry.emit("camp_destroyed", self.tick, x=target.x, y=target.y,
+                               remaining=sum(1 for camp in self.camps if camp.active))
+
+    def entity_counts(self):
+        counts = {
+            "bullets": len(self.bullets),
+            "enemy_missiles": len(self.enemy_missiles),
+            "anti_missiles": len(self.anti_missiles),
+            "main_cannon_shells": len(self.main_cannon_shells),
+            "camps": len(self.camps),
+        }
+        return counts
+
+    def pool_stats(self):
+        return {
+            "bullets": self.bullet_pool.stats(),
+            "main_cannon_shells": self.shell_pool.stats(),
+            "anti_missiles": self.anti_missile_pool.stats(),
+        }
+
+    def state_digest(self):
+        """模拟状态摘要，用于校验确定性"""
+        h = hashlib.sha1()
+        h.update(repr((self.tick, self.missile_spawn_timer, self.missile_spawn_interval,
+                       self.rng.getstate())).encode())
+        for weapon in (self.cannon1, self.cannon2, self.main_cannon, self.launcher):
+            h.update(repr([(k, v) for k, v in sorted(vars(weapon).items())
+                           if k not in ("sound", "pool")]).encode())
+        for group in (self.bullets, self.enemy_missiles, self.anti_missiles,
+                      self.main_cannon_shells, self.camps):
+            if isinstance(group, ProjectileStore):
+                # 与列表逐个取值的结果相同（数组转成Python float/bool后repr一致）
+                n = group.count
+                rows = list(zip(group.x[:n].tolist(), group.y[:n].tolist(),
+                                group.active[:n].tolist()))
+            else:
+                rows = [(e.x, e.y, e.active) for e in group]
+            h.update(repr(rows).encode())
+        return h.hexdigest()
+
+    def draw_static(self, surface):
+        """绘制静态层：海面、陆地和军营（只随军营被摧毁而变化）"""
+        surface.fill(BLUE)
+        draw_land_and_camps(surface, [(camp.x, camp.y) for camp in self.camps if camp.active])
+
+    def static_key(self):
+        """静态层内容的标识，变化时需要重新烘焙背景"""
+        return tuple((camp.x, camp.y) for camp in self.camps)
+
+    def draw_dynamic(self, surface, alpha=1.0, queue=None):
+        """绘制所有运动物体，返回绘制过的矩形列表（脏矩形）。
+        alpha为两次模拟步之间的插值系数（0=上一步，1=当前步）；
+        绘制先进queue（RenderQueue，不传则临时建一个），每类实体一层"""
+        if queue is None:
+            queue = RenderQueue(surface.get_rect())
+        # 绘制船底（带晃动）
+        (px, py), (x, y) = self.prev_shake_offset, self.shake_offset
+        shake = (x - (x - px) * (1.0 - alpha), y - (y - py) * (1.0 - alpha))
+        draw_ship(queue, self.ship_x_base, self.ship_y_base, shake)
+        queue.layer()
+        for shell in self.main_cannon_shells:
+            shell.draw(queue, alpha)
+        queue.layer()
+        for group in (self.bullets, self.enemy_missiles):
+            if isinstance(group, ProjectileStore):
+                group.draw(queue, alpha)
+            else:
+                for entity in group:
+                    entity.draw(queue, alpha)
+            queue.layer()
+        # 绘制防空导弹
+        for am in self.anti_missiles:
+            am.draw(queue, alpha)
+        queue.layer()
+        if self.particles is not None:
+            self.particles.draw(queue, alpha)
+            queue.layer()
+        # 绘制武器
+        self.launcher.draw(queue, alpha)
+        self.cannon1.draw(queue, alpha)
+        self.cannon2.draw(queue, alpha)
+        self.main_cannon.draw(queue, alpha)
+        return queue.flush(surface)
+
+    def draw(self, surface, alpha=1.0):
+        """把当前状态完整画到surface上"""
+        self.draw_static(surface)
+        self.draw_dynamic(surface, alpha)
+
+
+class WorldSnapshot:
+    """某一模拟步的只读快照，渲染只需要它。全部数据放在一个 array('d') 里：
+    固定头 + 4个武器 + 各类实体（位置、上一步位置、朝向等），可整块复制进共享内存"""
+
+    HEADER = ("tick", "sim_hz", "published", "shake_x", "shake_y", "prev_shake_x", "prev_shake_y",
+              "cannon_shots", "main_cannon_shots",
+              "bullets", "enemy_missiles", "main_cannon_shells", "anti_missiles", "camps",
+              "particles")
+    KINDS = ("bullets", "enemy_missiles", "main_cannon_shells", "anti_missiles", "camps",
+             "particles")
+    # 每行字段数：武器 x,y,px,py,angle,弹药,满弹,装填中；子弹 x,y,px,py,颜色；
+    # 导弹/防空导弹 x,y,px,py,angle；炮弹 x,y,px,py,已爆炸；军营 x,y；
+    # 粒子 x,y,本步位移x,本步位移y,帧号
+    WEAPON_STRIDE = 8
+    STRIDES = {"bullets": 5, "enemy_missiles": 5, "main_cannon_shells": 5,
+               "anti_missiles": 5, "camps": 2, "particles": 5}
+
+    _FIELDS = {name: i for i, name in enumerate(HEADER)}
+
+    __slots__ = ("data", "_offsets")
+
+    def __init__(self, data):
+        self.data = data
+        offsets = {}
+        offset = len(self.HEADER) + 4 * self.WEAPON_STRIDE
+        for i, kind in enumerate(self.KINDS):
+            offsets[kind] = offset
+            offset += int(data[self._FIELDS[kind]]) * self.STRIDES[kind]
+        self._offsets = offsets
+
+    @classmethod
+    def capture(cls, world, published=None):
+        """从模拟状态生成快照"""
+        particles = world.particles.rows() if world.particles is not None else None
+        data = array("d", (world.tick, world.sim_hz,
+                           time.perf_counter() if published is None else published,
+                           *world.shake_offset, *world.prev_shake_offset,
+                           world.cannon_shots, world.main_cannon_shots,
+                           len(world.bullets), len(world.enemy_missiles),
+                           len(world.main_cannon_shells), len(world.anti_missiles),
+                           len(world.camps), 0 if particles is None else len(particles)))
+        for weapon in (world.cannon1, world.cannon2, world.main_cannon):
+            data.extend((weapon.x, weapon.y, weapon.px, weapon.py, weapon.angle,
+                         weapon.current_ammo, weapon.total_ammo, weapon.is_reloading))
+        launcher = world.launcher
+        data.extend((launcher.x, launcher.y, launcher.px, launcher.py, 0,
+                     launcher.current_ammo, launcher.max_ammo, launcher.is_reloading))
+        bullets = world.bullets
+        if isinstance(bullets, ProjectileStore):
+            n = bullets.count
+            colors = np.array([r << 16 | g << 8 | bl for r, g, bl in bullets.palette] or [0],
+                              dtype=np.float64)
+            rows = np.column_stack((bullets.x[:n], bullets.y[:n], bullets.px[:n], bullets.py[:n],
+                                    colors[bullets.color[:n]]))
+            data.frombytes(rows.tobytes())
+        else:
+            for b in bullets:
+                r, g, bl = b.color
+                data.extend((b.x, b.y, b.px, b.py, r << 16 | g << 8 | bl))
+        for em in world.enemy_missiles:
+            data.extend((em.x, em.y, em.px, em.py, em.angle))
+        for shell in world.main_cannon_shells:
+            data.extend((shell.x, shell.y, shell.px, shell.py, shell.has_exploded))
+        for am in world.anti_missiles:
+            data.extend((am.x, am.y, am.px, am.py, am.angle))
+        for camp in world.camps:
+            data.extend((camp.x, camp.y))
+        if particles is not None:
+            data.frombytes(particles.astype(np.float64).tobytes())
+        return cls(data)
+
+    @classmethod
+    def frombytes(cls, buffer):
+        data = array("d")
+        data.frombytes(buffer)
+        return cls(data)
+
+    def __getattr__(self, name):
+        # 头字段按名称读取，如 snapshot.tick
+        try:
+            return self.data[WorldSnapshot._FIELDS[name]]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def rows(self, kind):
+        """某类实体的逐行数据（元组）"""
+        stride = self.STRIDES[kind]
+        start = self._offsets[kind]
+        data = self.data
+        for i in range(int(data[self._FIELDS[kind]])):
+            yield tuple(data[start + i * stride:start + (i + 1) * stride])
+
+    def weapons(self):
+        start, stride = len(self.HEADER), self.WEAPON_STRIDE
+        return [tuple(self.data[start + i * stride:start + (i + 1) * stride]) for i in range(4)]
+
+    def alpha(self, now=None):
+        """按快照发布后经过的时间换算插值系数"""
+        now = time.perf_counter() if now is None else now
+        return max(0.0, min(1.0, (now - self.published) * self.sim_hz))
+
+    def entity_counts(self):
+        return {kind: int(self.data[self._FIELDS[kind]]) for kind in self.KINDS
+                if kind != "particles"}
+
+    def static_key(self):
+        return tuple(self.rows("camps"))
+
+    def draw_static(self, surface):
+        surface.fill(BLUE)
+        draw_land_and_camps(surface, self.rows("camps"))
+
+    def draw_dynamic(self, surface, alpha=1.0, queue=None):
+        """与 GameWorld.draw_dynamic 画法相同，数据取自快照"""
+        if queue is None:
+            queue = RenderQueue(surface.get_rect())
+        beta = 1.0 - alpha
+        sx, sy, psx, psy = (self.shake_x, self.shake_y, self.prev_shake_x, self.prev_shake_y)
+        draw_ship(queue, WIDTH // 2 - SHIP_SIZE[0] // 2, HEIGHT // 2 - SHIP_SIZE[1] // 2,
+                  (sx - (sx - psx) * beta, sy - (sy - psy) * beta))
+        queue.layer()
+        for x, y, px, py, exploded in self.rows("main_cannon_shells"):
+            if not exploded:
+                x, y = x - (x - px) * beta, y - (y - py) * beta
+            MainCannonShell.draw_at(queue, x, y, exploded)
+        queue.layer()
+        for x, y, px, py, color in self.rows("bullets"):
+            color = int(color)
+            Bullet.draw_at(queue, x - (x - px) * beta, y - (y - py) * beta,
+                           (color >> 16, color >> 8 & 0xFF, color & 0xFF))
+        queue.layer()
+        for x, y, px, py, angle in self.rows("enemy_missiles"):
+            EnemyMissile.draw_at(queue, x - (x - px) * beta, y - (y - py) * beta, angle)
+        queue.layer()
+        for x, y, px, py, angle in self.rows("anti_missiles"):
+            AntiMissile.draw_at(queue, x - (x - px) * beta, y - (y - py) * beta, angle)
+        queue.layer()
+        count = int(self.particles)
+        if count:
+            start = self._offsets["particles"]
+            rows = np.frombuffer(self.data, dtype=np.float64, count=count * 5,
+                                 offset=start * 8).reshape(count, 5)
+            submit_particles(queue, rows[:, 0] - rows[:, 2] * beta,
+                             rows[:, 1] - rows[:, 3] * beta, rows[:, 4].astype(int))
+            queue.layer()
+        cannon1, cannon2, main_cannon, launcher = self.weapons()
+        for cls, (x, y, px, py, angle, ammo, total, reloading) in (
+                (Launcher, launcher), (Cannon, cannon1), (Cannon, cannon2),
+                (MainCannon, main_cannon)):
+            cls.draw_at(queue, x - (x - px) * beta, y - (y - py) * beta, angle,
+                        int(ammo), int(total), bool(reloading))
+        return queue.flush(surface)
+
+
+def draw_hints(surface):
+    """绘制操作提示和版权信息"""
+    missile_text = f"Try to use 1 2 3"
+    surface.blit(text_renderer.render(missile_text, 36, WHITE), (20, 220))
+
+    hints = [
+            "Made by WaspSquidW (c) 2025 WaspSquidW MIJI-Game",
+            "WikiWaspWang@outlook.com",
+            "v1.01"
+        ]
+    for i, hint in enumerate(hints):
+        surface.blit(text_renderer.render(hint, 36, WHITE), (20, HEIGHT - 80 + i*30))
+
+
+class LayeredRenderer:
+    """分层渲染：海面、陆地、军营和提示文字烘焙成静态背景，只在军营被摧毁时重绘；
+    运动物体按脏矩形擦除/重绘，经 RenderQueue 剔除屏外物体后按层批量提交，
+    每帧只调用一次 display.update(rects)。
+    世界固定为 WIDTH x HEIGHT 个单位，surface 可以是任意同比例的大小：
+    按 surface宽/WIDTH 缩放，精灵预先缩放到同一比例"""
+
+    def __init__(self, surface):
+        self.surface = surface
+        self.scale = surface.get_width() / WIDTH  # 世界单位 -> 画布像素
+        if self.scale != 1:
+            prescale_sprites(self.scale)
+        self.background = pygame.Surface(surface.get_size()).convert()
+        # 运动物体的批量绘制队列（视口为整个世界）
+        self.queue = RenderQueue((0, 0, WIDTH, HEIGHT), self.scale)
+        self._static_key = None
+        self._prev_rects = []
+        self._bake_surface = None
+        self._full_redraw = True
+        self.bakes = 0  # 背景烘焙次数
+
+    def invalidate(self):
+        """下一帧整屏重绘（窗口被遮挡恢复等情况）"""
+        self._full_redraw = True
+
+    def to_world(self, pos):
+        """画布像素坐标（如鼠标位置）换算成世界坐标"""
+        return (int(pos[0] / self.scale), int(pos[1] / self.scale))
+
+    def _bake(self, world):
+        background = self.background
+        if self.scale != 1:
+            # 静态层按世界尺寸绘制后缩放，只在烘焙时做一次
+            if self._bake_surface is None:
+                self._bake_surface = pygame.Surface((WIDTH, HEIGHT)).convert()
+            background = self._bake_surface
+        world.draw_static(background)
+        draw_hints(background)
+        if background is not self.background:
+            pygame.transform.smoothscale(background, self.background.get_size(),
+                                         self.background)
+        self.bakes += 1
+
+    def render(self, world, overlays=(), timer=None, alpha=1.0):
+        """绘制一帧并提交到屏幕；overlays为额外绘制函数 f(surface) -> 矩形或None，
+        alpha为模拟步之间的插值系数"""
+        surface, background = self.surface, self.background
+        key = world.static_key()
+        if key != self._static_key:
+            self._static_key = key
+            self._bake(world)
+            self._full_redraw = True
+
+        if self._full_redraw:
+            surface.blit(background, (0, 0))
+        else:
+            # 用背景擦掉上一帧的运动物体
+            for rect in self._prev_rects:
+                surface.blit(background, rect, rect)
+
+        rects = world.draw_dynamic(surface, alpha, self.queue)
+        for overlay in overlays:
+            rects.append(overlay(surface))
+        rects = [rect for rect in rects if rect]
+
+        if timer is not None:
+            timer.start("present")
+        if self._full_redraw:
+            pygame.display.update()
+            self._full_redraw = False
+        else:
+            pygame.display.update(self._prev_rects + rects)
+        self._prev_rects = rects
+
+
+class InputLatch:
+    """渲染线程写入的最新输入；单次按键用累计次数表示，模拟端按次数变化触发一次"""
+
+    def __init__(self):
+        self._consumed = (0, 0)
+
+    def to_tick_input(self, aim_x, aim_y, fire, fast_fire, anti_missile_clicks,
+                      main_cannon_clicks):
+        consumed2, consumed3 = self._consumed
+        self._consumed = (anti_missile_clicks, main_cannon_clicks)
+        return TickInput((aim_x, aim_y), bool(fire), bool(fast_fire),
+                         anti_missile_clicks > consumed2, main_cannon_clicks > consumed3)
+
+
+def _simulation_loop(world, read_input, publish, stopped, max_steps=5):
+    """按固定频率推进模拟并发布快照，直到 stopped() 为真"""
+    timestep = FixedTimestep(world.sim_hz, max_steps)
+    latch = InputLatch()
+    publish(WorldSnapshot.capture(world))
+    previous = time.perf_counter()
+    while not stopped():
+        now = time.perf_counter()
+        steps = timestep.advance(now - previous)
+        previous = now
+        for _ in range(steps):
+            world.step(latch.to_tick_input(*read_input()))
+            publish(WorldSnapshot.capture(world))
+        # 睡到下一步到期
+        time.sleep(max(0.0, timestep.step - timestep.accumulator))
+
+
+class SimulationThread:
+    """模拟跑在工作线程：每步生成新的不可变快照并替换引用（双缓冲），
+    渲染线程随时取最新一份。绘制/提交屏幕时pygame会释放GIL，两边可以重叠"""
+
+    def __init__(self, seed=None, sim_hz=SIM_REFERENCE_HZ, telemetry=None):
+        self.world = GameWorld(seed=seed, sound=False, sim_hz=sim_hz)
+        self.world.telemetry = telemetry  # 事件缓冲可跨线程写入
+        self._input = (WIDTH // 2, 0, False, False, 0, 0)
+        self._snapshot = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="miji-sim", daemon=True)
+
+    def _run(self):
+        def publish(snapshot):
+            self._snapshot = snapshot
+        _simulation_loop(self.world, lambda: self._input, publish, self._stop.is_set)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def set_input(self, aim, fire, fast_fire, anti_missile_clicks, main_cannon_clicks):
+        """写入最新输入（整体替换元组，模拟线程读到的总是完整一组）"""
+        self._input = (aim[0], aim[1], fire, fast_fire, anti_missile_clicks, main_cannon_clicks)
+
+    def latest(self):
+        return self._snapshot
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+
+class SharedSnapshotBuffer:
+    """共享内存里的双槽快照缓冲，用序号锁(seqlock)保证读到完整数据：
+    写端写入非当前槽，写前序号变奇数、写完变偶数，再切换“最新槽”；
+    读端复制数据前后序号一致且为偶数才算有效"""
+
+    CONTROL = struct.Struct("<qqqqq")  # 最新槽, 槽0序号, 槽0长度, 槽1序号, 槽1长度
+
+    def __init__(self, name=None, capacity=1 << 20):
+        from multiprocessing import shared_memory
+        self.capacity = capacity  # 每槽字节数
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True,
+                                                  size=self.CONTROL.size + 2 * capacity)
+            self.CONTROL.pack_into(self.shm.buf, 0, 0, 0, 0, 0, 0)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            self.capacity = (self.shm.size - self.CONTROL.size) // 2
+        self.name = self.shm.name
+        self.dropped = 0  # 超出容量未发布的快照数
+
+    def _slot(self, index):
+        start = self.CONTROL.size + index * self.capacity
+        return start, 8 + index * 16
+
+    def write(self, payload):
+        buf = self.shm.buf
+        latest = struct.unpack_from("<q", buf, 0)[0]
+        index = 1 - latest
+        if len(payload) > self.capacity:
+            self.dropped += 1
+            return False
+        start, ctrl = self._slot(index)
+        seq = struct.unpack_from("<q", buf, ctrl)[0]
+        struct.pack_into("<qq", buf, ctrl, seq + 1, len(payload))
+        buf[start:start + len(payload)] = payload
+        struct.pack_into("<q", buf, ctrl, seq + 2)
+        struct.pack_into("<q", buf, 0, index)
+        return True
+
+    def read(self, retries=8):
+        """复制最新槽的数据；写端太快导致多次冲突时返回None"""
+        buf = self.shm.buf
+        for _ in range(retries):
+            index = struct.unpack_from("<q", buf, 0)[0]
+            start, ctrl = self._slot(index)
+            seq, length = struct.unpack_from("<qq", buf, ctrl)
+            if seq == 0 or seq & 1:
+                continue
+            payload = bytes(buf[start:start + length])
+            if struct.unpack_from("<q", buf, ctrl)[0] == seq:
+                return payload
+        return None
+
+    def close(self, unlink=False):
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+
+def _simulation_process(buffer_name, inputs, stop_event, seed, sim_hz, telemetry=None):
+    """子进程入口：模拟并把快照写入共享内存；telemetry为(目录, 会话名)时单独写一份游戏事件"""
+    buffer = SharedSnapshotBuffer(buffer_name)
+    world = GameWorld(seed=seed, sound=False, sim_hz=sim_hz)
+    if telemetry is not None:
+        world.telemetry = Telemetry(*telemetry, stream="sim")
+    try:
+        _simulation_loop(world, lambda: tuple(inputs),
+                         lambda snapshot: buffer.write(snapshot.data.tobytes()),
+                         stop_event.is_set)
+    finally:
+        buffer.close()
+        if world.telemetry is not None:
+            world.telemetry.close()
+
+
+class SimulationProcess:
+    """模拟跑在子进程（真正用上第二个核）：快照经共享内存双槽传递，
+    输入写在共享数组里。子进程用spawn启动，只导入本模块，不初始化窗口"""
+
+    def __init__(self, seed=None, sim_hz=SIM_REFERENCE_HZ, telemetry=None):
+        context = multiprocessing.get_context("spawn")
+        # 游戏事件在子进程产生，由子进程按同一会话名另写一个数据流
+        telemetry = (telemetry.directory, telemetry.session) if telemetry else None
+        self.buffer = SharedSnapshotBuffer()
+        self._inputs = context.Array("d", 6, lock=False)
+        self._inputs[0] = WIDTH // 2
+        self._stop = context.Event()
+        self._process = context.Process(
+            target=_simulation_process, name="miji-sim", daemon=True,
+            args=(self.buffer.name, self._inputs, self._stop, seed, sim_hz, telemetry))
+        self._snapshot = None
+
+    def start(self):
+        self._process.start()
+        return self
+
+    def set_input(self, aim, fire, fast_fire, anti_missile_clicks, main_cannon_clicks):
+        self._inputs[:] = [aim[0], aim[1], fire, fast_fire, anti_missile_clicks,
+                           main_cannon_clicks]
+
+    def latest(self):
+        payload = self.buffer.read()
+        if payload is not None:
+            self._snapshot = WorldSnapshot.frombytes(payload)
+        return self._snapshot
+
+    def stop(self):
+        self._stop.set()
+        self._process.join(timeout=2)
+        if self._process.is_alive():
+            self._process.terminate()
+        self.buffer.close(unlink=True)
+
+
+def intercept_times(px, py, vx, vy, ox, oy, speed, muzzle=0.0):
+    """弹体从(ox, oy)沿直线飞出（出膛时已在muzzle距离处，之后每帧speed，须比目标快），
+    拦截在(px, py)以每帧(vx, vy)匀速运动的目标，返回最早相遇的帧数，无解为inf。
+    参数都可以是numpy数组（按广播规则批量求解）"""
+    dx, dy = px - ox, py - oy
+    # |d + v t| = muzzle + speed t  =>  a t^2 + b t + c = 0，弹体更快所以 a < 0
+    a = vx * vx + vy * vy - speed * speed
+    b = 2 * (dx * vx + dy * vy - muzzle * speed)
+    c = dx * dx + dy * dy - muzzle * muzzle
+    disc = b * b - 4 * a * c
+    root = np.sqrt(np.maximum(disc, 0))
+    t1 = (-b - root) / (2 * a)
+    t2 = (-b + root) / (2 * a)
+    early, late = np.minimum(t1, t2), np.maximum(t1, t2)
+    t = np.where(early >= 0, early, late)
+    return np.where((disc >= 0) & (t >= 0), t, np.inf)
+
+
+class Autopilot:
+    """自动驾驶：读取模拟状态，每步产生与玩家相同的输入（瞄准点、左键/1键、2键、3键），
+    用于无人值守的长时间运行和压测。需要numpy，所有来袭导弹一次批量求解：
+    - 近防炮：对每枚导弹解提前量拦截点，在子弹射程内能拦住的导弹里挑离船体最近（剩余帧数
+      最少）且还没打够的一枚。两门炮共用一个瞄准点，取两门炮各自拦截射线的交点，两门都打得中
+    - 主炮（单独瞄准 main_aim）：对最紧急的若干导弹求炮弹拦截点，数炮弹到达时爆炸半径内
+      会有几枚导弹，军营按CAMP_VALUE计，够MAIN_CANNON_PAYOFF才开炮
+    - 防空导弹：两门近防炮都在装填、或有导弹快到船体时发射
+    可以直接作为 input_source(world) 使用"""
+
+    BULLET_SPEED = 15     # Bullet.speed
+    BULLET_LIFETIME = 80  # Bullet.lifetime
+    CANNON_MUZZLE = 40    # Cannon.fire 子弹出膛距离
+    SHELL_SPEED = 8       # MainCannonShell.speed
+    SHELL_LIFETIME = 150
+    SHELL_MUZZLE = 60
+    EXPLODE_RADIUS = 60
+    LOCK_RANGE = 400      # AntiMissile.lock_range
+    VOLLEYS = 3           # 每个目标连射几轮后换下一个（打偏了等子弹飞过再回来）
+    CLUSTER_CANDIDATES = 16  # 主炮只评估最紧急的这么多个落点
+    MAIN_CANNON_PAYOFF = 3   # 一发至少值这么多枚导弹才开主炮
+    CAMP_VALUE = 3           # 一个军营折算的导弹数
+    URGENT_FRAMES = 120      # 目标离船体不足这么多帧时速射
+    ANTI_MISSILE_FRAMES = 45  # 导弹离船体不足这么多帧时补发防空导弹
+    ANTI_MISSILE_INTERVAL = 15
+
+    def __init__(self):
+        if not numpy_available():
+            raise RuntimeError("Autopilot 需要安装 numpy")
+        self.aim = (WIDTH // 2, 0)
+        self.main_aim = (WIDTH // 2, 0)
+        self._target = None    # 当前近防炮目标uid
+        self._volleys = 0
+        self._target_time = 0.0  # 子弹飞到当前目标的帧数
+        self._covered = {}     # 已打够的目标uid -> 到哪一帧为止不再打
+        self._shots = 0        # 上一步看到的近防炮累计开火数
+        self._last_anti_missile = -self.ANTI_MISSILE_INTERVAL
+        self._velocity = (np.zeros(0, dtype=np.int64), np.zeros((0, 2)))  # uid, 速度 缓存
+        self.ticks = 0
+        self.seconds = 0.0      # 决策总耗时
+        self.max_seconds = 0.0
+        self.main_cannon_shots = 0
+        self.anti_missiles = 0
+
+    def __call__(self, world):
+        start = time.perf_counter()
+        inputs = self.decide(world)
+        elapsed = time.perf_counter() - start
+        self.ticks += 1
+        self.seconds += elapsed
+        if elapsed > self.max_seconds:
+            self.max_seconds = elapsed
+        return inputs
+
+    def decide(self, world):
+        missiles = world.enemy_missiles
+        tick = world.tick
+        if world.cannon_shots > self._shots and self._target is not None:
+            self._volleys += 1
+        self._shots = world.cannon_shots
+        if len(self._covered) > 256:
+            self._covered = {uid: until for uid, until in self._covered.items() if until > tick}
+
+        uids, x, y, vx, vy = self._missile_arrays(missiles)
+        speed = np.maximum(np.hypot(vx, vy), 1e-6)
+        eta = np.hypot(x - WIDTH / 2, y - HEIGHT / 2) / speed  # 离船体的剩余帧数
+        fire, fast_fire = self._aim_cannons(world, uids, x, y, vx, vy, eta)
+        main_cannon = self._aim_main_cannon(world, x, y, vx, vy, eta)
+        anti_missile = self._anti_missile(world, missiles, x, y, eta)
+        return TickInput(self.aim, fire, fast_fire, anti_missile, main_cannon, self.main_aim)
+
+    def _missile_arrays(self, missiles):
+        """来袭导弹的 uid、位置、速度数组。导弹速度生成后不变，按uid缓存，只读新导弹的
+        （列表按生成顺序排列，uid递增，可以二分查找；找不到的按新导弹处理）"""
+        n = len(missiles)
+        uids = np.fromiter(map(attrgetter("uid"), missiles), np.int64, n)
+        x = np.fromiter(map(attrgetter("x"), missiles), float, n)
+        y = np.fromiter(map(attrgetter("y"), missiles), float, n)
+        cached_uids, cached = self._velocity
+        velocity = np.empty((n, 2))
+        if len(cached_uids):
+            pos = np.minimum(np.searchsorted(cached_uids, uids), len(cached_uids) - 1)
+            known = cached_uids[pos] == uids
+            velocity[known] = cached[pos[known]]
+        else:
+            known = np.zeros(n, dtype=bool)
+        for i in np.flatnonzero(~known):
+            velocity[i] = missiles[i].vx, missiles[i].vy
+        self._velocity = (uids, velocity)
+        return uids, x, y, velocity[:, 0], velocity[:, 1]
+
+    def _aim_cannons(self, world, uids, x, y, vx, vy, eta):
+        cannon1, cannon2 = world.cannons
+        if not len(x) or (cannon1.is_reloading and cannon2.is_reloading):
+            return False, False
+        ox = np.array([[cannon1.x], [cannon2.x]])
+        oy = np.array([[cannon1.y], [cannon2.y]])
+        t = intercept_times(x, y, vx, vy, ox, oy, self.BULLET_SPEED, self.CANNON_MUZZLE)  # (2, n)
+        in_time = t <= self.BULLET_LIFETIME
+        t = np.where(in_time, t, 0)
+        hx, hy = x + vx * t, y + vy * t
+        # 两门炮都能在子弹寿命内、屏幕范围内（子弹出屏即失效）打到
+        reachable = (in_time & (hx > 0) & (hx < WIDTH) & (hy > 0) & (hy < HEIGHT)).all(axis=0)
+        if not reachable.any():
+            self._target = None
+            return False, False
+        tick = world.tick
+        if self._target is not None and self._volleys >= self.VOLLEYS:
+            # 打够了：等这轮子弹飞到再说
+            self._covered[self._target] = tick + int(self._target_time) + 5
+            self._target = None
+        fresh = reachable
+        covered = [uid for uid, until in self._covered.items() if until > tick]
+        if covered:
+            # uids按生成顺序递增，二分查找已打够的目标
+            pos = np.minimum(np.searchsorted(uids, covered), len(uids) - 1)
+            fresh = reachable.copy()
+            fresh[pos[uids[pos] == covered]] = False
+        if not fresh.any():
+            return False, False  # 能打的都已经有子弹在路上
+        i = int(np.argmin(np.where(fresh, eta, np.inf)))
+        if uids[i] != self._target:
+            self._target = int(uids[i])
+            self._volleys = 0
+        self._target_time = t[:, i].max()
+        self.aim = self._shared_aim((cannon1.x, cannon1.y), (hx[0, i], hy[0, i]),
+                                    (cannon2.x, cannon2.y), (hx[1, i], hy[1, i]))
+        # 同时按左键会先按普通射速开火，所以速射时只按1键
+        urgent = eta[i] < self.URGENT_FRAMES or np.count_nonzero(fresh) >= 4
+        return not urgent, urgent
+
+    @staticmethod
+    def _shared_aim(c1, h1, c2, h2):
+        """两门炮的瞄准点：c1->h1 与 c2->h2 两条射线的交点（两门炮各自指向自己的拦截点）"""
+        d1x, d1y = h1[0] - c1[0], h1[1] - c1[1]
+        d2x, d2y = h2[0] - c2[0], h2[1] - c2[1]
+        denom = d1x * d2y - d1y * d2x
+        ex, ey = c2[0] - c1[0], c2[1] - c1[1]
+        if abs(denom) > 1e-9:
+            s = (ex * d2y - ey * d2x) / denom
+            u = (ex * d1y - ey * d1x) / denom
+            if 0 < s < 8 and 0 < u < 8:  # 交点离得太远时（射线几乎平行）直接瞄拦截点
+                return (c1[0] + d1x * s, c1[1] + d1y * s)
+        return (float((h1[0] + h2[0]) / 2), float((h1[1] + h2[1]) / 2))
+
+    def _aim_main_cannon(self, world, x, y, vx, vy, eta):
+        cannon = world.main_cannon
+        if (cannon.is_reloading or cannon.current_ammo <= 0
+                or cannon.cooldown_timer > world.dt):
+            return False
+        camps = world.camps
+        order = np.argsort(eta)[:self.CLUSTER_CANDIDATES]
+        # 候选落点：最紧急的导弹 + 所有军营（静止目标）
+        cx = np.concatenate((x[order], [camp.x for camp in camps]))
+        cy = np.concatenate((y[order], [camp.y for camp in camps]))
+        cvx = np.concatenate((vx[order], np.zeros(len(camps))))
+        cvy = np.concatenate((vy[order], np.zeros(len(camps))))
+        if not len(cx):
+            return False
+        t = intercept_times(cx, cy, cvx, cvy, cannon.x, cannon.y, self.SHELL_SPEED,
+                            self.SHELL_MUZZLE)
+        in_time = t <= self.SHELL_LIFETIME
+        t = np.where(in_time, t, 0)
+        hx, hy = cx + cvx * t, cy + cvy * t
+        valid = in_time & (hx > 0) & (hx < WIDTH) & (hy > 0) & (hy < HEIGHT)
+        if not valid.any():
+            return False
+        # 炮弹到达时各导弹的位置，数爆炸半径内的个数：(候选, 导弹)
+        r2 = self.EXPLODE_RADIUS ** 2
+        mx = np.multiply.outer(t, vx)
+        mx += x
+        mx -= hx[:, None]
+        mx *= mx
+        my = np.multiply.outer(t, vy)
+        my += y
+        my -= hy[:, None]
+        my *= my
+        mx += my
+        score = np.count_nonzero(mx <= r2, axis=1).astype(float)
+        if camps:
+            px = np.array([camp.x for camp in camps])
+            py = np.array([camp.y for camp in camps])
+            dx, dy = px[None, :] - hx[:, None], py[None, :] - hy[:, None]
+            score += self.CAMP_VALUE * np.count_nonzero(dx * dx + dy * dy <= r2, axis=1)
+        score = np.where(valid, score, 0)
+        best = int(np.argmax(score))
+        if score[best] < self.MAIN_CANNON_PAYOFF:
+            return False
+        self.main_aim = (float(hx[best]), float(hy[best]))
+        self.main_cannon_shots += 1
+        return True
+
+    def _anti_missile(self, world, missiles, x, y, eta):
+        launcher = world.launcher
+        tick = world.tick
+        if (launcher.is_reloading or launcher.current_ammo <= 0 or not missiles
+                or tick - self._last_anti_missile < self.ANTI_MISSILE_INTERVAL):
+            return False
+        # 锁定范围内、（近防炮都在装填时）任意或（否则）快到船体的导弹
+        wanted = np.hypot(x - launcher.x, y - launcher.y) < self.LOCK_RANGE
+        if not all(cannon.is_reloading for cannon in world.cannons):
+            wanted &= eta < self.ANTI_MISSILE_FRAMES
+        engaged = {id(am.target) for am in world.anti_missiles if am.target is not None}
+        if any(id(missiles[i]) not in engaged for i in np.flatnonzero(wanted)):
+            self._last_anti_missile = tick
+            self.anti_missiles += 1
+            return True
+        return False
+
+    def stats(self):
+        return {
+            "ticks": self.ticks,
+            "mean_us": self.seconds / self.ticks * 1e6 if self.ticks else 0.0,
+            "max_us": self.max_seconds * 1e6,
+            "main_cannon_shots": self.main_cannon_shots,
+            "anti_missiles": self.anti_missiles,
+        }
+
+
+def run_headless(ticks, seed=None, input_source=None):
+    """无窗口全速运行模拟，返回(world, 每秒帧数)；input_source(world)返回每帧输入"""
+    world = GameWorld(seed=seed, sound=False)
+    start = time.perf_counter()
+    for _ in range(ticks):
+        world.step(input_source(world) if input_source else IDLE_INPUT)
+    elapsed = time.perf_counter() - start
+    return world, ticks / elapsed if elapsed > 0 else float("inf")
+
+
+def _sweep_aim(tick):
+    """在上方海域来回扫动的瞄准点"""
+    return (WIDTH / 2 + math.cos(tick * 0.013) * WIDTH * 0.45,
+            HEIGHT / 2 + math.sin(tick * 0.021) * HEIGHT * 0.45)
+
+
+def _bench_idle_inputs(world):
+    return IDLE_INPUT
+
+
+def _bench_fast_fire_setup(world):
+    for cannon in world.cannons:
+        cannon.reload_time = 0  # 持续压测速射，不等装填
+
+
+def _bench_fast_fire_inputs(world):
+    # 只按速射键：同时按左键会先按普通射速开火，把射速拖回5帧
+    return TickInput(_sweep_aim(world.tick), False, True, False, False)
+
+
+def _bench_swarm_setup(world):
+    # 导弹生成频率为正常的10倍
+    world.missile_spawn_interval = 5
+    world.missile_spawn_range = (3, 7)
+
 
+def _bench_swarm_inputs(world):
+    return TickInput(_sweep_aim(world.tick), True, False, world.tick % 30 == 0, False)
 
-def main():
+
+# 每个世界一个自动驾驶（有内部状态）
+_autopilots = weakref.WeakKeyDictionary()
+
+
+def _bench_autopilot_setup(world):
+    _bench_swarm_setup(world)
+    _autopilots[world] = Autopilot()
+
+
+def _bench_autopilot_inputs(world):
+    return _autopilots[world](world)
+
+
+def _bench_barrage_setup(world):
+    cannon = world.main_cannon
+    cannon.fire_cooldown = 6
+    cannon.total_ammo = cannon.current_ammo = 10 ** 6
+
+
+def _bench_barrage_inputs(world):
+    # 军营被摧毁后补齐，保证始终有目标
+    while len(world.camps) < 5:
+        world.camps.append(Camp(world.rng))
+    camp = world.camps[world.tick % len(world.camps)]
+    return TickInput((camp.x, camp.y), False, False, False, True)
+
+
+def _bench_projectiles_setup(world):
+    world.use_projectile_stores()
+
+
+def _bench_projectiles_inputs(world):
+    # 两门近防炮每帧向四周各喷射一批子弹（同屏约一万发），导弹补足到500枚
+    bullets, missiles = world.bullets, world.enemy_missiles
+    rng = world.rng
+    for cannon in world.cannons:
+        for _ in range(100):
+            bullets.add(cannon.x, cannon.y, rng.uniform(-math.pi, math.pi), 15, 3, 80,
+                        LIGHT_BLUE)
+    while len(missiles) < 500:
+        missiles.append(EnemyMissile(rng))
+    return IDLE_INPUT
+
+
+# 压测场景：名称 -> (说明, 初始化函数, 每帧输入函数)
+BENCH_SCENARIOS = {
+    "idle": ("无输入待机", None, _bench_idle_inputs),
+    "fast_fire": ("两门近防炮持续速射", _bench_fast_fire_setup, _bench_fast_fire_inputs),
+    "swarm": ("10倍导弹生成频率", _bench_swarm_setup, _bench_swarm_inputs),
+    "barrage": ("主炮连射轰击军营", _bench_barrage_setup, _bench_barrage_inputs),
+    "autopilot": ("自动驾驶应对10倍导弹", _bench_autopilot_setup, _bench_autopilot_inputs),
+    "projectiles": ("数组存储的上万发子弹对500枚导弹", _bench_projectiles_setup,
+                    _bench_projectiles_inputs),
+}
+
+
+def percentile(values, pct):
+    """最近秩百分位数"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, math.ceil(pct / 100 * len(ordered)) - 1)
+    return ordered[rank]
+
+
+def _summarize_phases(history):
+    summary = {}
+    for phase, values in history.items():
+        ms = [v * 1000 for v in values]
+        summary[phase] = {
+            "mean_ms": sum(ms) / len(ms) if ms else 0.0,
+            "p50_ms": percentile(ms, 50),
+            "p95_ms": percentile(ms, 95),
+            "p99_ms": percentile(ms, 99),
+            "max_ms": max(ms) if ms else 0.0,
+        }
+    return summary
+
+
+def run_benchmark(name, ticks=1200, seed=0, render=True, warmup=60, surface=None,
+                  sim_hz=SIM_REFERENCE_HZ, telemetry=None):
+    """运行一个压测场景，返回各阶段耗时分位数和实体数峰值；render时绘制到surface，
+    telemetry（Telemetry）用于测量数据采集的开销"""
+    description, setup, inputs = BENCH_SCENARIOS[name]
+    world = GameWorld(seed=seed, sound=False, sim_hz=sim_hz)
+    renderer = LayeredRenderer(surface) if render else None
+    if setup:
+        setup(world)
+    for _ in range(warmup):
+        world.step(inputs(world))
+        if render:
+            renderer.render(world)
+
+    if render:
+        queue = renderer.queue
+        submitted, culled = queue.total_submitted, queue.total_culled
+    timer = PhaseTimer()
+    world.phase_timer = timer
+    world.telemetry = telemetry
+    # 汇总阶段：模拟中除碰撞外均计为update，产生输入（如自动驾驶）单独计为input
+    totals = {"input": [], "update": [], "collision": [], "render": []}
+    peaks = {}
+    start = time.perf_counter()
+    for _ in range(ticks):
+        timer.start("input")
+        world.step(inputs(world))
+        if render:
+            timer.start("render")
+            renderer.render(world, timer=timer)
+            timer.stop()
+        frame = timer.end_frame()
+        if telemetry is not None:
+            telemetry.frame(world, sum(frame.values()))
+        totals["collision"].append(frame.get("collision", 0.0))
+        totals["render"].append(frame.get("render", 0.0) + frame.get("present", 0.0))
+        totals["input"].append(frame.get("input", 0.0))
+        totals["update"].append(sum(frame.values()) - totals["collision"][-1]
+                                - totals["render"][-1] - totals["input"][-1])
+        counts = world.entity_counts()
+        counts["total"] = sum(counts.values())
+        for key, value in counts.items():
+            if value > peaks.get(key, 0):
+                peaks[key] = value
+    elapsed = time.perf_counter() - start
+
+    return {
+        "description": description,
+        "ticks": ticks,
+        "seed": seed,
+        "render": render,
+        "sim_hz": sim_hz,
+        "resolution": list(surface.get_size()) if render else None,
+        "wall_seconds": elapsed,
+        "ticks_per_second": ticks / elapsed if elapsed > 0 else 0.0,
+        "timings": _summarize_phases(totals),
+        # 每模拟秒的碰撞耗时，用于比较不同模拟频率的开销
+        "collision_ms_per_sim_second": sum(totals["collision"]) * 1000 / (ticks / sim_hz),
+        "phases": _summarize_phases(timer.history),
+        "peak_entities": peaks,
+        "pools": world.pool_stats(),
+        "particles": world.particles.stats() if world.particles is not None else None,
+        # 每帧平均提交/剔除的绘制数
+        "draws": ({"submitted": (queue.total_submitted - submitted) / ticks,
+                   "culled": (queue.total_culled - culled) / ticks} if render else None),
+        "state_digest": world.state_digest(),
+        "telemetry": telemetry.stats() if telemetry is not None else None,
+        "autopilot": _autopilots[world].stats() if world in _autopilots else None,
+    }
+
+
+def _git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)),
+                              timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run_benchmarks(names=None, ticks=1200, seed=0, render=True, json_path=None, app=None,
+                   sim_hz=SIM_REFERENCE_HZ, render_scale=1.0, telemetry_dir=None):
+    """运行多个压测场景，打印结果并可写出JSON报告"""
+    names = names or list(BENCH_SCENARIOS)
+    surface = None
+    if render:
+        surface = (app or create_app(headless=True, sound=False,
+                                     render_scale=render_scale)).screen
+        assets.preload(sounds=False)
+    report = {
+        "format": 1,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "revision": _git_revision(),
+        "python": sys.version.split()[0],
+        "pygame": pygame.version.ver,
+        "numpy": np.__version__ if numpy_available() else None,
+        "scenarios": {},
+    }
+    for name in names:
+        telemetry = Telemetry(telemetry_dir, stream=name) if telemetry_dir else None
+        result = run_benchmark(name, ticks=ticks, seed=seed, render=render, surface=surface,
+                               sim_hz=sim_hz, telemetry=telemetry)
+        if telemetry is not None:
+            telemetry.close()
+            result["telemetry"] = telemetry.stats()
+        report["scenarios"][name] = result
+        timings = result["timings"]
+        print(f"[{name}] {result['description']}：{result['ticks_per_second']:.0f} 帧/秒，"
+              f"实体峰值 {result['peak_entities'].get('total', 0)}")
+        for phase in ("input", "update", "collision", "render"):
+            t = timings[phase]
+            print(f"    {phase:<10} p50 {t['p50_ms']:7.3f} ms  p95 {t['p95_ms']:7.3f} ms  "
+                  f"p99 {t['p99_ms']:7.3f} ms")
+        print(f"    碰撞耗时 {result['collision_ms_per_sim_second']:.2f} ms/模拟秒"
+              f"（{result['sim_hz']} Hz）")
+        if result["draws"]:
+            print(f"    每帧绘制 {result['draws']['submitted']:.1f}，"
+                  f"剔除 {result['draws']['culled']:.1f}")
+        if result["telemetry"]:
+            print(f"    数据采集 {result['telemetry']['written']} 条，"
+                  f"丢弃 {result['telemetry']['dropped']} 条")
+    if json_path:
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"压测结果已写入 {json_path}")
+    return report
+
+
+class Telemetry:
+    """游戏数据采集：事件先进内存环形缓冲（满了挤掉最早的并计数），
+    后台线程按批序列化成JSONL写入gzip文件，按大小轮转。
+    游戏循环里只有一次 deque.append，不碰磁盘"""
+
+    def __init__(self, directory, session=None, stream="game", capacity=8192, batch_size=512,
+                 flush_interval=0.5, max_bytes=4 << 20, keep=10):
+        self.directory = directory
+        self.session = session or time.strftime("%Y%m%d-%H%M%S")
+        self.stream = stream  # 同一会话可有多个数据流（如模拟子进程单独写一份）
+        self.capacity = capacity
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes  # 单个文件的未压缩字节数上限
+        self.keep = keep            # 本数据流最多保留的文件数
+        self._buffer = deque(maxlen=capacity)
+        self.emitted = 0
+        self.dropped = 0  # 缓冲区满时被挤掉的事件数
+        self.written = 0
+        self.files = []     # 现存的文件（最早的在前）
+        self.rotations = 0  # 已打开过的文件数
+        self.error = None  # 写盘失败的原因（之后的事件直接丢弃）
+        self._file = None
+        self._file_bytes = 0
+        self._second = None  # 每秒统计：[开始时间, 帧数, 帧时间和, 最长帧]
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        os.makedirs(directory, exist_ok=True)
+        self._thread = threading.Thread(target=self._run, name="miji-telemetry", daemon=True)
+        self._thread.start()
+
+    def emit(self, kind, tick=None, **fields):
+        """记录一个事件（只入队，序列化和写盘在后台线程）"""
+        buffer = self._buffer
+        if len(buffer) >= self.capacity:
+            self.dropped += 1
+        buffer.append((time.time(), kind, tick, fields))
+        self.emitted += 1
+        if len(buffer) >= self.batch_size:
+            self._wake.set()
+
+    def frame(self, world, frame_seconds):
+        """主循环每帧调用一次；每过一秒输出一条实体数和帧时间统计"""
+        now = time.perf_counter()
+        second = self._second
+        if second is None:
+            self._second = [now, 0, 0.0, 0.0]
+            return
+        second[1] += 1
+        second[2] += frame_seconds
+        second[3] = max(second[3], frame_seconds)
+        if now - second[0] >= 1.0:
+            self.emit("stats", int(world.tick), entities=world.entity_counts(),
+                      frames=second[1], fps=round(second[1] / (now - second[0]), 1),
+                      frame_ms=round(second[2] / second[1] * 1000, 3),
+                      frame_ms_max=round(second[3] * 1000, 3), dropped=self.dropped)
+            self._second = [now, 0, 0.0, 0.0]
+
+    def _path(self, index):
+        return os.path.join(self.directory,
+                            f"miji-{self.session}-{self.stream}-{index:03d}.jsonl.gz")
+
+    def _rotate(self):
+        if self._file is not None:
+            self._file.close()
+        path = self._path(self.rotations)
+        self._file = gzip.open(path, "wb")
+        self._file_bytes = 0
+        self.rotations += 1
+        self.files.append(path)
+        while len(self.files) > self.keep:
+            try:
+                os.remove(self.files.pop(0))
+            except OSError:
+                pass
+
+    def _write_batch(self):
+        buffer = self._buffer
+        lines = []
+        while buffer and len(lines) < self.batch_size:
+            t, kind, tick, fields = buffer.popleft()
+            record = {"t": round(t, 4), "type": kind}
+            if tick is not None:
+                record["tick"] = tick
+            record.update(fields)
+            lines.append(json.dumps(record, ensure_ascii=False, separators=(",", ":")))
+        if not lines or self.error is not None:
+            return len(lines)
+        data = ("\n".join(lines) + "\n").encode("utf-8")
+        try:
+            if self._file is None or self._file_bytes + len(data) > self.max_bytes:
+                self._rotate()
+            self._file.write(data)
+            self._file_bytes += len(data)
+            self.written += len(lines)
+        except OSError as e:
+            self.error = e
+        return len(lines)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            while self._write_batch():
+                pass
+        while self._write_batch():
+            pass
+
+    def close(self):
+        """写完缓冲区剩余事件后关闭文件"""
+        self.emit("telemetry", emitted=self.emitted + 1, dropped=self.dropped)
+        self._stop.set()
+        self._wake.set()
+        self._thread.join()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def stats(self):
+        return {"emitted": self.emitted, "written": self.written, "dropped": self.dropped,
+                "buffered": len(self._buffer), "files": self.rotations,
+                "error": str(self.error) if self.error else None}
+
+
+REPLAY_MAGIC = b"MJRP"
+REPLAY_VERSION = 2  # 2：增加主炮瞄准点；仍可读取1
+# 录像中每帧一个标志字节：低4位为开火/速射/防空导弹/主炮按键，
+# REPLAY_AIM 表示后面跟着变化了的瞄准点(<hh)，REPLAY_MAIN_AIM 表示再跟着变化了的
+# 主炮瞄准点(<hh，REPLAY_NO_AIM 为None即与近防炮相同)，REPLAY_END 为结束记录
+REPLAY_AIM = 0x10
+REPLAY_MAIN_AIM = 0x20
+REPLAY_END = 0x80
+REPLAY_NO_AIM = (-32768, -32768)
+_REPLAY_AIM = struct.Struct("<hh")
+_REPLAY_END = struct.Struct("<I20s")  # 总帧数 + 最终状态摘要
+
+
+class InputRecorder:
+    """录像：种子、模拟频率写在文件头，之后逐帧写输入（瞄准点只在变化时写），
+    gzip压缩；结束时写入总帧数和状态摘要，回放时用来校验"""
+
+    def __init__(self, path, seed, sim_hz=SIM_REFERENCE_HZ):
+        self.path = path
+        self.ticks = 0
+        self._aim = None
+        self._main_aim = None
+        self._file = gzip.open(path, "wb")
+        header = json.dumps({
+            "seed": seed, "sim_hz": sim_hz, "screen": [WIDTH, HEIGHT],
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"), "revision": _git_revision(),
+        }).encode()
+        self._file.write(REPLAY_MAGIC + struct.pack("<HI", REPLAY_VERSION, len(header)) + header)
+
+    def record(self, inputs):
+        """写入一帧输入，返回规整后的输入（瞄准点取整），模拟必须使用返回值才能完全复现"""
+        aim = (int(inputs.aim[0]), int(inputs.aim[1]))
+        main_aim = inputs.main_aim
+        if main_aim is not None:
+            main_aim = (int(main_aim[0]), int(main_aim[1]))
+        flags = (bool(inputs.fire) | bool(inputs.fast_fire) << 1 |
+                 bool(inputs.anti_missile) << 2 | bool(inputs.main_cannon) << 3)
+        payload = b""
+        if aim != self._aim:
+            self._aim = aim
+            flags |= REPLAY_AIM
+            payload += _REPLAY_AIM.pack(*aim)
+        if main_aim != self._main_aim:
+            self._main_aim = main_aim
+            flags |= REPLAY_MAIN_AIM
+            payload += _REPLAY_AIM.pack(*(REPLAY_NO_AIM if main_aim is None else main_aim))
+        self._file.write(bytes((flags,)) + payload)
+        self.ticks += 1
+        return TickInput(aim, bool(flags & 1), bool(flags & 2), bool(flags & 4), bool(flags & 8),
+                         main_aim)
+
+    def close(self, digest):
+        """digest为 world.state_digest()"""
+        self._file.write(bytes((REPLAY_END,)) + _REPLAY_END.pack(self.ticks, bytes.fromhex(digest)))
+        self._file.close()
+
+
+class Replay:
+    """读取录像文件"""
+
+    def __init__(self, path):
+        with gzip.open(path, "rb") as f:
+            data = f.read()
+        if data[:4] != REPLAY_MAGIC:
+            raise ValueError(f"{path} 不是录像文件")
+        version, header_len = struct.unpack_from("<HI", data, 4)
+        if not 1 <= version <= REPLAY_VERSION:
+            raise ValueError(f"不支持的录像版本：{version}")
+        offset = 10 + header_len
+        self.header = json.loads(data[10:offset])
+        self.seed = self.header["seed"]
+        self.sim_hz = self.header["sim_hz"]
+        self.inputs = []
+        self.final_ticks = self.digest = None  # 录制中断（无结束记录）时为None
+        aim = (WIDTH // 2, 0)
+        main_aim = None
+        while offset < len(data):
+            flags = data[offset]
+            offset += 1
+            if flags & REPLAY_END:
+                ticks, digest = _REPLAY_END.unpack_from(data, offset)
+                self.final_ticks, self.digest = ticks, digest.hex()
+                break
+            if flags & REPLAY_AIM:
+                aim = _REPLAY_AIM.unpack_from(data, offset)
+                offset += _REPLAY_AIM.size
+            if flags & REPLAY_MAIN_AIM:
+                main_aim = _REPLAY_AIM.unpack_from(data, offset)
+                offset += _REPLAY_AIM.size
+                if main_aim == REPLAY_NO_AIM:
+                    main_aim = None
+            self.inputs.append(TickInput(aim, bool(flags & 1), bool(flags & 2),
+                                         bool(flags & 4), bool(flags & 8), main_aim))
+
+    def __len__(self):
+        return len(self.inputs)
+
+    def create_world(self, sound=False):
+        return GameWorld(seed=self.seed, sound=sound, sim_hz=self.sim_hz)
+
+    def verify(self, world):
+        """回放结果与录制时的最终状态是否一致（没有结束记录时返回None）"""
+        if self.digest is None:
+            return None
+        return world.tick == self.final_ticks and world.state_digest() == self.digest
+
+
+def run_replay(path, render=False, speed=1.0, app=None):
+    """回放录像：默认无窗口全速运行并统计各阶段耗时，可作为性能回归用例；
+    render时按speed倍速在窗口中播放。返回报告字典"""
+    replay = Replay(path)
+    world = replay.create_world()
+    timer = PhaseTimer()
+    world.phase_timer = timer
+    inputs = iter(replay.inputs)
+    start = time.perf_counter()
+    if not render:
+        for tick_input in inputs:
+            world.step(tick_input)
+            timer.end_frame()
+    else:
+        app = app or create_app()
+        renderer = LayeredRenderer(app.screen)
+        clock = pygame.time.Clock()
+        timestep = FixedTimestep(replay.sim_hz)
+        previous = time.perf_counter()
+        finished = False
+        while not finished:
+            clock.tick(60)
+            now = time.perf_counter()
+            steps = timestep.advance((now - previous) * speed)
+            previous = now
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    finished = True
+            for _ in range(steps):
+                tick_input = next(inputs, None)
+                if tick_input is None:
+                    finished = True
+                    break
+                world.step(tick_input)
+                timer.end_frame()
+            timer.start("render")
+            renderer.render(world, timer=timer, alpha=timestep.alpha)
+            timer.stop()
+    elapsed = time.perf_counter() - start
+    return {
+        "path": path,
+        "seed": replay.seed,
+        "sim_hz": replay.sim_hz,
+        "ticks": world.tick,
+        "recorded_ticks": replay.final_ticks,
+        "wall_seconds": elapsed,
+        "ticks_per_second": world.tick / elapsed if elapsed > 0 else 0.0,
+        "phases": _summarize_phases(timer.history),
+        "state_digest": world.state_digest(),
+        "verified": replay.verify(world),
+    }
+
+
+NET_PORT = 47147
+NET_MAGIC = b"MJ"
+NET_VERSION = 2
+NET_INPUT, NET_SNAPSHOT, NET_BYE = 1, 2, 3  # 包类型
+NET_ROLES = ("gunner", "commander")  # 近防炮手 / 指挥（主炮+防空导弹）
+NET_POSITION_SCALE = 8  # 坐标定点数：1/8个世界单位
+NET_ANGLE_SCALE = 32768 / math.pi  # 角度按65536等分
+NET_BULLET_COLORS = (LIGHT_BLUE, GREEN)
+# 输入包：magic, 类型, 版本, 序号, 已收到的最新快照帧, 瞄准点x, y, 按键位, 2键累计次数, 3键累计次数
+_NET_INPUT = struct.Struct("<2sBBIIhhBHH")
+# 快照包：magic, 类型, 版本, 客户端角色, 主机模拟频率, 帧号, 差分基准帧（0为关键帧），
+# 其后为zlib压缩的正文
+_NET_SNAPSHOT = struct.Struct("<2sBBBHII")
+_NET_BYE = struct.Struct("<2sBB")
+
+
+def _net_position(v):
+    return max(-32768, min(32767, round(v * NET_POSITION_SCALE)))
+
+
+def _net_angle(angle):
+    return (round(angle * NET_ANGLE_SCALE) + 32768) % 65536 - 32768
+
+
+def _net_color(color):
+    return NET_BULLET_COLORS.index(color) if color in NET_BULLET_COLORS else 0
+
+
+def _net_bytes(values):
+    """数组按小端字节序输出"""
+    if sys.byteorder == "big":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _net_array(typecode, data):
+    values = array(typecode)
+    values.frombytes(data)
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+
+class NetFrame:
+    """联机快照：一个模拟步的定点量化状态（坐标1/8单位、角度65536等分，都是16位整数）。
+    每类实体按列存储，并带生成编号uid；运动实体另带每步位移（速度）。相对基准帧编码时只写：
+    基准帧每行是否还在（位图）、仍在的行相对基准的差值（坐标先按基准速度外推）、
+    新增的行（uid+完整值），最后整体zlib压缩。
+    新实体总是追加在列表末尾、失效实体原地移除，所以存活行的顺序与基准帧一致"""
+
+    KINDS = ("bullets", "enemy_missiles", "main_cannon_shells", "anti_missiles", "camps")
+    # 每行字段：x,y；运动实体接着是本步位移 vx,vy，然后子弹 颜色序号，导弹/防空导弹 角度，
+    # 炮弹 已爆炸；军营只有 x,y
+    FIELDS = {"bullets": 5, "enemy_missiles": 5, "main_cannon_shells": 5, "anti_missiles": 5,
+              "camps": 2}
+    _HEADER = struct.Struct("<hhII")    # 晃动x,y，近防炮/主炮累计开火次数
+    _WEAPON = struct.Struct("<hhhiiB")  # x, y, 角度, 弹药, 满弹, 装填中
+    _COUNT = struct.Struct("<H")
+
+    __slots__ = ("tick", "header", "weapons", "uids", "columns")
+
+    def __init__(self, tick, header, weapons, uids, columns):
+        self.tick = tick
+        self.header = header
+        self.weapons = weapons
+        self.uids = uids        # 类别 -> array("I")
+        self.columns = columns  # 类别 -> [array("h")]，每个字段一列
+
+    @classmethod
+    def capture(cls, world):
+        q, a = _net_position, _net_angle
+        def moving(e):
+            return e.uid, q(e.x), q(e.y), q(e.x - e.px), q(e.y - e.py)
+
+        stored = isinstance(world.bullets, ProjectileStore)
+        rows = {
+            "bullets": [] if stored else [(*moving(b), _net_color(b.color))
+                                          for b in world.bullets],
+            "enemy_missiles": [(*moving(em), a(em.angle)) for em in world.enemy_missiles],
+            "main_cannon_shells": [(*moving(s), int(s.has_exploded))
+                                   for s in world.main_cannon_shells],
+            "anti_missiles": [(*moving(am), a(am.angle)) for am in world.anti_missiles],
+            "camps": [(camp.uid, q(camp.x), q(camp.y)) for camp in world.camps],
+        }
+        uids, columns = {}, {}
+        for kind in cls.KINDS:
+            fields = list(zip(*rows[kind])) or [()] * (cls.FIELDS[kind] + 1)
+            uids[kind] = array("I", fields[0])
+            columns[kind] = [array("h", values) for values in fields[1:]]
+        if stored:
+            uids["bullets"], columns["bullets"] = cls._store_columns(world.bullets)
+        weapons = [(q(w.x), q(w.y), a(w.angle), w.current_ammo, w.total_ammo, int(w.is_reloading))
+                   for w in (world.cannon1, world.cannon2, world.main_cannon)]
+        launcher = world.launcher
+        weapons.append((q(launcher.x), q(launcher.y), 0, launcher.current_ammo,
+                        launcher.max_ammo, int(launcher.is_reloading)))
+        header = (q(world.shake_offset[0]), q(world.shake_offset[1]),
+                  world.cannon_shots, world.main_cannon_shots)
+        return cls(world.tick, header, weapons, uids, columns)
+
+    @staticmethod
+    def _store_columns(store):
+        """数组存储的子弹整列量化，与逐个 _net_position/_net_color 的结果相同"""
+        n = store.count
+
+        def q(values):
+            values = np.clip(np.round(values * NET_POSITION_SCALE), -32768, 32767)
+            return array("h", values.astype(np.int16).tobytes())
+
+        x, y = store.x[:n], store.y[:n]
+        colors = np.array([_net_color(c) for c in store.palette] or [0], dtype=np.int16)
+        return (array("I", store.uid[:n].astype(np.uint32).tobytes()),
+                [q(x), q(y), q(x - store.px[:n]), q(y - store.py[:n]),
+                 array("h", colors[store.color[:n]].tobytes())])
+
+    def encode(self, base=None):
+        """编码为压缩正文；base为对方已确认收到的帧（None则为关键帧）"""
+        out = bytearray(self._HEADER.pack(*self.header))
+        for weapon in self.weapons:
+            out += self._WEAPON.pack(*weapon)
+        for kind in self.KINDS:
+            uids, columns = self.uids[kind], self.columns[kind]
+            kept = []
+            if base is not None:
+                base_uids = base.uids[kind]
+                alive = set(uids)
+                kept = [i for i, uid in enumerate(base_uids) if uid in alive]
+                if any(uids[j] != base_uids[i] for j, i in enumerate(kept)):
+                    kept = []  # 顺序对不上（不应发生）时这一类整体重发
+                bits = bytearray((len(base_uids) + 7) // 8)
+                for i in kept:
+                    bits[i >> 3] |= 1 << (i & 7)
+                out += self._COUNT.pack(len(base_uids)) + bits
+                base_columns = base.columns[kind]
+                ticks = self.tick - base.tick
+                for f, (column, base_column) in enumerate(zip(columns, base_columns)):
+                    if f < 2 and kind != "camps":
+                        # 坐标按基准帧的速度外推后再取差值，匀速直线飞行的差值为0
+                        velocity = base_columns[f + 2]
+                        values = [(column[j] - base_column[i] - velocity[i] * ticks) & 0xFFFF
+                                  for j, i in enumerate(kept)]
+                    else:
+                        values = [(column[j] - base_column[i]) & 0xFFFF
+                                  for j, i in enumerate(kept)]
+                    out += _net_bytes(array("H", values))
+            else:
+                out += self._COUNT.pack(0)
+            n = len(kept)
+            out += self._COUNT.pack(len(uids) - n) + _net_bytes(uids[n:])
+            for column in columns:
+                out += _net_bytes(column[n:])
+        return zlib.compress(bytes(out))
+
+    @classmethod
+    def decode(cls, tick, payload, base=None):
+        """解码 encode 的输出；差分帧必须给出同一个基准帧"""
+        data = zlib.decompress(payload)
+        header = cls._HEADER.unpack_from(data, 0)
+        offset = cls._HEADER.size
+        weapons = []
+        for _ in range(4):
+            weapons.append(cls._WEAPON.unpack_from(data, offset))
+            offset += cls._WEAPON.size
+        uids, columns = {}, {}
+        for kind in cls.KINDS:
+            fields = cls.FIELDS[kind]
+            (base_count,) = cls._COUNT.unpack_from(data, offset)
+            offset += 2
+            kept = []
+            if base_count:
+                if base is None or len(base.uids[kind]) != base_count:
+                    raise ValueError("差分快照的基准帧不匹配")
+                bits = data[offset:offset + (base_count + 7) // 8]
+                offset += len(bits)
+                kept = [i for i in range(base_count) if bits[i >> 3] >> (i & 7) & 1]
+            n = len(kept)
+            kind_columns = []
+            if n:
+                base_uids = base.uids[kind]
+                kind_uids = array("I", [base_uids[i] for i in kept])
+                for base_column in base.columns[kind]:
+                    deltas = _net_array("H", data[offset:offset + 2 * n])
+                    offset += 2 * n
+                    f = len(kind_columns)
+                    if f < 2 and kind != "camps":
+                        velocity = base.columns[kind][f + 2]
+                        ticks = tick - base.tick
+                        values = [(base_column[i] + velocity[i] * ticks + d + 32768) % 65536 - 32768
+                                  for i, d in zip(kept, deltas)]
+                    else:
+                        values = [(base_column[i] + d + 32768) % 65536 - 32768
+                                  for i, d in zip(kept, deltas)]
+                    kind_columns.append(array("h", values))
+            else:
+                kind_uids = array("I")
+                kind_columns = [array("h") for _ in range(fields)]
+            (added,) = cls._COUNT.unpack_from(data, offset)
+            offset += 2
+            kind_uids.extend(_net_array("I", data[offset:offset + 4 * added]))
+            offset += 4 * added
+            for column in kind_columns:
+                column.extend(_net_array("h", data[offset:offset + 2 * added]))
+                offset += 2 * added
+            uids[kind] = kind_uids
+            columns[kind] = kind_columns
+        return cls(tick, header, weapons, uids, columns)
+
+
+class LossyLink:
+    """UDP套接字包装，本机测试用：按概率丢包，其余的包加上固定延迟和随机抖动后再发出
+    （抖动会造成乱序）。到期的包在 flush() 里发送，其余属性转给原套接字"""
+
+    def __init__(self, sock, loss=0.0, latency=0.0, jitter=0.0, seed=None):
+        self.sock = sock
+        self.loss = loss
+        self.latency = latency  # 秒
+        self.jitter = jitter    # 秒
+        self.rng = random.Random(seed)
+        self._pending = []  # (到期时间, 序号, 数据, 地址) 小顶堆
+        self._order = itertools.count()
+        self.dropped = 0
+
+    def sendto(self, data, address):
+        if self.rng.random() < self.loss:
+            self.dropped += 1
+            return len(data)
+        due = time.perf_counter() + self.latency + self.rng.uniform(0, self.jitter)
+        heapq.heappush(self._pending, (due, next(self._order), data, address))
+        self.flush()
+        return len(data)
+
+    def flush(self):
+        now = time.perf_counter()
+        while self._pending and self._pending[0][0] <= now:
+            _, _, data, address = heapq.heappop(self._pending)
+            try:
+                self.sock.sendto(data, address)
+            except OSError:
+                pass
+
+    def __getattr__(self, name):
+        return getattr(self.sock, name)
+
+
+def _net_socket(bind=None, loss=0.0, latency=0.0, jitter=0.0, seed=None):
+    """非阻塞UDP套接字；设了丢包/延迟时包一层LossyLink"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    if bind is not None:
+        sock.bind(bind)
+    sock.setblocking(False)
+    if loss or latency or jitter:
+        return LossyLink(sock, loss, latency, jitter, seed)
+    return sock
+
+
+def _net_receive(sock, size=2048):
+    """取出所有已到达的包"""
+    if isinstance(sock, LossyLink):
+        sock.flush()
+    while True:
+        try:
+            yield sock.recvfrom(size)
+        except (BlockingIOError, InterruptedError):
+            return
+        except ConnectionResetError:
+            continue  # Windows上对方端口关闭后会收到这个，忽略
+
+
+def _net_send_bye(sock, address):
+    """通知对方退出（直接发出，不经过丢包/延迟模拟）"""
+    if isinstance(sock, LossyLink):
+        sock = sock.sock
+    try:
+        sock.sendto(_NET_BYE.pack(NET_MAGIC, NET_BYE, NET_VERSION), address)
+    except OSError:
+        pass
+
+
+class NetHost:
+    """联机主机：本机运行权威模拟，自己操作role，对方操作另一个角色。
+    每帧 poll() 收对方输入，merge() 合成每步的TickInput，update() 按snapshot_hz发快照。
+    快照相对对方最近确认收到的那一帧做差分，基准不在历史里时发关键帧。只接受一个对方"""
+
+    HISTORY = 64   # 保留最近发出的快照数
+    TIMEOUT = 5.0  # 多少秒收不到输入算对方断开
+
+    def __init__(self, role="gunner", port=NET_PORT, bind="", snapshot_hz=30,
+                 loss=0.0, latency=0.0, jitter=0.0):
+        self.role = role
+        self.remote_role = NET_ROLES[1 - NET_ROLES.index(role)]
+        self.snapshot_hz = snapshot_hz
+        self.sock = _net_socket((bind, port), loss, latency, jitter)
+        self.port = self.sock.getsockname()[1]
+        self.peer = None
+        self._history = OrderedDict()  # 帧号 -> 发出的NetFrame
+        self._next_send = 1  # 帧号0留作“关键帧”标记，从第1帧开始发
+        self._disconnect()
+        self.snapshots = 0  # 发出的快照数
+        self.keyframes = 0
+        self.bytes_sent = 0
+        self.inputs = 0     # 收到的输入包
+
+    def _disconnect(self):
+        self.peer = None
+        self._history.clear()
+        self.acked = 0
+        self._last_heard = 0.0
+        self._input_seq = 0
+        self.remote = ((WIDTH // 2, 0), False, False, 0, 0)  # 瞄准点, 左键, 1键, 2键次数, 3键次数
+        self._consumed = (0, 0)
+
+    def poll(self):
+        for data, address in _net_receive(self.sock):
+            if len(data) < _NET_BYE.size:
+                continue
+            magic, kind, version = _NET_BYE.unpack_from(data)
+            if magic != NET_MAGIC or version != NET_VERSION:
+                continue
+            if kind == NET_BYE and address == self.peer:
+                print("对方已断开")
+                self._disconnect()
+            elif kind == NET_INPUT and len(data) == _NET_INPUT.size:
+                self._receive_input(_NET_INPUT.unpack(data)[3:], address)
+        if self.peer is not None and time.perf_counter() - self._last_heard > self.TIMEOUT:
+            print("对方连接超时")
+            self._disconnect()
+
+    def _receive_input(self, fields, address):
+        seq, ack, aim_x, aim_y, buttons, clicks2, clicks3 = fields
+        if self.peer is None:
+            print(f"对方已连接：{address[0]}:{address[1]}，角色 {self.remote_role}")
+            self.peer = address
+            self._consumed = (clicks2, clicks3)  # 连接前的按键不算
+        elif address != self.peer:
+            return
+        self._last_heard = time.perf_counter()
+        self.inputs += 1
+        if seq <= self._input_seq:
+            return  # 乱序到达的旧输入
+        self._input_seq = seq
+        if ack in self._history:
+            self.acked = ack
+        self.remote = ((aim_x, aim_y), bool(buttons & 1), bool(buttons & 2), clicks2, clicks3)
+
+    def merge(self, local):
+        """本机输入local（TickInput）与对方输入按角色合成一步的输入；
+        对方的单次按键按累计次数传来，每步最多触发一次"""
+        aim, fire, fast_fire, clicks2, clicks3 = self.remote
+        consumed2, consumed3 = self._consumed
+        self._consumed = (clicks2, clicks3)
+        anti_missile, main_cannon = clicks2 > consumed2, clicks3 > consumed3
+        if self.role == "gunner":
+            return TickInput(local.aim, local.fire, local.fast_fire, anti_missile, main_cannon,
+                             aim)
+        return TickInput(aim, fire, fast_fire, local.anti_missile, local.main_cannon, local.aim)
+
+    def update(self, world):
+        """模拟推进后调用：到了发送时间就给对方发一份快照"""
+        if self.peer is None or world.tick < self._next_send:
+            return
+        self._next_send = world.tick + max(1, round(world.sim_hz / self.snapshot_hz))
+        frame = NetFrame.capture(world)
+        base = self._history.get(self.acked)
+        if base is None:
+            self.keyframes += 1
+        packet = _NET_SNAPSHOT.pack(NET_MAGIC, NET_SNAPSHOT, NET_VERSION,
+                                    NET_ROLES.index(self.remote_role), world.sim_hz, frame.tick,
+                                    base.tick if base is not None else 0) + frame.encode(base)
+        self._history[frame.tick] = frame
+        while len(self._history) > self.HISTORY:
+            self._history.popitem(last=False)
+        try:
+            self.sock.sendto(packet, self.peer)
+        except OSError:
+            return
+        self.snapshots += 1
+        self.bytes_sent += len(packet)
+
+    def stats(self):
+        return {
+            "peer": f"{self.peer[0]}:{self.peer[1]}" if self.peer else None,
+            "snapshots": self.snapshots,
+            "keyframes": self.keyframes,
+            "bytes_sent": self.bytes_sent,
+            "mean_packet": self.bytes_sent / self.snapshots if self.snapshots else 0.0,
+            "inputs": self.inputs,
+        }
+
+    def close(self):
+        if self.peer is not None:
+            _net_send_bye(self.sock, self.peer)
+        self.sock.close()
+
+
+class NetClient:
+    """联机客户端：把本机输入发给主机，收快照后缓存最近几帧。绘制时按估计的主机时钟
+    回退interp_delay秒，在前后两帧之间插值（实体按uid对应），网络抖动不会让画面跳动；
+    自己操作的炮塔朝向直接按本机鼠标算，不等主机回传。爆炸特效在本机按实体消失生成。
+    sim_hz只在收到第一份快照前使用，之后以快照头里主机的模拟频率为准。
+    接口与SimulationThread相同（set_input/latest/stop），主循环按工作线程模式驱动它"""
+
+    HISTORY = 64    # 保留的已解码帧（差分基准）
+    TIMEOUT = 5.0   # 多少秒收不到快照算主机断开
+    # 各角色自己操作的武器（WorldSnapshot.weapons() 中的序号）
+    CONTROLLED = {"gunner": (0, 1), "commander": (2,)}
+
+    def __init__(self, address, sim_hz=SIM_REFERENCE_HZ, interp_delay=0.1, loss=0.0,
+                 latency=0.0, jitter=0.0, particles=PARTICLE_BUDGET):
+        host, port = address
+        self.address = (socket.gethostbyname(host), port)
+        self.sim_hz = sim_hz
+        self.interp_delay = interp_delay
+        self.sock = _net_socket(None, loss, latency, jitter)
+        self.role = None  # 收到第一份快照后由主机指定
+        self.closed = False
+        self._frames = OrderedDict()  # 帧号 -> NetFrame
+        self._offset = None  # 本机时间 - 主机帧时间 的估计
+        self._input = (WIDTH // 2, 0, False, False, 0, 0)
+        self._input_seq = 0
+        self._last_sent = 0.0
+        self._last_heard = None
+        self._render_tick = None
+        self.particles = (ParticleSystem(particles)
+                          if particles and numpy_available() else None)
+        self._effects = []   # (帧号, 特效, x, y)，渲染时间到了再放
+        self._effected = {}  # 已放过特效的实体 uid -> 帧号
+        self.received = 0
+        self.bytes_received = 0
+        self.keyframes = 0
+        self.late = 0          # 乱序到达而丢弃的快照
+        self.missing_base = 0  # 基准帧已不在本地而丢弃的快照
+
+    def start(self):
+        self._send_input()
+        return self
+
+    def set_input(self, aim, fire, fast_fire, anti_missile_clicks, main_cannon_clicks):
+        self._input = (aim[0], aim[1], fire, fast_fire, anti_missile_clicks, main_cannon_clicks)
+        # 输入按模拟频率发送，单次按键用累计次数表示，丢包后下一个包会补上
+        if time.perf_counter() - self._last_sent >= 0.9 / self.sim_hz:
+            self._send_input()
+
+    def _send_input(self):
+        aim_x, aim_y, fire, fast_fire, clicks2, clicks3 = self._input
+        self._input_seq += 1
+        ack = next(reversed(self._frames)) if self._frames else 0
+        packet = _NET_INPUT.pack(NET_MAGIC, NET_INPUT, NET_VERSION, self._input_seq, ack,
+                                 int(aim_x), int(aim_y), bool(fire) | bool(fast_fire) << 1,
+                                 clicks2 & 0xFFFF, clicks3 & 0xFFFF)
+        try:
+            self.sock.sendto(packet, self.address)
+        except OSError:
+            pass
+        self._last_sent = time.perf_counter()
+
+    def _receive(self):
+        for data, address in _net_receive(self.sock, 1 << 16):
+            if address != self.address or len(data) < _NET_BYE.size:
+                continue
+            magic, kind, version = _NET_BYE.unpack_from(data)
+            if magic != NET_MAGIC or version != NET_VERSION:
+                continue
+            if kind == NET_BYE:
+                self.closed = True
+            elif kind == NET_SNAPSHOT and len(data) > _NET_SNAPSHOT.size:
+                role, sim_hz, tick, base_tick = _NET_SNAPSHOT.unpack_from(data)[3:]
+                self._receive_snapshot(NET_ROLES[role], sim_hz, tick, base_tick,
+                                       data[_NET_SNAPSHOT.size:])
+        if (self._last_heard is not None
+                and time.perf_counter() - self._last_heard > self.TIMEOUT):
+            self.closed = True
+
+    def _receive_snapshot(self, role, sim_hz, tick, base_tick, payload):
+        now = time.perf_counter()
+        newest = next(reversed(self._frames)) if self._frames else None
+        if newest is not None and tick <= newest:
+            self.late += 1
+            return
+        base = None
+        if base_tick:
+            base = self._frames.get(base_tick)
+            if base is None:
+                self.missing_base += 1
+                return
+        else:
+            self.keyframes += 1
+        frame = NetFrame.decode(tick, payload, base)
+        self.role = role
+        self.sim_hz = sim_hz  # 帧号按主机的模拟频率换算成时间
+        self.received += 1
+        self.bytes_received += len(payload) + _NET_SNAPSHOT.size
+        self._last_heard = now
+        # 主机时钟：取最早到达的估计（延迟最小），网络变慢时缓慢跟上
+        sample = now - tick / self.sim_hz
+        if self._offset is None or sample < self._offset:
+            self._offset = sample
+        else:
+            self._offset += (sample - self._offset) * 0.02
+        if newest is not None:
+            self._find_effects(self._frames[newest], frame)
+        self._frames[tick] = frame
+        while len(self._frames) > self.HISTORY:
+            self._frames.popitem(last=False)
+
+    def _find_effects(self, previous, frame):
+        """导弹/军营在屏内消失即被击毁，炮弹爆炸或消失即爆炸，记下特效等到渲染时间再放"""
+        if self.particles is None:
+            return
+        effected = self._effected
+        for kind, effect in (("enemy_missiles", "missile"), ("camps", "camp"),
+                             ("main_cannon_shells", "shell")):
+            alive = set(frame.uids[kind])
+            xs, ys = previous.columns[kind][:2]
+            for i, uid in enumerate(previous.uids[kind]):
+                if uid not in alive and uid not in effected:
+                    x, y = xs[i] / NET_POSITION_SCALE, ys[i] / NET_POSITION_SCALE
+                    if 0 <= x <= WIDTH and 0 <= y <= HEIGHT:
+                        self._effects.append((frame.tick, effect, x, y))
+                    effected[uid] = frame.tick
+        xs, ys, _, _, exploded = frame.columns["main_cannon_shells"]
+        for i, uid in enumerate(frame.uids["main_cannon_shells"]):
+            if exploded[i] and uid not in effected:
+                self._effects.append((frame.tick, "shell", xs[i] / NET_POSITION_SCALE,
+                                      ys[i] / NET_POSITION_SCALE))
+                effected[uid] = frame.tick
+        if len(effected) > 4096:
+            cutoff = frame.tick - 10 * self.sim_hz
+            self._effected = {uid: t for uid, t in effected.items() if t >= cutoff}
+
+    def latest(self):
+        """按当前时间插值出的WorldSnapshot（位置已插值好，alpha不再起作用）"""
+        self._receive()
+        if not self._frames:
+            return None
+        now = time.perf_counter()
+        render_tick = (now - self._offset - self.interp_delay) * self.sim_hz
+        ticks = list(self._frames)
+        a = b = self._frames[ticks[-1]]
+        frac = 0.0
+        if render_tick < ticks[-1]:
+            for older, newer in zip(reversed(ticks[:-1]), reversed(ticks)):
+                if older <= render_tick:
+                    a, b = self._frames[older], self._frames[newer]
+                    frac = (render_tick - older) / (newer - older)
+                    break
+            else:
+                a = b = self._frames[ticks[0]]
+        render_tick = a.tick + (b.tick - a.tick) * frac
+        self._update_particles(render_tick)
+        return self._interpolate(a, b, frac, now)
+
+    def _update_particles(self, render_tick):
+        particles = self.particles
+        if particles is None:
+            return
+        if self._render_tick is not None and render_tick > self._render_tick:
+            particles.update(min(render_tick - self._render_tick, 10)
+                             * SIM_REFERENCE_HZ / self.sim_hz)
+        self._render_tick = max(render_tick, self._render_tick or 0)
+        due = [effect for effect in self._effects if effect[0] <= render_tick]
+        if due:
+            self._effects = [effect for effect in self._effects if effect[0] > render_tick]
+            for _, effect, x, y in due:
+                particles.emit(effect, x, y)
+
+    def _interpolate(self, a, b, frac, now):
+        scale = 1 / NET_POSITION_SCALE
+
+        def mix(p, q):
+            return (p + (q - p) * frac) * scale
+
+        sx, sy = mix(a.header[0], b.header[0]), mix(a.header[1], b.header[1])
+        particles = self.particles.rows() if self.particles is not None else None
+        data = array("d", (b.tick, self.sim_hz, now, sx, sy, sx, sy, b.header[2], b.header[3],
+                           *(len(b.uids[kind]) for kind in NetFrame.KINDS),
+                           0 if particles is None else len(particles)))
+        aim_x, aim_y = self._input[:2]
+        controlled = self.CONTROLLED.get(self.role, ())
+        for i, (wa, wb) in enumerate(zip(a.weapons, b.weapons)):
+            x, y = mix(wa[0], wb[0]), mix(wa[1], wb[1])
+            if i in controlled:
+                angle = math.atan2(aim_y - y, aim_x - x)
+            else:
+                turn = (wb[2] - wa[2] + 32768) % 65536 - 32768  # 走短的一边
+                angle = (wa[2] + turn * frac) / NET_ANGLE_SCALE
+            data.extend((x, y, x, y, angle, *wb[3:]))
+        for kind in NetFrame.KINDS:
+            xs, ys = b.columns[kind][:2]
+            extra = b.columns[kind][-1]
+            axs, ays = a.columns[kind][:2]
+            index = {uid: i for i, uid in enumerate(a.uids[kind])} if a is not b else {}
+            for j, uid in enumerate(b.uids[kind]):
+                i = index.get(uid)
+                if i is None:
+                    x, y = xs[j] * scale, ys[j] * scale
+                else:
+                    x, y = mix(axs[i], xs[j]), mix(ays[i], ys[j])
+                if kind == "camps":
+                    data.extend((x, y))
+                    continue
+                value = extra[j]
+                if kind == "bullets":
+                    r, g, bl = NET_BULLET_COLORS[value % len(NET_BULLET_COLORS)]
+                    value = r << 16 | g << 8 | bl
+                elif kind != "main_cannon_shells":
+                    value /= NET_ANGLE_SCALE
+                data.extend((x, y, x, y, value))
+        if particles is not None:
+            particles[:, 2:4] = 0  # 已按渲染时间推进，不再插值
+            data.frombytes(particles.astype(np.float64).tobytes())
+        return WorldSnapshot(data)
+
+    def stats(self):
+        return {
+            "role": self.role,
+            "sim_hz": self.sim_hz,
+            "received": self.received,
+            "keyframes": self.keyframes,
+            "bytes_received": self.bytes_received,
+            "late": self.late,
+            "missing_base": self.missing_base,
+        }
+
+    def stop(self):
+        if not self.closed:
+            _net_send_bye(self.sock, self.address)
+        self.sock.close()
+
+
+def _net_address(text):
+    """解析 --connect 参数：主机[:端口]"""
+    host, _, port = text.rpartition(":")
+    if not host:
+        return text, NET_PORT
+    try:
+        return host, int(port)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"地址格式应为 主机[:端口]：{text}") from None
+
+
+def run_net_test(seconds=10.0, scenario="swarm", role="gunner", seed=0, snapshot_hz=30,
+                 loss=0.0, latency=0.0, jitter=0.0, sim_hz=SIM_REFERENCE_HZ, client_sim_hz=None):
+    """本机同时运行主机和客户端（经127.0.0.1），主机按压测场景操作自己的角色，
+    客户端每秒按一次2键和3键（对方是指挥时生效）；丢包/延迟作用在双方发出的包上。
+    client_sim_hz为客户端自己的模拟频率（默认与主机相同）。返回带宽和收发统计"""
+    description, setup, inputs = BENCH_SCENARIOS[scenario]
+    world = GameWorld(seed=seed, sound=False, sim_hz=sim_hz)
+    if setup is not None:
+        setup(world)
+    host = NetHost(role, port=0, bind="127.0.0.1", snapshot_hz=snapshot_hz,
+                   loss=loss, latency=latency, jitter=jitter)
+    client = NetClient(("127.0.0.1", host.port), sim_hz=client_sim_hz or sim_hz, loss=loss,
+                       latency=latency, jitter=jitter).start()
+    timestep = FixedTimestep(sim_hz)
+    raw_bytes = frames = 0
+    encode_times, decode_times = [], []
+    clicks = 0
+    start = previous = time.perf_counter()
+    while True:
+        now = time.perf_counter()
+        if now - start >= seconds:
+            break
+        host.poll()
+        for _ in range(timestep.advance(now - previous)):
+            world.step(host.merge(inputs(world)))
+        previous = now
+        sent = host.snapshots
+        t = time.perf_counter()
+        host.update(world)
+        if host.snapshots > sent:
+            encode_times.append(time.perf_counter() - t)
+            raw_bytes += len(WorldSnapshot.capture(world).data) * 8
+            frames += 1
+        clicks = int(now - start) + 1
+        client.set_input(_sweep_aim(world.tick), True, False, clicks, clicks)
+        received = client.received
+        t = time.perf_counter()
+        snapshot = client.latest()
+        if client.received > received:
+            decode_times.append(time.perf_counter() - t)
+        time.sleep(0.002)
+    report = {
+        "scenario": scenario,
+        "seconds": seconds,
+        "snapshot_hz": snapshot_hz,
+        "loss": loss,
+        "latency_ms": latency * 1000,
+        "jitter_ms": jitter * 1000,
+        "host": host.stats(),
+        "client": client.stats(),
+        "entities": world.entity_counts(),
+        "raw_snapshot_bytes": raw_bytes / frames if frames else 0.0,
+        "encode_ms": sum(encode_times) / len(encode_times) * 1000 if encode_times else 0.0,
+        "receive_ms": sum(decode_times) / len(decode_times) * 1000 if decode_times else 0.0,
+        "client_clicks": clicks,
+        "main_cannon_shots": world.main_cannon_shots,
+        "anti_missiles_fired": world.anti_missile_pool.created + world.anti_missile_pool.reused,
+        "rendered_tick": int(snapshot.tick) if snapshot is not None else None,
+        "host_tick": world.tick,
+    }
+    client.stop()
+    host.close()
+    return report
+
+
+class App:
+    """运行环境：显示窗口和音频都在第一次需要时才初始化。
+    headless 使用SDL虚拟显示/音频驱动，适合工具、压测和自动化运行"""
+
+    def __init__(self, headless=False, sound=True, size=(WIDTH, HEIGHT), render_scale=1.0):
+        self.headless = headless
+        self.sound = sound
+        self.size = size  # 窗口大小
+        self.render_scale = render_scale  # 画布分辨率相对窗口的比例
+        self._screen = None
+        if headless:
+            os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+            os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+    @property
+    def screen(self):
+        """游戏窗口（首次访问时创建）"""
+        if self._screen is None:
+            display = pygame.display  # 模块导入单独计时
+            t = time.perf_counter()
+            display.init()
+            # 画布与世界同比例、按窗口等比适配；比窗口小时由SDL（GPU）整体放大到窗口
+            fit = min(self.size[0] / WIDTH, self.size[1] / HEIGHT) * self.render_scale
+            logical = (round(WIDTH * fit), round(HEIGHT * fit))
+            if logical == tuple(self.size) or self.headless:
+                self._screen = display.set_mode(logical)  # 无窗口时不需要放大
+            else:
+                self._screen = display.set_mode(logical, pygame.SCALED)
+                self._resize_window()
+            display.set_caption("MIJI-GAME")
+            startup_timings["display"] = (time.perf_counter() - t) * 1000
+        return self._screen
+
+    def _resize_window(self):
+        """SCALED模式下窗口默认按整数倍放大，这里改成请求的窗口大小（不支持时保持默认）"""
+        try:
+            from pygame._sdl2.video import Window
+            Window.from_display_module().size = self.size
+        except (ImportError, AttributeError, pygame.error):
+            pass
+
+    def init_audio(self):
+        """启用声音时初始化混音器；失败则静音运行。返回是否有声音"""
+        if not self.sound:
+            return False
+        mixer = pygame.mixer
+        if not mixer.get_init():
+            t = time.perf_counter()
+            try:
+                mixer.init()
+            except pygame.error as e:
+                print(f"警告：音频初始化失败 - {e}，静音运行")
+                self.sound = False
+            startup_timings["audio"] = (time.perf_counter() - t) * 1000
+        return self.sound
+
+    def create_world(self, seed=None, sim_hz=SIM_REFERENCE_HZ):
+        return GameWorld(seed=seed, sound=self.init_audio(), sim_hz=sim_hz)
+
+    def quit(self):
+        pygame.quit()
+
+
+def create_app(headless=None, sound=True, size=None, render_scale=1.0):
+    """创建运行环境；headless 默认取环境变量 MIJI_HEADLESS=1，
+    size为窗口大小（默认与世界同大），render_scale为画布分辨率比例"""
+    if headless is None:
+        headless = os.environ.get("MIJI_HEADLESS") == "1"
+    return App(headless=headless, sound=sound, size=size or (WIDTH, HEIGHT),
+               render_scale=render_scale)
+
+
+class FixedTimestep:
+    """固定步长累加器：把真实经过的时间换算成模拟步数。
+    单帧最多追赶max_steps步，超出部分丢弃（渲染太慢时宁可丢时间也不越追越慢）"""
+
+    def __init__(self, hz=SIM_REFERENCE_HZ, max_steps=5):
+        self.step = 1.0 / hz
+        self.max_steps = max_steps
+        self.accumulator = 0.0
+        self.dropped = 0.0  # 累计丢弃的时间（秒）
+
+    def advance(self, elapsed):
+        """加入经过的时间，返回本帧应推进的模拟步数"""
+        self.accumulator += elapsed
+        steps = int(self.accumulator / self.step)
+        if steps > self.max_steps:
+            self.dropped += self.accumulator - self.max_steps * self.step
+            steps = self.max_steps
+            self.accumulator = 0.0
+        else:
+            self.accumulator -= steps * self.step
+        return steps
+
+    @property
+    def alpha(self):
+        """渲染插值系数：已累计但不足一步的时间占一步的比例"""
+        return min(1.0, self.accumulator / self.step)
+
+
+def main(app=None, sim_hz=SIM_REFERENCE_HZ, render_hz=60, sim_mode="inline", record=None,
+         telemetry_dir=None, net=None, autopilot=None):
+    """游戏主循环：模拟以固定的sim_hz推进，渲染以render_hz（0为不限）在两次模拟步之间插值。
+    sim_mode为 inline（同一循环内）、thread（工作线程）或 process（子进程），
+    后两种主线程只处理输入和绘制最新快照。record为录像文件路径（仅inline模式），
+    telemetry_dir为游戏数据（JSONL）输出目录。net为联机：NetHost（inline模式，
+    本机模拟并合并对方输入）或 NetClient（代替模拟线程，绘制主机发来的快照）。
+    autopilot为 Autopilot（仅inline模式），代替鼠标键盘产生本机输入"""
+    app = app or create_app()
+    try:
+        assets.provider
+    except FileNotFoundError:
+        print("资源加载失败，游戏无法运行！")
+        sys.exit(1)
+    screen = app.screen
+    recorder = None
+    telemetry = Telemetry(telemetry_dir) if telemetry_dir else None
+    host = net if isinstance(net, NetHost) else None
+    if isinstance(net, NetClient):
+        world = None
+        simulation = net.start()
+        sounds = create_sound_manager() if app.init_audio() else None
+        cannon_cue = sounds.cue("cannon") if sounds else None
+        main_cannon_cue = sounds.cue("main_cannon") if sounds else None
+    elif sim_mode == "inline":
+        seed = None
+        if record:
+            seed = random.SystemRandom().randrange(1 << 32)  # 录像必须有确定的种子
+            recorder = InputRecorder(record, seed, sim_hz)
+        world = app.create_world(seed=seed, sim_hz=sim_hz)
+        world.telemetry = telemetry
+        simulation = sounds = None
+    else:
+        world = None
+        worker = SimulationThread if sim_mode == "thread" else SimulationProcess
+        simulation = worker(sim_hz=sim_hz, telemetry=telemetry).start()
+        # 音效由主线程按快照中的开火次数播放
+        sounds = create_sound_manager() if app.init_audio() else None
+        cannon_cue = sounds.cue("cannon") if sounds else None
+        main_cannon_cue = sounds.cue("main_cannon") if sounds else None
+    assets.preload()
     clock = pygame.time.Clock()
-    
-    # 船底基础位置（中央）
-    ship_x_base = WIDTH // 2 - ship_img.get_width() // 2
-    ship_y_base = HEIGHT // 2 - ship_img.get_height() // 2
-    # 船体晃动参数
-    shake_amplitude = 3  # 晃动幅度
-    shake_speed = 0.05   # 晃动速度
-    shake_time = 0
-    
-    # 创建武器（基于船底位置）
-    # 左近防炮
-    cannon1 = Cannon(WIDTH//2 - 300, HEIGHT // 2)
-    # 右近防炮
-    cannon2 = Cannon(WIDTH//2 + 120, HEIGHT // 2)
-    # 船头主炮（船底前部中央）
-    main_cannon = MainCannon(WIDTH//2 - 200, HEIGHT // 2 - 50)
-    # 发射箱（旋转90度）
-    launcher = Launcher(WIDTH//2, HEIGHT // 2 - 20)
-    
-    # 游戏对象列表
-    bullets = []
-    enemy_missiles = []
-    anti_missiles = []
-    main_cannon_shells = []
-    camps = [Camp() for _ in range(5)]  # 生成5个军营
-    
-    # 无限生成导弹
-    missile_spawn_timer = 0
-    missile_spawn_interval = 50
+    timestep = FixedTimestep(sim_hz)
+    renderer = LayeredRenderer(screen)
+    profiler = ProfilerOverlay()  # F3 性能面板，F9 采集cProfile
     
     # 按键状态
     key_1_pressed = False
     key_2_clicked = False
     key_3_clicked = False  # 主炮发射键（3键）
+    key_2_clicks = key_3_clicks = 0  # 工作线程/进程模式下按累计次数传递单次按键
+    shots = (0, 0)  # 已播放音效的累计开火次数（近防炮, 主炮）
 
     running = True
+    previous = time.perf_counter()
     while running:
-        clock.tick(60)
-        screen.fill(BLUE)
-
-        # 计算船体晃动偏移（正弦曲线模拟海浪）
-        shake_time += shake_speed
-        shake_x = math.sin(shake_time) * shake_amplitude
-        shake_y = math.cos(shake_time) * shake_amplitude
-        shake_offset = (shake_x, shake_y)
-        
-        # 绘制顶部陆地和军营
-        draw_land_and_camps(camps)
-        
-        # 绘制船底（带晃动）
-        ship_x, ship_y = draw_ship(ship_x_base, ship_y_base, shake_offset)
-        
-        # 更新武器位置（跟随船体晃动）
-        cannon1.x = WIDTH//2 - 300 + shake_x
-        cannon1.y = HEIGHT // 2 + shake_y
-        cannon2.x = WIDTH//2 + 120 + shake_x
-        cannon2.y = HEIGHT // 2 + shake_y
-        main_cannon.x = WIDTH//2 - 200 + shake_x
-        main_cannon.y = HEIGHT // 2 - 50 + shake_y
-        launcher.x = WIDTH//2 + shake_x
-        launcher.y = HEIGHT // 2 - 20 + shake_y
+        clock.tick(render_hz)
+        now = time.perf_counter()
+        frame_seconds = now - previous
+        steps = timestep.advance(frame_seconds)
+        previous = now
+        profiler.begin_frame()
 
         # 获取输入
-        mouse_pos = pygame.mouse.get_pos()
+        mouse_pos = renderer.to_world(pygame.mouse.get_pos())
         mouse_left_pressed = pygame.mouse.get_pressed()[0]
 
         # 事件处理
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 running = False
+            elif event.type == pygame.VIDEOEXPOSE:
+                renderer.invalidate()
             elif event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_1:
                     key_1_pressed = True
                 if event.key == pygame.K_2:
                     key_2_clicked = True
+                    key_2_clicks += 1
                 if event.key == pygame.K_3:
                     key_3_clicked = True  # 3键发射主炮
+                    key_3_clicks += 1
+                if event.key == pygame.K_F3:
+                    profiler.toggle(world)
+                if event.key == pygame.K_F9:
+                    profiler.capture()
             elif event.type == pygame.KEYUP:
                 if event.key == pygame.K_1:
                     key_1_pressed = False
 
-        # 更新所有游戏对象
-        # 武器更新
-        cannon1.update(mouse_pos)
-        cannon2.update(mouse_pos)
-        main_cannon.update(mouse_pos)
-        launcher.update()
-        
-        # 无限生成来袭导弹
-        missile_spawn_timer += 1
-        if missile_spawn_timer >= missile_spawn_interval:
-            enemy_missiles.append(EnemyMissile())
-            missile_spawn_timer = 0
-            missile_spawn_interval = random.randint(30, 70)
-        
-        # 防空导弹更新
-        for am in anti_missiles:
-            am.update(enemy_missiles)
-        
-        # 主炮炮弹更新（可攻击导弹+军营）
-        active_shells = []
-        for shell in main_cannon_shells:
-            shell.update(enemy_missiles + camps)
-            if shell.active:
-                shell.draw()
-                active_shells.append(shell)
-        main_cannon_shells = active_shells
+        if simulation is not None:
+            simulation.set_input(mouse_pos, mouse_left_pressed, key_1_pressed,
+                                 key_2_clicks, key_3_clicks)
+            snapshot = simulation.latest()
+            if simulation is net and net.closed:
+                print("主机已退出或连接中断")
+                running = False
+            if snapshot is None:
+                continue
+            if sounds is not None:
+                # 累计开火次数增加了才播放，多步合并为一次
+                if cannon_cue is not None and snapshot.cannon_shots > shots[0]:
+                    cannon_cue.play()
+                if main_cannon_cue is not None and snapshot.main_cannon_shots > shots[1]:
+                    main_cannon_cue.play()
+                sounds.update()
+            shots = (snapshot.cannon_shots, snapshot.main_cannon_shots)
+            profiler.phase("render")
+            renderer.render(snapshot, overlays=(profiler.draw,), timer=profiler.timer,
+                            alpha=snapshot.alpha(now))
+            profiler.end_frame(snapshot, renderer)
+            if telemetry is not None:
+                telemetry.frame(snapshot, frame_seconds)
+            continue
 
-        # 发射逻辑
-        # 1. 近防炮发射（仅攻击导弹）
-        if mouse_left_pressed:
-            for cannon in [cannon1, cannon2]:
-                bullet = cannon.fire(is_fast=False)
-                if bullet:
-                    bullets.append(bullet)
-        if key_1_pressed:
-            for cannon in [cannon1, cannon2]:
-                bullet = cannon.fire(is_fast=True)
-                if bullet:
-                    bullets.append(bullet)
-        
-        # 2. 防空导弹发射（2键）
-        if key_2_clicked:
-            am = launcher.fire_anti_missile(enemy_missiles)
-            if am:
-                anti_missiles.append(am)
+        if host is not None:
+            host.poll()
+        for _ in range(steps):
+            if autopilot is not None:
+                inputs = autopilot(world)
+            else:
+                inputs = TickInput(mouse_pos, mouse_left_pressed, key_1_pressed,
+                                   key_2_clicked, key_3_clicked)
+            if recorder is not None:
+                inputs = recorder.record(inputs)
+            if host is not None:
+                inputs = host.merge(inputs)
+            world.step(inputs)
+            # 单次按键只触发一次（本帧没有模拟步时留到下一帧）
             key_2_clicked = False
-        
-        # 3. 主炮发射（3键）
-        if key_3_clicked:
-            shell = main_cannon.fire()
-            if shell:
-                main_cannon_shells.append(shell)
             key_3_clicked = False
+        if host is not None:
+            host.update(world)
 
-        # 更新子弹
-        active_bullets = []
-        for bullet in bullets:
-            bullet.update()
-            if bullet.active:
-                bullet.draw()
-                active_bullets.append(bullet)
-        bullets = active_bullets
-
-        # 更新来袭导弹（碰撞检测）
-        active_enemy_missiles = []
-        for em in enemy_missiles:
-            em.update()
-            hit = False
-            # 检测近防炮子弹碰撞（仅导弹）
-            for bullet in bullets:
-                dx = bullet.x - em.x
-                dy = bullet.y - em.y
-                if math.hypot(dx, dy) < (bullet.radius + em.radius):
-                    bullet.active = False
-                    hit = True
-                    break
-            if not hit and em.active:
-                em.draw()
-                active_enemy_missiles.append(em)
-        enemy_missiles = active_enemy_missiles
+        profiler.phase("render")
+        renderer.render(world, overlays=(profiler.draw,), timer=profiler.timer,
+                        alpha=timestep.alpha)
+        profiler.end_frame(world, renderer)
+        if telemetry is not None:
+            telemetry.frame(world, frame_seconds)
 
-        # 保留军营（仅主炮可攻击）
-        active_camps = []
-        for camp in camps:
-            if camp.active:
-                active_camps.append(camp)
-        camps = active_camps
+    if simulation is not None:
+        simulation.stop()
+    if host is not None:
+        host.close()
+    if recorder is not None:
+        recorder.close(world.state_digest())
+        print(f"录像已保存：{record}（{recorder.ticks} 帧）")
+    if telemetry is not None:
+        telemetry.close()
+        stats = telemetry.stats()
+        print(f"游戏数据已写入 {telemetry_dir}（{stats['written']} 条，丢弃 {stats['dropped']} 条）")
+    app.quit()
+    sys.exit()
 
-        # 绘制防空导弹
-        for am in anti_missiles:
-            am.draw()
-        anti_missiles = [am for am in anti_missiles if am.active]
 
-        # 绘制武器
-        launcher.draw()
-        cannon1.draw()
-        cannon2.draw()
-        main_cannon.draw()
+def _window_size(text):
+    """解析 --window 参数，如 1280x814"""
+    try:
+        width, height = (int(v) for v in text.lower().split("x"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"窗口大小格式应为 宽x高：{text}") from None
+    return width, height
 
-        pygame.display.flip()
 
-        # 绘制操作提示
+def _render_scale(text):
+    """解析 --render-scale 参数（百分比，10~100）"""
+    percent = int(text)
+    if not 10 <= percent <= 100:
+        raise argparse.ArgumentTypeError("渲染比例应在 10~100 之间")
+    return percent / 100
 
-        font = pygame.font.SysFont(None, 36)
 
-                    
-        missile_text = f"Try to use 1 2 3"
-        screen.blit(font.render(missile_text, True, WHITE), (20, 220))
- 
-        
-        hints = [
-                "Made by WaspSquidW (c) 2025 WaspSquidW MIJI-Game",
-                "WikiWaspWang@outlook.com",
-                "v1.01"
-                
-            ]
-        for i, hint in enumerate(hints):
-            screen.blit(font.render(hint, True, WHITE), (20, HEIGHT - 80 + i*30))
-
-        pygame.display.flip()
-
-    pygame.quit()
-    sys.exit()
+def _add_net_shim_arguments(parser):
+    parser.add_argument("--net-loss", type=float, default=0.0, metavar="PERCENT",
+                        help="模拟丢包率（百分比，作用在本机发出的包上）")
+    parser.add_argument("--net-latency", type=float, default=0.0, metavar="MS",
+                        help="模拟单向延迟（毫秒）")
+    parser.add_argument("--net-jitter", type=float, default=0.0, metavar="MS",
+                        help="模拟延迟抖动（毫秒，会造成乱序）")
 
-if __name__ == "__main__":
 
-    main()
+def _net_shim(args):
+    return {"loss": args.net_loss / 100, "latency": args.net_latency / 1000,
+            "jitter": args.net_jitter / 1000}
+
+
+def run(argv=None):
+    """命令行入口：默认启动游戏，headless 子命令无窗口全速模拟，bench 子命令运行压测，
+    startup 子命令打印启动耗时，net-test 子命令在本机测试联机"""
+    parser = argparse.ArgumentParser(prog="miji", description="MIJI-GAME")
+    commands = parser.add_subparsers(dest="command")
+    play = commands.add_parser("play", help="启动游戏（默认）")
+    play.add_argument("--sim-hz", type=int, default=SIM_REFERENCE_HZ, help="模拟频率")
+    play.add_argument("--render-hz", type=int, default=60, help="渲染帧率上限，0为不限")
+    play.add_argument("--sim-mode", choices=("inline", "thread", "process"), default="inline",
+                      help="模拟运行方式：主循环内/工作线程/子进程")
+    play.add_argument("--record", metavar="PATH", help="录制输入到录像文件（仅inline模式）")
+    play.add_argument("--window", type=_window_size, metavar="WxH", help="窗口大小，默认与世界同大")
+    play.add_argument("--render-scale", type=_render_scale, default=1.0, metavar="PERCENT",
+                      help="内部渲染分辨率百分比（如 50、75、100），低于100时放大到窗口")
+    play.add_argument("--telemetry", metavar="DIR",
+                      help="把游戏事件和每秒统计写入目录（gzip压缩的JSONL，按大小轮转）")
+    play.add_argument("--host", type=int, nargs="?", const=NET_PORT, metavar="PORT",
+                      help=f"作为联机主机等待对方连接（UDP，默认端口 {NET_PORT}）")
+    play.add_argument("--connect", type=_net_address, metavar="HOST[:PORT]",
+                      help="连接联机主机")
+    play.add_argument("--role", choices=NET_ROLES, default="gunner",
+                      help="主机玩家的角色：gunner 近防炮，commander 主炮+防空导弹；对方操作另一个")
+    play.add_argument("--snapshot-hz", type=int, default=30, help="联机主机发送快照的频率")
+    play.add_argument("--autopilot", action="store_true", help="自动驾驶代替鼠标键盘（仅inline模式）")
+    _add_net_shim_arguments(play)
+    replay = commands.add_parser("replay", help="回放录像：默认无窗口全速运行并校验结果")
+    replay.add_argument("path", help="录像文件")
+    replay.add_argument("--render", action="store_true", help="在窗口中播放")
+    replay.add_argument("--speed", type=float, default=1.0, help="窗口播放倍速")
+    replay.add_argument("--json", metavar="PATH", help="写出JSON报告")
+    headless = commands.add_parser("headless", help="无窗口全速运行模拟")
+    headless.add_argument("--ticks", type=int, default=10000, help="模拟帧数")
+    headless.add_argument("--seed", type=int, default=0, help="随机种子")
+    headless.add_argument("--autopilot", action="store_true", help="由自动驾驶产生输入")
+    assets_cmd = commands.add_parser("assets", help="预处理资源缓存并打印加载耗时")
+    assets_cmd.add_argument("--rebuild", action="store_true", help="忽略现有缓存，重新解码并写入")
+    startup = commands.add_parser("startup", help="打印模块导入、初始化和资源加载耗时")
+    startup.add_argument("--no-sound", action="store_true", help="不初始化音频")
+    bench = commands.add_parser("bench", help="运行压测场景")
+    bench.add_argument("--scenario", action="append", choices=sorted(BENCH_SCENARIOS),
+                       help="场景名，可重复；默认全部")
+    bench.add_argument("--ticks", type=int, default=1200, help="每个场景计时帧数")
+    bench.add_argument("--seed", type=int, default=0, help="随机种子")
+    bench.add_argument("--no-render", action="store_true", help="只测模拟，不渲染")
+    bench.add_argument("--sim-hz", type=int, default=SIM_REFERENCE_HZ, help="模拟频率")
+    bench.add_argument("--render-scale", type=_render_scale, default=1.0, metavar="PERCENT",
+                       help="内部渲染分辨率百分比")
+    bench.add_argument("--telemetry", metavar="DIR", help="同时采集游戏数据到目录（测量开销）")
+    bench.add_argument("--json", metavar="PATH", help="写出JSON报告")
+    net_test = commands.add_parser("net-test", help="本机同时运行联机主机和客户端，测带宽和收发")
+    net_test.add_argument("--seconds", type=float, default=10.0, help="运行秒数")
+    net_test.add_argument("--scenario", choices=sorted(BENCH_SCENARIOS), default="swarm",
+                          help="主机一方按哪个压测场景操作")
+    net_test.add_argument("--role", choices=NET_ROLES, default="gunner", help="主机玩家的角色")
+    net_test.add_argument("--snapshot-hz", type=int, default=30, help="快照发送频率")
+    net_test.add_argument("--sim-hz", type=int, default=SIM_REFERENCE_HZ, help="主机模拟频率")
+    net_test.add_argument("--client-sim-hz", type=int, help="客户端模拟频率（默认同主机）")
+    net_test.add_argument("--json", metavar="PATH", help="写出JSON报告")
+    _add_net_shim_arguments(net_test)
+    args = parser.parse_args(argv)
+
+    if args.command == "assets":
+        app = create_app(headless=True)
+        app.screen
+        app.init_audio()
+        if args.rebuild:
+            assets.rebuild()
+        assets.preload()
+        print_startup_report()
+        return
+    if args.command == "startup":
+        app = create_app(headless=True, sound=not args.no_sound)
+        app.screen
+        app.init_audio()
+        assets.preload()
+        print_startup_report()
+        return
+    if args.command == "replay":
+        report = run_replay(args.path, render=args.render, speed=args.speed,
+                            app=create_app() if args.render else None)
+        print(f"回放 {report['ticks']} 帧，{report['ticks_per_second']:.0f} 帧/秒，"
+              f"状态摘要 {report['state_digest']}")
+        for phase, t in sorted(report["phases"].items()):
+            print(f"    {phase:<14} p50 {t['p50_ms']:7.3f} ms  p95 {t['p95_ms']:7.3f} ms  "
+                  f"p99 {t['p99_ms']:7.3f} ms")
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+        if report["verified"] is False:
+            print("回放结果与录制时不一致！")
+            sys.exit(1)
+        print("回放结果一致" if report["verified"] else "录像没有结束记录，未校验")
+        return
+    if args.command == "bench":
+        run_benchmarks(args.scenario, ticks=args.ticks, seed=args.seed,
+                       render=not args.no_render, json_path=args.json, sim_hz=args.sim_hz,
+                       render_scale=args.render_scale, telemetry_dir=args.telemetry)
+        return
+
+    if args.command == "net-test":
+        report = run_net_test(args.seconds, scenario=args.scenario, role=args.role,
+                              snapshot_hz=args.snapshot_hz, sim_hz=args.sim_hz,
+                              client_sim_hz=args.client_sim_hz, **_net_shim(args))
+        host, client = report["host"], report["client"]
+        print(f"快照 发出 {host['snapshots']}（关键帧 {host['keyframes']}）"
+              f" 收到 {client['received']}，乱序丢弃 {client['late']}，"
+              f"缺基准丢弃 {client['missing_base']}")
+        print(f"平均每包 {host['mean_packet']:.0f} 字节（未压缩快照 "
+              f"{report['raw_snapshot_bytes']:.0f} 字节），"
+              f"{host['bytes_sent'] / report['seconds'] / 1024:.1f} KiB/s，"
+              f"编码 {report['encode_ms']:.3f} ms")
+        print(f"实体 {report['entities']}")
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+        return
+
+    if args.command == "headless":
+        autopilot = Autopilot() if args.autopilot else None
+        world, tps = run_headless(args.ticks, seed=args.seed, input_source=autopilot)
+        print(f"模拟 {args.ticks} 帧，{tps:.0f} 帧/秒，状态摘要 {world.state_digest()}")
+        print(world.entity_counts())
+        if autopilot is not None:
+            print(f"自动驾驶：{autopilot.stats()}")
+        return
+    if args.command == "play":
+        if args.record and args.sim_mode != "inline":
+            parser.error("--record 只支持 --sim-mode inline")
+        if args.autopilot and (args.sim_mode != "inline" or args.connect):
+            parser.error("--autopilot 只支持 --sim-mode inline，且不能和 --connect 同用")
+        net = None
+        if args.host is not None and args.connect:
+            parser.error("--host 和 --connect 只能选一个")
+        if (args.host is not None or args.connect) and args.record:
+            parser.error("联机时不能录像")
+        if args.host is not None:
+            if args.sim_mode != "inline":
+                parser.error("--host 只支持 --sim-mode inline")
+            net = NetHost(args.role, port=args.host, snapshot_hz=args.snapshot_hz,
+                          **_net_shim(args))
+            print(f"联机主机：UDP 端口 {net.port}，本机角色 {args.role}")
+        elif args.connect:
+            net = NetClient(args.connect, sim_hz=args.sim_hz, **_net_shim(args))
+        main(create_app(size=args.window, render_scale=args.render_scale), sim_hz=args.sim_hz,
+             render_hz=args.render_hz, sim_mode=args.sim_mode, record=args.record,
+             telemetry_dir=args.telemetry, net=net,
+             autopilot=Autopilot() if args.autopilot else None)
+    else:
+        main(create_app())
+
+
+startup_timings["import miji"] = (time.perf_counter() - _IMPORT_STARTED) * 1000
+
+if __name__ == "__main__":
+    run()
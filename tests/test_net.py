@@ -0,0 +1,76 @@
+import random
+
+import miji
+
+
+def _frames(ticks=240, seed=4):
+    """压测场景（10倍导弹、持续开火）逐帧捕获的NetFrame"""
+    world = miji.GameWorld(seed=seed, sound=False)
+    miji._bench_swarm_setup(world)
+    frames = []
+    for _ in range(ticks):
+        world.step(miji._bench_swarm_inputs(world))
+        frames.append(miji.NetFrame.capture(world))
+    return frames
+
+
+def _same(a, b):
+    assert a.tick == b.tick
+    assert tuple(a.header) == tuple(b.header)
+    assert [tuple(w) for w in a.weapons] == [tuple(w) for w in b.weapons]
+    for kind in miji.NetFrame.KINDS:
+        assert a.uids[kind] == b.uids[kind], kind
+        assert a.columns[kind] == b.columns[kind], kind
+
+
+def test_keyframe_round_trip():
+    frame = _frames(120)[-1]
+    assert len(frame.uids["bullets"]) > 0
+    _same(miji.NetFrame.decode(frame.tick, frame.encode()), frame)
+
+
+def test_delta_round_trip_under_loss():
+    # 与NetHost/NetClient相同的约定：相对对方最近确认的帧编码，丢了快照或确认就用更旧的基准
+    rng = random.Random(1)
+    sent = {}       # 发送方历史
+    received = {}   # 接收方已解码的帧
+    acked = None
+    deltas = 0
+    for frame in _frames():
+        base = sent.get(acked)
+        payload = frame.encode(base)
+        sent[frame.tick] = frame
+        if rng.random() < 0.3:
+            continue  # 快照丢失
+        decoded = miji.NetFrame.decode(frame.tick, payload,
+                                       received[base.tick] if base is not None else None)
+        _same(decoded, frame)
+        received[frame.tick] = decoded
+        deltas += base is not None
+        if rng.random() >= 0.3:
+            acked = frame.tick  # 确认送达
+    assert deltas > 100
+    # 差分帧明显小于关键帧
+    last = _frames()[-2:]
+    assert len(last[1].encode(last[0])) < len(last[1].encode()) / 2
+
+
+def test_localhost_with_loss_and_latency():
+    report = miji.run_net_test(seconds=2.5, scenario="swarm", role="gunner", snapshot_hz=30,
+                               loss=0.2, latency=0.02, jitter=0.01)
+    host, client = report["host"], report["client"]
+    assert host["peer"] is not None and host["inputs"] > 0
+    assert client["role"] == "commander"
+    assert client["received"] > 20
+    assert host["keyframes"] < host["snapshots"]
+    # 客户端（指挥）每秒按一次3键，经有损链路也能让主机开主炮
+    assert report["main_cannon_shots"] >= 1
+    assert 0 < report["rendered_tick"] <= report["host_tick"]
+
+
+def test_localhost_client_uses_host_sim_rate():
+    # 主机120Hz、客户端30Hz：帧号要按主机频率换算成时间，插值才会落后约interp_delay
+    report = miji.run_net_test(seconds=2.0, scenario="swarm", sim_hz=120, client_sim_hz=30)
+    assert report["client"]["sim_hz"] == 120
+    lag = report["host_tick"] - report["rendered_tick"]
+    assert 0.05 * 120 <= lag <= 0.5 * 120
@@ -0,0 +1,82 @@
+import gzip
+import json
+import struct
+
+import pytest
+
+import miji
+
+
+def _inputs(world):
+    tick = world.tick
+    return miji.TickInput(miji._sweep_aim(tick), tick % 3 == 0, tick % 200 > 150,
+                          tick % 50 == 0, tick % 90 == 0)
+
+
+def _record(path, seed=11, sim_hz=60, ticks=600):
+    world = miji.GameWorld(seed=seed, sound=False, sim_hz=sim_hz)
+    recorder = miji.InputRecorder(str(path), seed, sim_hz)
+    for _ in range(ticks):
+        world.step(recorder.record(_inputs(world)))
+    recorder.close(world.state_digest())
+    return world
+
+
+@pytest.mark.parametrize("sim_hz", [60, 30])
+def test_replay_verifies(tmp_path, sim_hz):
+    path = tmp_path / "run.mjr"
+    world = _record(path, sim_hz=sim_hz)
+    report = miji.run_replay(str(path))
+    assert (report["seed"], report["sim_hz"]) == (11, sim_hz)
+    assert report["ticks"] == report["recorded_ticks"] == 600
+    assert report["state_digest"] == world.state_digest()
+    assert report["verified"] is True
+
+
+def test_replay_detects_divergence(tmp_path):
+    path = tmp_path / "run.mjr"
+    _record(path)
+    replay = miji.Replay(str(path))
+    world = replay.create_world()
+    for i, tick_input in enumerate(replay.inputs):
+        # 中途松开半秒开火键
+        world.step(tick_input._replace(fire=False) if 300 <= i < 330 else tick_input)
+    assert replay.verify(world) is False
+
+
+def test_rejects_other_files(tmp_path):
+    path = tmp_path / "not-a-replay"
+    with gzip.open(path, "wb") as f:
+        f.write(b"hello")
+    with pytest.raises(ValueError):
+        miji.Replay(str(path))
+
+
+def test_records_main_cannon_aim(tmp_path):
+    # 自动驾驶（和联机）的主炮单独瞄准，录像必须原样保留
+    path = tmp_path / "autopilot.mjr"
+    world = miji.GameWorld(seed=8, sound=False)
+    autopilot = miji.Autopilot()
+    recorder = miji.InputRecorder(str(path), 8)
+    for _ in range(900):
+        world.step(recorder.record(autopilot(world)))
+    recorder.close(world.state_digest())
+    assert autopilot.main_cannon_shots > 0
+    replay = miji.Replay(str(path))
+    assert any(tick_input.main_aim not in (None, tick_input.aim) for tick_input in replay.inputs)
+    assert miji.run_replay(str(path))["verified"] is True
+
+
+def test_reads_version_1_files(tmp_path):
+    path = tmp_path / "v1.mjr"
+    header = json.dumps({"seed": 3, "sim_hz": 60}).encode()
+    world = miji.GameWorld(seed=3, sound=False)
+    world.step(miji.TickInput((100, 200), True))
+    with gzip.open(path, "wb") as f:
+        f.write(miji.REPLAY_MAGIC + struct.pack("<HI", 1, len(header)) + header)
+        f.write(bytes((miji.REPLAY_AIM | 1,)) + struct.pack("<hh", 100, 200))
+        f.write(bytes((miji.REPLAY_END,)) + struct.pack("<I20s", 1,
+                                                        bytes.fromhex(world.state_digest())))
+    replay = miji.Replay(str(path))
+    assert replay.inputs == [miji.TickInput((100, 200), True)]
+    assert miji.run_replay(str(path))["verified"] is True
@@ -0,0 +1,105 @@
+import hashlib
+import http.server
+import os
+import threading
+
+import pytest
+
+import miji
+
+BLOB = os.urandom(300 * 1024)
+BLOB_SHA256 = hashlib.sha256(BLOB).hexdigest()
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    """本地替身服务器：支持Range；server.drop_after 非空时，第一次响应只发这么多字节就断开"""
+
+    def do_GET(self):
+        server = self.server
+        server.requests.append((self.path, self.headers.get("Range")))
+        if self.path != "/mj.data.zip":
+            self.send_error(404)
+            return
+        start = 0
+        range_header = self.headers.get("Range")
+        if range_header and server.ranges:
+            start = int(range_header.split("=")[1].rstrip("-"))
+            if start >= len(BLOB):
+                self.send_error(416)
+                return
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{len(BLOB) - 1}/{len(BLOB)}")
+        else:
+            self.send_response(200)
+        body = BLOB[start:]
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if server.drop_after is not None:
+            body, server.drop_after = body[:server.drop_after], None
+            self.close_connection = True
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    httpd.requests = []
+    httpd.ranges = True
+    httpd.drop_after = None
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    httpd.url = f"http://127.0.0.1:{httpd.server_address[1]}"
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def _download(server, tmp_path, urls=None, sha256=BLOB_SHA256):
+    dest = str(tmp_path / "mj.data.zip")
+    ok = miji.download_resources(dest, urls or [server.url + "/mj.data.zip"], sha256=sha256,
+                                 timeout=5, chunk_size=8192, progress=None)
+    return ok, dest
+
+
+def test_download_verifies_checksum(server, tmp_path):
+    ok, dest = _download(server, tmp_path)
+    assert ok
+    with open(dest, "rb") as f:
+        assert f.read() == BLOB
+    assert not os.path.exists(dest + ".part")
+
+
+def test_download_resumes_with_range(server, tmp_path):
+    server.drop_after = 100 * 1024
+    ok, dest = _download(server, tmp_path)
+    assert ok
+    with open(dest, "rb") as f:
+        assert f.read() == BLOB
+    assert server.requests[0][1] is None
+    assert server.requests[1][1] == f"bytes={100 * 1024}-"
+
+
+def test_download_restarts_without_range_support(server, tmp_path):
+    server.ranges = False
+    server.drop_after = 100 * 1024
+    ok, dest = _download(server, tmp_path)
+    assert ok
+    with open(dest, "rb") as f:
+        assert f.read() == BLOB
+
+
+def test_checksum_mismatch_is_discarded(server, tmp_path):
+    ok, dest = _download(server, tmp_path, sha256="0" * 64)
+    assert not ok
+    assert not os.path.exists(dest)
+    assert not os.path.exists(dest + ".part")
+
+
+def test_falls_back_to_next_mirror(server, tmp_path):
+    ok, dest = _download(server, tmp_path,
+                         urls=[server.url + "/missing.zip", server.url + "/mj.data.zip"])
+    assert ok
+    assert [path for path, _ in server.requests] == ["/missing.zip", "/mj.data.zip"]
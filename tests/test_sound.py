@@ -0,0 +1,59 @@
+import pygame
+import pytest
+
+import miji
+
+
+@pytest.fixture
+def mixer():
+    pygame.mixer.init(44100, -16, 2)
+    yield
+    pygame.mixer.quit()
+
+
+def _sound(seconds):
+    return pygame.mixer.Sound(buffer=bytes(int(44100 * seconds) * 4))
+
+
+def _manager(now):
+    return miji.SoundManager(clock=lambda: now[0])
+
+
+def test_long_stealing_voice_never_starves_other_groups(mixer):
+    # 主炮音效很长（一直在响），连发期间仍不能占用近防炮的通道
+    now = [0.0]
+    manager = _manager(now)
+    manager.add_group("cannon", _sound(0.1), channels=2, priority=0, min_interval=0.012,
+                      burst_after=0.1)
+    manager.add_group("main_cannon", _sound(13), channels=3, priority=10, steal=True)
+    main_channels = {manager._channels[i] for i in manager.groups["main_cannon"].channels}
+    for frame in range(1200):
+        now[0] = frame / 60
+        if frame % 5 == 0:
+            manager.play("cannon")
+            manager.play("cannon")
+        if frame % 40 == 0:
+            assert manager.play("main_cannon") in main_channels
+        manager.update()
+    stats = manager.stats()
+    assert stats["dropped"] == 0
+    assert stats["voices_by_group"] == {"cannon": 2, "main_cannon": 3}
+
+
+def test_shared_channels_go_to_higher_priority(mixer):
+    now = [0.0]
+    manager = _manager(now)
+    manager.add_group("low", _sound(13), channels=1, priority=0)
+    manager.add_group("high", _sound(13), channels=1, priority=5)
+    # 低优先级占满自己的通道和两个溢出通道，再多就丢弃
+    for _ in range(3):
+        now[0] += 1
+        assert manager.play("low") is not None
+    now[0] += 1
+    assert manager.play("low") is None
+    assert manager.counters["dropped"] == 1
+    # 高优先级先用自己的通道，再抢占溢出通道
+    assert manager.play("high") is not None
+    assert manager.play("high") is not None
+    assert manager.counters["stolen"] == 1
+    assert manager.stats()["voices_by_group"] == {"low": 2, "high": 2}
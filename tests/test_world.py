@@ -0,0 +1,170 @@
+import itertools
+
+import pytest
+
+import miji
+
+
+def _run(seed, ticks=600, setup=None, inputs=miji._bench_swarm_inputs, sim_hz=60):
+    world = miji.GameWorld(seed=seed, sound=False, sim_hz=sim_hz)
+    if setup:
+        setup(world)
+    for _ in range(ticks):
+        world.step(inputs(world))
+    return world
+
+
+def test_same_seed_same_digest():
+    a = _run(7, setup=miji._bench_swarm_setup)
+    b = _run(7, setup=miji._bench_swarm_setup)
+    assert a.tick == b.tick == 600
+    assert a.state_digest() == b.state_digest()
+    assert a.cannon_shots == b.cannon_shots > 0
+
+
+def test_different_seed_different_digest():
+    assert _run(1).state_digest() != _run(2).state_digest()
+
+
+def test_run_headless_is_deterministic():
+    a, _ = miji.run_headless(300, seed=3)
+    b, _ = miji.run_headless(300, seed=3)
+    assert a.state_digest() == b.state_digest()
+
+
+def _five_seconds(sim_hz):
+    """按住左键和3键跑5秒模拟，返回(每门近防炮发射数, 主炮发射数, 生成的导弹数)"""
+    world = miji.GameWorld(seed=5, sound=False, sim_hz=sim_hz)
+    inputs = miji.TickInput((miji.WIDTH / 2, 0), True, False, False, True)
+    spawned = set()
+    for _ in range(sim_hz * 5):
+        world.step(inputs)
+        spawned.update(em.uid for em in world.enemy_missiles)
+    return world.cannon_shots / 2, world.main_cannon_shots, len(spawned)
+
+
+@pytest.mark.parametrize("sim_hz", [45, 30, 20])
+def test_timers_do_not_depend_on_sim_rate(sim_hz):
+    # 计时器保留超出的余量，射速和导弹生成频率与模拟频率无关（允许差一次）
+    cannon, main_cannon, spawned = _five_seconds(60)
+    assert (cannon, main_cannon) == (60, 5)
+    other = _five_seconds(sim_hz)
+    assert abs(other[0] - cannon) <= 1
+    assert abs(other[1] - main_cannon) <= 1
+    assert abs(other[2] - spawned) <= 1
+
+
+def _reload_cycles(sim_hz, seconds=12):
+    """每门武器只有1发弹药、按住全部开火键跑一段时间，每发都触发一次完整装填；
+    返回各武器每次开火所在步的起始时间（换算成60Hz帧）"""
+    world = miji.GameWorld(seed=5, sound=False, sim_hz=sim_hz)
+    for weapon in (world.cannon1, world.cannon2, world.main_cannon):
+        weapon.total_ammo = weapon.current_ammo = 1
+    world.launcher.max_ammo = world.launcher.current_ammo = 1
+    world.telemetry = _Events()
+    inputs = miji.TickInput((miji.WIDTH / 2, 0), True, False, True, True)
+    for _ in range(sim_hz * seconds):
+        world.step(inputs)
+    shots = {}
+    for kind, tick, fields in world.telemetry.events:
+        if kind == "shot":
+            key = (fields["weapon"], fields.get("mount"))
+            shots.setdefault(key, []).append((tick - 1) * 60 / sim_hz)
+    return shots
+
+
+@pytest.mark.parametrize("sim_hz", [30, 120, 25])
+def test_reload_does_not_depend_on_sim_rate(sim_hz):
+    # 装填计时器同样保留余量：多轮装填后开火时间与60Hz相差不超过一步
+    reference = _reload_cycles(60)
+    assert [len(times) for times in reference.values()] == [6, 6, 2, 3]
+    step = max(1, 60 / sim_hz)
+    other = _reload_cycles(sim_hz)
+    assert other.keys() == reference.keys()
+    for key, expected in reference.items():
+        times = other[key]
+        assert len(times) == len(expected)
+        assert all(abs(a - b) <= step for a, b in zip(times, expected))
+
+
+class _Events:
+    def __init__(self):
+        self.events = []
+
+    def emit(self, kind, tick, **fields):
+        self.events.append((kind, tick, fields))
+
+
+def test_missile_reaching_ship_does_not_consume_bullets():
+    world = miji.GameWorld(seed=0, sound=False)
+    world.telemetry = _Events()
+    # 导弹这一步到达船体，路上停着一发子弹
+    missile = miji.EnemyMissile(world.rng)
+    missile.x, missile.y = miji.WIDTH / 2 - 32, miji.HEIGHT // 2
+    missile.vx, missile.vy = 4, 0
+    bullet = miji.Bullet(miji.WIDTH / 2 - 29, miji.HEIGHT // 2, 0)
+    bullet.vx = bullet.vy = 0
+    world.enemy_missiles.append(missile)
+    world.bullets.append(bullet)
+    world.step()
+    kinds = [kind for kind, _, _ in world.telemetry.events]
+    assert "ship_hit" in kinds
+    assert "kill" not in kinds
+    assert bullet.active and bullet in world.bullets
+
+
+def _autopilot_run(sim_hz, stores, monkeypatch):
+    monkeypatch.setattr(miji, "_entity_uids", itertools.count(1))  # 两次运行的uid可比较
+    world = miji.GameWorld(seed=11, sound=False, sim_hz=sim_hz)
+    if stores:
+        world.use_projectile_stores()
+    miji._bench_swarm_setup(world)
+    world.telemetry = _Events()
+    autopilot = miji.Autopilot()
+    for _ in range(sim_hz * 15):
+        inputs = autopilot(world)
+        # 自动驾驶很少用防空导弹，定时补按2键，让威胁跟踪和重新锁定也走一遍
+        world.step(inputs._replace(anti_missile=world.tick % 40 == 0))
+    return world
+
+
+@pytest.mark.parametrize("sim_hz", [60, 30])
+def test_projectile_stores_match_lists(sim_hz, monkeypatch):
+    # 同一种子分别用列表和数组存储跑：击落、事件、位置和快照都完全相同
+    pytest.importorskip("numpy")
+    lists = _autopilot_run(sim_hz, False, monkeypatch)
+    stores = _autopilot_run(sim_hz, True, monkeypatch)
+    assert isinstance(stores.bullets, miji.BulletStore)
+    kills = [fields for kind, _, fields in lists.telemetry.events if kind == "kill"]
+    assert {kill["weapon"] for kill in kills} == {"cannon", "anti_missile", "main_cannon"}
+    assert stores.telemetry.events == lists.telemetry.events
+    assert stores.state_digest() == lists.state_digest()
+    assert stores.entity_counts() == lists.entity_counts()
+    assert (miji.WorldSnapshot.capture(stores, published=0).data
+            == miji.WorldSnapshot.capture(lists, published=0).data)
+    a, b = miji.NetFrame.capture(stores), miji.NetFrame.capture(lists)
+    assert a.uids == b.uids and a.columns == b.columns
+
+
+@pytest.mark.parametrize("stores", [False, True])
+def test_one_bullet_hits_stacked_missiles(stores):
+    # 叠在一起的两枚导弹扫过同一发子弹，两枚都被击落（列表和数组存储规则相同）
+    if stores:
+        pytest.importorskip("numpy")
+    world = miji.GameWorld(seed=0, sound=False)
+    world.missile_spawn_timer = -1000
+    if stores:
+        world.use_projectile_stores()
+    world.telemetry = _Events()
+    for _ in range(2):
+        missile = miji.EnemyMissile(world.rng)
+        missile.x, missile.y = 400, 300
+        missile.vx, missile.vy = 4, 0
+        world.enemy_missiles.append(missile)
+    bullet = miji.Bullet(410, 300, 0)
+    bullet.vx = bullet.vy = 0
+    world.bullets.append(bullet)
+    world.step()
+    kills = [fields["weapon"] for kind, _, fields in world.telemetry.events if kind == "kill"]
+    assert kills == ["cannon", "cannon"]
+    assert len(world.enemy_missiles) == 0